@@ -1,24 +1,30 @@
-import struct
-
 class BaseMode1():
     """these routines don't take any arguments"""
     num_bytes = 1
+    address = None
+    page_cross = None
+    zero_page = True
 
 
 class BaseMode2():
-    """contains routines to parse 2 byte opcodes"""
-    _struct_fmt = '<BB'
-    _struct_len = struct.calcsize(_struct_fmt)
-    num_bytes = 2
+    """contains routines for 2 byte opcodes
 
-    def parse_args(self):
-        return struct.unpack(self._struct_fmt, self.core.memory_str[self.core.pc:self.core.pc+self._struct_len])
+    ``address`` is a python expression giving the effective address, where
+    {op} stands for the operand following the opcode. ``value`` and ``store``
+    read and write the operand of the instruction once ``addr`` is known.
+    ``page_cross`` is 1 when indexing crossed a page, which costs reads a
+    cycle, and ``zero_page`` is True for modes that can't reach I/O.
+    """
+    num_bytes = 2
+    address = '{op}'
+    value = 'read(addr)'
+    store = 'write(addr, value)'
+    page_cross = None
+    zero_page = False
 
 
 class BaseMode3(BaseMode2):
-    """contains routines to parse 3 byte opcodes"""
-    _struct_fmt = '<BH'
-    _struct_len = struct.calcsize(_struct_fmt)
+    """contains routines for 3 byte opcodes, the operand is a little endian word"""
     num_bytes = 3
 
 
@@ -31,17 +37,15 @@ class Immediate(BaseMode2):
     In this mode, it is: $A9 $0A
     """
 
-    def init_args(self):
-        args = self.parse_args()
-        self.get_arg = lambda: args[1]
-        # no set_arg function, doesn't make sense for immediate addressing
+    address = None
+    value = '{op}'
+    # no store, doesn't make sense for immediate addressing
+    store = None
+    zero_page = True
 
     def addressmode(self):
         return "{inst} #${arg:02X}"
 
-    def addressmode_info(self):
-        return "immediate argument"
-        
 
 class ZeroPage(BaseMode2):
     """Absolute and Zero-page Absolute
@@ -58,108 +62,65 @@ class ZeroPage(BaseMode2):
     LDA $31F6 is stored as three bytes in memory, $AD $F6 $31.
     Zero-page absolute is usually just called zero-page.
     """
-    
-    def init_args(self):
-        args = self.parse_args()
-        self.get_arg = lambda: self.core.memory[args[1]]
+    zero_page = True
 
     def addressmode(self):
-        return "{ints} ${arg:02X}"
-
-    def addressmode_info(self):
-        return "zeropage absolute address ${0:02X}".format(self.parse_args()[1])
+        return "{inst} ${arg:02X}"
 
 
 class ZeroPageX(BaseMode2):
-    def init_args(self):
-        args = self.parse_args()
-        self.get_arg = lambda: self.core.memory[args[1] + self.core.x]
+    # the index wraps around within the zero page
+    address = '({op} + x) & 0xFF'
+    zero_page = True
 
     def addressmode(self):
         return "{inst} ${arg:02X}, X"
-    
-    def addressmode_info(self):
-        return "zeropage indexed address ${0:02X} + X(${1:02X})".format(self.parse_args()[1], self.core.x)
 
 
 class ZeroPageY(BaseMode2):
-    def init_args(self):
-        args = self.parse_args()
-        self.get_arg = lambda: self.core.memory[args[1] + self.core.y]
-    
+    address = '({op} + y) & 0xFF'
+    zero_page = True
+
     def addressmode(self):
         return "{inst} ${arg:02X}, Y"
 
-    def addressmode_info(self):
-        return "zeropage indexed address ${0:02X} + Y(${1:02X})".format(self.parse_args()[1], self.core.y)
-
 
 class Absolute(BaseMode3):
-    def init_args(self):
-        args = self.parse_args()
-        self.get_arg = lambda: self.core.memory[args[1]]
-
     def addressmode(self):
         return "{inst} ${arg:04X}"
 
-    def addressmode_info(self):
-        return "absolute address ${0:02X}".format(self.parse_args()[1])
-
 
 class AbsoluteX(BaseMode3):
-    def init_args(self):
-        args = self.parse_args()
-        self.get_arg = lambda: self.core.memory[args[1] + self.core.x]
+    address = '({op} + x) & 0xFFFF'
+    page_cross = '(({op} & 0xFF) + x) >> 8'
 
     def addressmode(self):
         return "{inst} ${arg:04X}, X"
 
-    def addressmode_info(self):
-        return "absolute indexed address ${0:04X} + X(${1:02X})".format(self.parse_args()[1], self.core.x)
-
 
-#TODO: should this have a different base class?
-class AbsoluteY():
-    def init_args(self):
-        args = self.parse_args()
-        self.get_arg = lambda: self.core.memory[args[1] + self.core.y]
+class AbsoluteY(BaseMode3):
+    address = '({op} + y) & 0xFFFF'
+    page_cross = '(({op} & 0xFF) + y) >> 8'
 
     def addressmode(self):
         return "{inst} ${arg:04X}, Y"
 
-    def addressmode_info(self):
-        return "absolute indexed address ${0:04X} + Y(${1:02X})".format(self.parse_args()[1], self.core.y)
-
 
 class Indirect(BaseMode3):
-    def init_args(self):
-        args = self.parse_args()
-        def _get_arg():
-            return struct.unpack('<H', self.core.memory_str[args[1]:args[1]+2])[0]
-        self.get_arg = _get_arg
+    # only used by JMP. The pointer never crosses a page boundary: JMP ($10FF)
+    # takes the high byte from $1000, just like the real chip.
+    address = 'read({op}) | read(({op} & 0xFF00) | (({op} + 1) & 0xFF)) << 8'
 
     def addressmode(self):
         return "{inst} (${arg:04X})"
 
-    def addressmode_info(self):
-        return "indirect, value from address ${0:04X}".format(self.parse_args()[1])
-
 
 class IndirectX(BaseMode2):
-    def init_args(self):
-        args = self.parse_args()
-        def _get_arg():
-            mem_loc = args[1] + self.core.x
-            val = struct.unpack('<H', self.core.memory_str[mem_loc:mem_loc+2])[0]
-            return self.core.memory[val]
-        self.get_arg = _get_arg
+    address = 'read(({op} + x) & 0xFF) | read(({op} + x + 1) & 0xFF) << 8'
 
     def addressmode(self):
         return "{inst} (${arg:02X}, X)"
 
-    def addressmode_info(self):
-        return "indirect, pre-indexed, value of memory address (${0:02X} + X(${1:02X}))".format(self.parse_args()[1], self.core.x)
-
 
 class IndirectY(BaseMode2):
     """In this mode the contents of a zero-page address (and the following byte)
@@ -181,36 +142,24 @@ class IndirectY(BaseMode2):
           accumulator.
     Note: only the Y-register is used in this mode.
     """
-    def init_args(self):
-        args = self.parse_args(opcode)
-        def _get_arg():
-            val = struct.unpack('<H', self.core.memory_str[args[1]:args[1]+2])[0]
-            return self.core.memory[val + self.core.y]
-        self.get_arg = _get_arg
+    address = '((read({op}) | read(({op} + 1) & 0xFF) << 8) + y) & 0xFFFF'
+    # the low byte of the pointer is what addr was before adding y
+    page_cross = '(((addr - y) & 0xFF) + y) >> 8'
 
     def addressmode(self):
         return "{inst} (${arg:02X}), Y"
 
-    def addressmode_info(self):
-        return "indirect, post-indexed, value of memory address (contents of ${0:02X} + Y(${1:02X}))".format(self.parse_args()[1], self.core.y)
-
 
 class Accumulator(BaseMode1):
-    """In this mode the instruction operates on data in the accumulator. A set_arg
-    function is defined to set the value in the accumulator
+    """In this mode the instruction operates on data in the accumulator. The
+    store sets the value in the accumulator
     """
-    def init_args(self):
-        self.get_arg = lambda: self.core.acc
-        def _set_arg(self, val):
-            self.core.acc = val
-        self.set_arg = _set_arg
-    
+    value = 'a'
+    store = 'a = value'
+
     def addressmode(self):
         return "{inst}"
 
-    def addressmode_info(self):
-        return "value of the accumulator"
-
 
 class Relative(BaseMode2):
     """ This mode is used with Branch-on-Condition instructions. It is probably
@@ -239,19 +188,13 @@ class Relative(BaseMode2):
                opposite branch-on-condition and a JMP.
     """
 
-    _struct_fmt = '<Bb'
-    _struct_len = struct.calcsize(_struct_fmt)
-
-    def init_args(self):
-        args = self.parse_args()
-        self.get_arg = lambda: (args[1] & 0xEF) * (-1 * (args[1] >> 7 & 0x01))
+    # pc already points at the following instruction, see note a) above
+    address = '(pc + ({op} ^ 0x80) - 0x80) & 0xFFFF'
+    zero_page = True
 
-    def adressmode(self):
+    def addressmode(self):
         return "{inst} ${arg:02X}"
 
-    def addressmode_info(self):
-        return "relative, from address ${0:02X}".format(self.parse_args())
-
 
 class Implied(BaseMode1):
     """No operand addresses are required for this mode. They are implied by the
@@ -260,6 +203,3 @@ class Implied(BaseMode1):
 
     def addressmode(self):
         return "{inst}"
-
-    def addressmode_info(self):
-        return "implied"
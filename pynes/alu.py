@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+from pynes.corestatus import C, Z, V, N
+
+
+def build_adc_table():
+    """the result and flags of ADC for every carry, accumulator and operand
+
+    Entry (carry << 16 | a << 8 | operand) holds the result byte in its low
+    8 bits and the C, Z, V and N bits of P above them. Binary SBC is ADC of
+    the inverted operand and CMP is SBC with the carry set, so the one table
+    serves all three: SBC looks up operand ^ 0xFF and CMP also ignores V.
+    """
+    table = []
+    for carry in (0, 1):
+        for a in range(256):
+            for operand in range(256):
+                total = a + operand + carry
+                result = total & 0xFF
+                flags = (total >> 8) | (Z if not result else 0) | (result & N)
+                if ~(a ^ operand) & (a ^ result) & 0x80:
+                    flags |= V
+                table.append(result | flags << 8)
+    return table
+
+
+ADC_TABLE = build_adc_table()
+
+
+def signed(value):
+    return value - 0x100 if value & 0x80 else value
+
+
+def verify():
+    """check the table against ADC, SBC and CMP worked out the long way for
+    every input, returns the number of combinations checked"""
+    checked = 0
+    for carry in (0, 1):
+        for a in range(256):
+            for operand in range(256):
+                total = a + operand + carry
+                sign = signed(a) + signed(operand) + carry
+                check('ADC', ADC_TABLE[carry << 16 | a << 8 | operand], a, operand, carry,
+                      total, total > 0xFF, not -128 <= sign <= 127)
+
+                difference = a - operand - (1 - carry)
+                sign = signed(a) - signed(operand) - (1 - carry)
+                check('SBC', ADC_TABLE[carry << 16 | a << 8 | (operand ^ 0xFF)], a, operand, carry,
+                      difference, difference >= 0, not -128 <= sign <= 127)
+                checked += 2
+    for a in range(256):
+        for operand in range(256):
+            # CMP leaves V alone, so it isn't checked
+            check('CMP', ADC_TABLE[1 << 16 | a << 8 | (operand ^ 0xFF)], a, operand, 1,
+                  a - operand, a >= operand, None)
+            checked += 1
+    return checked
+
+
+def check(name, entry, a, operand, carry, result, carry_out, overflow):
+    flags = entry >> 8
+    got = (entry & 0xFF, bool(flags & C), bool(flags & Z), bool(flags & N), bool(flags & V))
+    expect = (result & 0xFF, carry_out, not result & 0xFF, bool(result & 0x80), overflow)
+    if overflow is None:
+        got = got[:4]
+        expect = expect[:4]
+    if got != expect:
+        raise AssertionError('%s a=$%02X operand=$%02X carry=%d: got %r, expected %r'
+                             % (name, a, operand, carry, got, expect))
+
+
+if __name__ == '__main__':
+    print('%d combinations verified' % verify())
@@ -0,0 +1,571 @@
+import struct
+
+import numpy as np
+
+from pynes.blip import BlipBuffer
+
+LENGTH_TABLE = [
+    10, 254, 20, 2, 40, 4, 80, 6, 160, 8, 60, 10, 14, 12, 26, 14,
+    12, 16, 24, 18, 48, 20, 96, 22, 192, 24, 72, 26, 16, 28, 32, 30,
+]
+
+DUTY_TABLE = np.array([
+    [0, 1, 0, 0, 0, 0, 0, 0],
+    [0, 1, 1, 0, 0, 0, 0, 0],
+    [0, 1, 1, 1, 1, 0, 0, 0],
+    [1, 0, 0, 1, 1, 1, 1, 1],
+], dtype=np.int32)
+
+TRIANGLE_SEQUENCE = np.array(list(range(15, -1, -1)) + list(range(16)), dtype=np.int32)
+
+# periods in CPU cycles
+NOISE_PERIODS = [4, 8, 16, 32, 64, 96, 128, 160, 202, 254, 380, 508, 762, 1016, 2034, 4068]
+DMC_RATES = [428, 380, 340, 320, 286, 254, 226, 214, 190, 160, 142, 128, 106, 84, 72, 54]
+
+# the nonlinear mixer as the usual pair of lookup tables
+PULSE_TABLE = np.array([0.0] + [95.52 / (8128.0 / n + 100) for n in range(1, 31)])
+TND_TABLE = np.array([0.0] + [163.67 / (24329.0 / n + 100) for n in range(1, 203)])
+
+
+def noise_sequence(tap):
+    """the output of the noise shift register, one entry per clock, for the
+    feedback tap of a noise mode. The channel is silent while bit 0 is set."""
+    shift = 1
+    seen = {}
+    out = []
+    while shift not in seen:
+        seen[shift] = len(out)
+        out.append(1 - (shift & 1))
+        feedback = (shift ^ (shift >> tap)) & 1
+        shift = (shift >> 1) | (feedback << 14)
+    return np.array(out[seen[shift]:], dtype=np.int32)
+
+
+NOISE_SEQUENCES = [noise_sequence(1), noise_sequence(6)]
+
+
+def steps(n, timer, period):
+    """for a divider reaching zero at offset ``timer`` and every ``period``
+    cycles after, returns how many times it has fired by each of n cycles"""
+    return np.maximum((np.arange(n) - timer) // period + 1, 0)
+
+
+def fired(n, timer, period):
+    """how many times such a divider fires within n cycles"""
+    return 0 if timer >= n else (n - 1 - timer) // period + 1
+
+
+def pack_state(obj):
+    """the attributes named in obj.STATE packed with obj._state_format"""
+    return struct.pack(obj._state_format, *[getattr(obj, name) for name in obj.STATE])
+
+
+def unpack_state(obj, data, offset):
+    """set the attributes of ``obj`` from pack_state() output at ``offset``
+    of ``data``, returns the offset after it"""
+    size = struct.calcsize(obj._state_format)
+    if len(data) < offset + size:
+        raise APUError('APU snapshot is truncated')
+    for name, value in zip(obj.STATE, struct.unpack_from(obj._state_format, data, offset)):
+        setattr(obj, name, value)
+    return offset + size
+
+
+class APUError(Exception):
+    """generic APU exception"""
+
+
+class Envelope():
+    """volume envelope shared by the pulse and noise channels"""
+    STATE = ('constant', 'loop', 'period', 'start', 'divider', 'decay')
+    _state_format = '<??B?BB'
+
+    def __init__(self):
+        self.constant = False
+        self.loop = False
+        self.period = 0
+        self.start = False
+        self.divider = 0
+        self.decay = 0
+
+    def write(self, value):
+        self.loop = bool(value & 0x20)
+        self.constant = bool(value & 0x10)
+        self.period = value & 0x0F
+
+    def clock(self):
+        if self.start:
+            self.start = False
+            self.decay = 15
+            self.divider = self.period
+        elif self.divider:
+            self.divider -= 1
+        else:
+            self.divider = self.period
+            if self.decay:
+                self.decay -= 1
+            elif self.loop:
+                self.decay = 15
+
+    @property
+    def volume(self):
+        return self.period if self.constant else self.decay
+
+
+class Pulse():
+    STATE = ('enabled', 'duty', 'period', 'length', 'phase', 'timer', 'sweep_enabled', 'sweep_period',
+             'sweep_negate', 'sweep_shift', 'sweep_reload', 'sweep_divider')
+    _state_format = '<?BHBBi?B?B?B'
+
+    def __init__(self, channel):
+        # pulse 1 negates its sweep with one's complement
+        self.complement = 1 if channel == 1 else 0
+        self.envelope = Envelope()
+        self.enabled = False
+        self.duty = 0
+        self.period = 0
+        self.length = 0
+        self.phase = 0
+        self.timer = 0
+        self.sweep_enabled = False
+        self.sweep_period = 0
+        self.sweep_negate = False
+        self.sweep_shift = 0
+        self.sweep_reload = False
+        self.sweep_divider = 0
+
+    def write(self, reg, value):
+        if reg == 0:
+            self.duty = value >> 6
+            self.envelope.write(value)
+        elif reg == 1:
+            self.sweep_enabled = bool(value & 0x80)
+            self.sweep_period = (value >> 4) & 0x07
+            self.sweep_negate = bool(value & 0x08)
+            self.sweep_shift = value & 0x07
+            self.sweep_reload = True
+        elif reg == 2:
+            self.period = (self.period & 0x700) | value
+        else:
+            self.period = (self.period & 0xFF) | (value & 0x07) << 8
+            if self.enabled:
+                self.length = LENGTH_TABLE[value >> 3]
+            self.phase = 0
+            self.envelope.start = True
+
+    def sweep_target(self):
+        change = self.period >> self.sweep_shift
+        if self.sweep_negate:
+            return self.period - change - self.complement
+        return self.period + change
+
+    def muted(self):
+        return self.period < 8 or self.sweep_target() > 0x7FF
+
+    def quarter_frame(self):
+        self.envelope.clock()
+
+    def half_frame(self):
+        if self.length and not self.envelope.loop:
+            self.length -= 1
+        if self.sweep_divider == 0 and self.sweep_enabled and self.sweep_shift and not self.muted():
+            self.period = max(self.sweep_target(), 0)
+        if self.sweep_divider == 0 or self.sweep_reload:
+            self.sweep_divider = self.sweep_period
+            self.sweep_reload = False
+        else:
+            self.sweep_divider -= 1
+
+    def output(self, n):
+        # the sequencer moves every other CPU cycle
+        period = (self.period + 1) * 2
+        count = steps(n, self.timer, period)
+        if self.length and not self.muted() and self.envelope.volume:
+            out = DUTY_TABLE[self.duty][(self.phase + count) % 8] * self.envelope.volume
+        else:
+            out = np.zeros(n, dtype=np.int32)
+        total = fired(n, self.timer, period)
+        self.phase = (self.phase + total) % 8
+        self.timer += total * period - n
+        return out
+
+
+class Triangle():
+    STATE = ('enabled', 'control', 'linear_reload_value', 'linear_reload', 'linear', 'period', 'length',
+             'phase', 'timer')
+    _state_format = '<??B?BHBBi'
+
+    def __init__(self):
+        self.enabled = False
+        self.control = False
+        self.linear_reload_value = 0
+        self.linear_reload = False
+        self.linear = 0
+        self.period = 0
+        self.length = 0
+        self.phase = 0
+        self.timer = 0
+
+    def write(self, reg, value):
+        if reg == 0:
+            self.control = bool(value & 0x80)
+            self.linear_reload_value = value & 0x7F
+        elif reg == 2:
+            self.period = (self.period & 0x700) | value
+        elif reg == 3:
+            self.period = (self.period & 0xFF) | (value & 0x07) << 8
+            if self.enabled:
+                self.length = LENGTH_TABLE[value >> 3]
+            self.linear_reload = True
+
+    def quarter_frame(self):
+        if self.linear_reload:
+            self.linear = self.linear_reload_value
+        elif self.linear:
+            self.linear -= 1
+        if not self.control:
+            self.linear_reload = False
+
+    def half_frame(self):
+        if self.length and not self.control:
+            self.length -= 1
+
+    def output(self, n):
+        # a halted sequencer holds its level, and ultrasonic periods are
+        # treated as halted rather than aliasing all over the spectrum
+        if not (self.length and self.linear) or self.period < 2:
+            return np.full(n, TRIANGLE_SEQUENCE[self.phase], dtype=np.int32)
+        period = self.period + 1
+        out = TRIANGLE_SEQUENCE[(self.phase + steps(n, self.timer, period)) % 32]
+        total = fired(n, self.timer, period)
+        self.phase = (self.phase + total) % 32
+        self.timer += total * period - n
+        return out
+
+
+class Noise():
+    STATE = ('enabled', 'mode', 'period', 'length', 'position', 'timer')
+    _state_format = '<?BHBIi'
+
+    def __init__(self):
+        self.envelope = Envelope()
+        self.enabled = False
+        self.mode = 0
+        self.period = NOISE_PERIODS[0]
+        self.length = 0
+        self.position = 0
+        self.timer = 0
+
+    def write(self, reg, value):
+        if reg == 0:
+            self.envelope.write(value)
+        elif reg == 2:
+            mode = value >> 7
+            if mode != self.mode:
+                # the shift register state isn't tracked across modes, the
+                # new sequence just starts over
+                self.mode = mode
+                self.position = 0
+            self.period = NOISE_PERIODS[value & 0x0F]
+        elif reg == 3:
+            if self.enabled:
+                self.length = LENGTH_TABLE[value >> 3]
+            self.envelope.start = True
+
+    def quarter_frame(self):
+        self.envelope.clock()
+
+    def half_frame(self):
+        if self.length and not self.envelope.loop:
+            self.length -= 1
+
+    def output(self, n):
+        sequence = NOISE_SEQUENCES[self.mode]
+        if self.length and self.envelope.volume:
+            out = sequence[(self.position + steps(n, self.timer, self.period)) % len(sequence)] * self.envelope.volume
+        else:
+            out = np.zeros(n, dtype=np.int32)
+        total = fired(n, self.timer, self.period)
+        self.position = (self.position + total) % len(sequence)
+        self.timer += total * self.period - n
+        return out
+
+
+class DMC():
+    # the bits of the sample fetched but not played yet are saved apart
+    STATE = ('loop', 'rate', 'level', 'sample_address', 'sample_length', 'address', 'remaining', 'timer')
+    _state_format = '<?HBHHHHi'
+
+    def __init__(self, read):
+        self.read = read
+        self.loop = False
+        self.rate = DMC_RATES[0]
+        self.level = 0
+        self.sample_address = 0xC000
+        self.sample_length = 1
+        self.address = 0xC000
+        self.remaining = 0
+        self.bits = []
+        self.timer = 0
+
+    def write(self, reg, value):
+        if reg == 0:
+            self.loop = bool(value & 0x40)
+            self.rate = DMC_RATES[value & 0x0F]
+        elif reg == 1:
+            self.level = value & 0x7F
+        elif reg == 2:
+            self.sample_address = 0xC000 | value << 6
+        else:
+            self.sample_length = (value << 4) | 1
+
+    def restart(self):
+        self.address = self.sample_address
+        self.remaining = self.sample_length
+
+    def fetch(self, count):
+        """the next ``count`` bits of the sample, fewer if it runs out"""
+        bits = self.bits
+        while len(bits) < count and self.remaining:
+            byte = self.read(self.address)
+            bits.extend((byte >> bit) & 1 for bit in range(8))
+            self.address = (self.address + 1) & 0xFFFF | 0x8000
+            self.remaining -= 1
+            if not self.remaining and self.loop:
+                self.restart()
+        self.bits = bits[count:]
+        return bits[:count]
+
+    def output(self, n):
+        total = fired(n, self.timer, self.rate)
+        bits = self.fetch(total) if total else []
+        if not bits:
+            out = np.full(n, self.level, dtype=np.int32)
+        else:
+            bits = np.array(bits, dtype=np.int32)
+            levels = self.level + np.cumsum(bits * 4 - 2)
+            if levels.min() < 0 or levels.max() > 127:
+                # the level saturates instead of wrapping, walk the bits
+                level = self.level
+                for index, bit in enumerate(bits):
+                    if bit and level <= 125:
+                        level += 2
+                    elif not bit and level >= 2:
+                        level -= 2
+                    levels[index] = level
+            levels = np.concatenate(([self.level], levels))
+            count = np.minimum(steps(n, self.timer, self.rate), len(bits))
+            out = levels[count]
+            self.level = int(levels[-1])
+        self.timer += total * self.rate - n
+        return out
+
+
+class APU():
+    """The 2A03 sound hardware: two pulse channels, triangle, noise and DMC
+
+    Register writes are applied at the CPU cycle they happen on. Between two
+    writes (or frame counter steps) the channel parameters are constant, so
+    each channel renders that whole segment in one go with array operations:
+    the positions of its sequencer at every CPU cycle are computed from the
+    timer, and the levels looked up from its waveform table. Only the cycles
+    where the mixed output changes are kept, and they go into a BlipBuffer
+    as band-limited steps at the output rate.
+    """
+    # frame counter steps, in CPU cycles from the start of the sequence
+    FRAME_STEPS = {
+        4: [(7457, True, False), (14913, True, True), (22371, True, False), (29829, True, True)],
+        5: [(7457, True, False), (14913, True, True), (22371, True, False), (29829, False, False), (37281, True, True)],
+    }
+    FRAME_LENGTH = {4: 29830, 5: 37282}
+
+    CHANNELS = ('pulse1', 'pulse2', 'triangle', 'noise', 'dmc')
+    STATE = ('cycle', 'frame_mode', 'frame_start', 'frame_step', 'frame_cycle', 'level')
+    _state_format = '<QBQBQd'
+
+    # snapshots: the version, STATE, each channel (with its envelope) and
+    # the DMC bits, then the offset, level and buffer of the BlipBuffer
+    SNAPSHOT_VERSION = 1
+    _bits_format = '<I'
+    _blip_format = '<ddI'
+
+    def __init__(self, clock, sample_rate=44100, read=None):
+        self.clock = clock
+        self.sample_rate = sample_rate
+        self.pulse1 = Pulse(1)
+        self.pulse2 = Pulse(2)
+        self.triangle = Triangle()
+        self.noise = Noise()
+        self.dmc = DMC(read or (lambda addr: 0))
+        self.channels = [self.pulse1, self.pulse2, self.triangle, self.noise]
+
+        self.cycle = 0
+        self.frame_mode = 4
+        self.frame_start = 0
+        self.frame_step = 0
+
+        self.blip = BlipBuffer(clock, sample_rate)
+        self.frame_cycle = 0
+        self.level = 0.0
+
+    def write(self, cycle, addr, value):
+        """write ``value`` to the register at ``addr`` on CPU cycle ``cycle``"""
+        self.run(cycle)
+        reg = addr - 0x4000
+        if reg < 0x10:
+            channel = (self.pulse1, self.pulse2, self.triangle, self.noise)[reg >> 2]
+            channel.write(reg & 0x03, value)
+        elif reg < 0x14:
+            self.dmc.write(reg & 0x03, value)
+        elif reg == 0x15:
+            for bit, channel in enumerate(self.channels):
+                channel.enabled = bool(value & (1 << bit))
+                if not channel.enabled:
+                    channel.length = 0
+            if not value & 0x10:
+                self.dmc.remaining = 0
+            elif not self.dmc.remaining:
+                self.dmc.restart()
+        elif reg == 0x17:
+            self.frame_mode = 5 if value & 0x80 else 4
+            self.frame_start = cycle
+            self.frame_step = 0
+            if value & 0x80:
+                self.quarter_frame()
+                self.half_frame()
+
+    def read_status(self, cycle):
+        """the value of $4015 on CPU cycle ``cycle``"""
+        self.run(cycle)
+        status = 0
+        for bit, channel in enumerate(self.channels):
+            if channel.length:
+                status |= 1 << bit
+        if self.dmc.remaining:
+            status |= 0x10
+        return status
+
+    def snapshot(self):
+        """the state of the channels, the frame counter and the output
+        buffer as bytes, for Core6502.snapshot"""
+        parts = [bytes([self.SNAPSHOT_VERSION]), pack_state(self)]
+        for name in self.CHANNELS:
+            channel = getattr(self, name)
+            parts.append(pack_state(channel))
+            if hasattr(channel, 'envelope'):
+                parts.append(pack_state(channel.envelope))
+        bits = self.dmc.bits
+        parts.append(struct.pack(self._bits_format, len(bits)))
+        parts.append(bytes(bits))
+        blip = self.blip
+        parts.append(struct.pack(self._blip_format, blip.offset, blip.level, len(blip.buffer)))
+        parts.append(np.asarray(blip.buffer, dtype='<f8').tobytes())
+        return b''.join(parts)
+
+    def restore(self, snapshot):
+        """go back to the state saved by snapshot(), the APU has to run at
+        the same clock and sample rate"""
+        if not snapshot or snapshot[0] != self.SNAPSHOT_VERSION:
+            raise APUError('not a version %d APU snapshot' % self.SNAPSHOT_VERSION)
+        offset = unpack_state(self, snapshot, 1)
+        for name in self.CHANNELS:
+            channel = getattr(self, name)
+            offset = unpack_state(channel, snapshot, offset)
+            if hasattr(channel, 'envelope'):
+                offset = unpack_state(channel.envelope, snapshot, offset)
+
+        size = struct.calcsize(self._bits_format)
+        if len(snapshot) < offset + size:
+            raise APUError('APU snapshot is truncated')
+        count, = struct.unpack_from(self._bits_format, snapshot, offset)
+        offset += size
+        if len(snapshot) < offset + count:
+            raise APUError('APU snapshot is truncated')
+        self.dmc.bits = list(snapshot[offset:offset + count])
+        offset += count
+
+        size = struct.calcsize(self._blip_format)
+        if len(snapshot) < offset + size:
+            raise APUError('APU snapshot is truncated')
+        blip = self.blip
+        blip.offset, blip.level, count = struct.unpack_from(self._blip_format, snapshot, offset)
+        offset += size
+        if len(snapshot) != offset + count * 8:
+            raise APUError('APU snapshot is corrupt')
+        blip.buffer = np.frombuffer(snapshot, dtype='<f8', count=count, offset=offset).astype(np.float64)
+
+    def quarter_frame(self):
+        for channel in (self.pulse1, self.pulse2, self.triangle, self.noise):
+            channel.quarter_frame()
+
+    def half_frame(self):
+        for channel in (self.pulse1, self.pulse2, self.triangle, self.noise):
+            channel.half_frame()
+
+    def run(self, cycle):
+        """synthesize up to ``cycle``, in segments split at frame counter steps"""
+        while self.cycle < cycle:
+            steps = self.FRAME_STEPS[self.frame_mode]
+            at, quarter, half = steps[self.frame_step]
+            event = self.frame_start + at
+            end = min(cycle, event)
+            if end > self.cycle:
+                self.synthesize(end - self.cycle)
+                self.cycle = end
+            if end == event:
+                if quarter:
+                    self.quarter_frame()
+                if half:
+                    self.half_frame()
+                self.frame_step += 1
+                if self.frame_step == len(steps):
+                    self.frame_step = 0
+                    self.frame_start += self.FRAME_LENGTH[self.frame_mode]
+
+    def synthesize(self, n):
+        pulse = PULSE_TABLE[self.pulse1.output(n) + self.pulse2.output(n)]
+        tnd = TND_TABLE[3 * self.triangle.output(n) + 2 * self.noise.output(n) + self.dmc.output(n)]
+        wave = pulse + tnd
+        deltas = np.diff(wave, prepend=self.level)
+        changes = np.flatnonzero(deltas)
+        self.blip.add_steps(changes + (self.cycle - self.frame_cycle), deltas[changes])
+        self.level = wave[-1]
+
+    def end_frame(self, cycle):
+        """synthesize up to ``cycle`` and return the samples at the output rate
+        produced since the last call, as float32 between 0 and 1"""
+        self.run(cycle)
+        samples = self.blip.end_frame(self.cycle - self.frame_cycle)
+        self.frame_cycle = self.cycle
+        return samples.astype(np.float32)
+
+
+def replay(log, nsf_file, sample_rate=44100, batch_frames=60):
+    """generator synthesizing a RegisterLog recorded while playing
+    ``nsf_file``, yields the audio of ``batch_frames`` frames at a time.
+
+    The program data is still needed for DMC samples, bank switches in the
+    log are applied to it as they come. The first frame in the log is the
+    INIT call, which is dropped like it is during live playback.
+    """
+    from pynes.core6502 import Core6502
+    core = Core6502()
+    core.load(nsf_file)
+    apu = APU(log.clock, sample_rate, core.read)
+    cycles, registers, values, frames = log.cycles, log.registers, log.values, log.frames
+    index = 0
+    for batch in range(0, len(frames), batch_frames):
+        for frame in range(batch, min(batch + batch_frames, len(frames))):
+            end = frames[frame]
+            while index < len(cycles) and cycles[index] <= end:
+                addr = registers[index]
+                if addr < 0x4018:
+                    apu.write(cycles[index], addr, values[index])
+                else:
+                    apu.run(cycles[index])
+                    core.write(addr, values[index])
+                index += 1
+            if frame == 0:
+                apu.end_frame(end)
+        if frame:
+            yield apu.end_frame(end)
@@ -0,0 +1,117 @@
+import struct
+import sys
+from array import array
+
+
+class RegisterLogError(Exception):
+    """generic RegisterLog exception"""
+
+
+class RegisterLog():
+    """A compact stream of timestamped sound register writes
+
+    Attached to a core in place of an APU, it records every write to
+    $4000-$4017 as (cycle, register, value) in three parallel arrays instead
+    of synthesizing anything, along with the cycle each frame ended on. Writes
+    to the bank registers and to the expansion sound chips declared by the
+    NSF header are recorded too, so a synthesizer can replay the log later,
+    in batches and in another process, without running the CPU again.
+    """
+    MAGIC = b'NSRL'
+    VERSION = 1
+    _header_format = '<4sHdII'
+    _header_len = struct.calcsize(_header_format)
+
+    # registers of the expansion chips, as in NSFFile.SOUND_CHIPS
+    EXPANSION_RANGES = {
+        'vrcvi': [(0x9000, 0x9003), (0xA000, 0xA002), (0xB000, 0xB002)],
+        'vrcvii': [(0x9010, 0x9010), (0x9030, 0x9030)],
+        'fds sound': [(0x4040, 0x408A)],
+        'mmc5 audio': [(0x5000, 0x5015)],
+        'namco 106': [(0x4800, 0x4800), (0xF800, 0xF800)],
+        'sunsoft fme-07': [(0xC000, 0xC000), (0xE000, 0xE000)],
+    }
+    BANK_RANGE = (0x5FF8, 0x5FFF)
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.cycles = array('Q')
+        self.registers = array('H')
+        self.values = array('B')
+        self.frames = array('Q')
+        self.enabled = 0
+
+    def __len__(self):
+        return len(self.cycles)
+
+    def attach(self, core, nsf_file):
+        """make ``core`` record its sound register writes into this log"""
+        core.apu = self
+        ranges = [self.BANK_RANGE]
+        for chip in nsf_file.extra_sound_chips:
+            ranges.extend(self.EXPANSION_RANGES[chip])
+        for first, last in ranges:
+            self.watch(core, first, last)
+
+    def watch(self, core, first, last):
+        """record the writes to [first, last] on top of whatever the memory
+        does with them"""
+        memory = core.memory
+        record = self.write
+        for page in range(first >> 8, (last >> 8) + 1):
+            previous = memory.write_handlers[page]
+            write_page = memory.write_pages[page]
+
+            def handler(addr, value, previous=previous, write_page=write_page):
+                if first <= addr <= last:
+                    record(core.cycles, addr, value)
+                if previous is None:
+                    write_page[addr & 0xFF] = value
+                else:
+                    previous(addr, value)
+            memory.map_io(page, memory.read_handlers[page], handler)
+
+    def write(self, cycle, addr, value):
+        self.cycles.append(cycle)
+        self.registers.append(addr)
+        self.values.append(value)
+        if addr == 0x4015:
+            self.enabled = value & 0x1F
+
+    def read_status(self, cycle):
+        # nothing is synthesized, so the best answer for $4015 is which
+        # channels the driver left enabled
+        return self.enabled
+
+    def end_frame(self, cycle):
+        self.frames.append(cycle)
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            f.write(struct.pack(self._header_format, self.MAGIC, self.VERSION, self.clock,
+                                len(self.cycles), len(self.frames)))
+            for data in (self.cycles, self.registers, self.values, self.frames):
+                if sys.byteorder != 'little':
+                    data = array(data.typecode, data)
+                    data.byteswap()
+                data.tofile(f)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            header = f.read(cls._header_len)
+            if len(header) != cls._header_len:
+                raise RegisterLogError('%s is not a register log' % path)
+            magic, version, clock, writes, frames = struct.unpack(cls._header_format, header)
+            if magic != cls.MAGIC or version != cls.VERSION:
+                raise RegisterLogError('%s is not a version %d register log' % (path, cls.VERSION))
+            log = cls(clock)
+            try:
+                for data, count in ((log.cycles, writes), (log.registers, writes),
+                                    (log.values, writes), (log.frames, frames)):
+                    data.fromfile(f, count)
+                    if sys.byteorder != 'little':
+                        data.byteswap()
+            except EOFError:
+                raise RegisterLogError('%s is truncated' % path)
+        return log
@@ -0,0 +1,61 @@
+class BankSwitcher():
+    """NSF bankswitching of $8000-$FFFF in 4KB banks
+
+    The program data is split into 4KB banks, the first one offset by the low
+    12 bits of the load address. Writing n to $5FF8 + i maps bank n at
+    $8000 + i * $1000 by pointing 16 entries of the page table at memoryview
+    slices of the data, so a switch never copies the bank. Only the first and
+    last bank are copied once if the padding leaves them short.
+    """
+    FIRST_REGISTER = 0x5FF8
+    BANK_SIZE = 0x1000
+    PAGES_PER_BANK = BANK_SIZE >> 8
+
+    def __init__(self, memory, data, load_address, initial_banks, on_switch=None):
+        self.memory = memory
+        self.on_switch = on_switch
+        self.initial_banks = bytearray(initial_banks)
+        self.registers = bytearray(8)
+        self.banks = []
+
+        data = memoryview(data)
+        padding = load_address & (self.BANK_SIZE - 1)
+        offset = -padding
+        while offset < len(data):
+            if offset >= 0 and offset + self.BANK_SIZE <= len(data):
+                bank = data[offset:offset + self.BANK_SIZE]
+            else:
+                bank = bytearray(self.BANK_SIZE)
+                start = max(offset, 0)
+                end = min(offset + self.BANK_SIZE, len(data))
+                bank[start - offset:end - offset] = data[start:end]
+                bank = memoryview(bank)
+            self.banks.append([bank[page << 8:(page + 1) << 8] for page in range(self.PAGES_PER_BANK)])
+            offset += self.BANK_SIZE
+
+        for page in range(0x80, 0x100):
+            memory.write_pages[page] = memory.sink
+        memory.map_io(self.FIRST_REGISTER >> 8, None, self.write_register)
+        self.reset()
+
+    def reset(self):
+        """map the banks given in the NSF header"""
+        for frame, bank in enumerate(self.initial_banks):
+            self.switch(frame, bank, force=True)
+
+    def write_register(self, addr, value):
+        if addr >= self.FIRST_REGISTER:
+            self.switch(addr - self.FIRST_REGISTER, value)
+        else:
+            self.memory.data[addr] = value
+
+    def switch(self, frame, bank, force=False):
+        """map ``bank`` into the 4KB frame at $8000 + frame * $1000"""
+        if self.registers[frame] == bank and not force:
+            return
+        self.registers[frame] = bank
+        first = (0x8000 >> 8) + frame * self.PAGES_PER_BANK
+        self.memory.read_pages[first:first + self.PAGES_PER_BANK] = self.banks[bank % len(self.banks)]
+        if self.on_switch is not None:
+            start = first << 8
+            self.on_switch(start, start + self.BANK_SIZE)
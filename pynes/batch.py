@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from pynes.nsfinfo import NSFFile, NSFFileError
+from pynes.loopdetect import loop_seconds
+from pynes.render import LOOP_FADE, render, write_wav
+
+
+class JobTimeout(Exception):
+    """a render job ran past its deadline"""
+
+
+def find_nsf_files(paths):
+    """the .nsf files in ``paths``, directories searched recursively, as
+    (path, root) pairs where root is what output paths are relative to"""
+    for path in paths:
+        if os.path.isdir(path):
+            for directory, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    if name.lower().endswith('.nsf'):
+                        yield os.path.join(directory, name), path
+        else:
+            yield path, os.path.dirname(path)
+
+
+def output_path(out_dir, nsf_path, root, song):
+    """where song ``song`` of ``nsf_path`` goes, mirroring the layout of the
+    directory it was found in"""
+    stem = os.path.splitext(os.path.relpath(nsf_path, root or '.'))[0]
+    return os.path.join(out_dir, '%s-%02d.wav' % (stem, song))
+
+
+def render_job(nsf_path, song, output, seconds, sample_rate, timeout, loops=None, silence=None):
+    """render one song to ``output``, runs in a worker process. The WAV is
+    written next to its final name and only moved there once complete, so
+    an interrupted job never looks done. With ``loops``, songs that loop
+    play their loop that many times and fade out instead of playing for
+    ``seconds``, and with ``silence`` a song ends once it has been silent
+    for that many seconds. Returns the manifest entry."""
+    start = time.time()
+    deadline = start + timeout if timeout else None
+    temp = output + '.part'
+    entry = {'file': nsf_path, 'song': song, 'output': output, 'seconds': seconds}
+
+    def check_deadline():
+        if deadline is not None and time.time() > deadline:
+            raise JobTimeout('timed out after %gs' % timeout)
+
+    def timed(chunks):
+        for chunk in chunks:
+            check_deadline()
+            yield chunk
+
+    try:
+        directory = os.path.dirname(output)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory, exist_ok=True)
+        fade = 0.0
+        if loops is not None:
+            # loop detection plays the song too, it gets the same deadline
+            looped = loop_seconds(nsf_path, song, loops, deadline=deadline)
+            check_deadline()
+            if looped is not None:
+                fade = LOOP_FADE
+                seconds = looped + fade
+        with open(temp, 'wb') as out:
+            written = write_wav(out, timed(render(nsf_path, song, seconds, sample_rate, fade=fade, silence=silence)),
+                                sample_rate, int(seconds * sample_rate))
+        entry['seconds'] = round(written / float(sample_rate), 3)
+        os.replace(temp, output)
+        entry['status'] = 'ok'
+    except JobTimeout as e:
+        entry['status'] = 'timeout'
+        entry['error'] = str(e)
+    except Exception as e:
+        entry['status'] = 'error'
+        entry['error'] = '%s: %s' % (type(e).__name__, e)
+    finally:
+        if os.path.exists(temp):
+            os.remove(temp)
+    entry['elapsed'] = round(time.time() - start, 3)
+    return entry
+
+
+def read_manifest(path):
+    """the entries of the manifest at ``path``, empty if there is none"""
+    entries = []
+    if os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    try:
+                        entries.append(json.loads(line))
+                    except ValueError:
+                        # the last line of an interrupted batch may be cut off
+                        pass
+    return entries
+
+
+def batch(paths, out_dir, seconds=180.0, sample_rate=44100, workers=None, timeout=600, manifest=None,
+          loops=None, silence=None):
+    """generator rendering every song of every NSF file in ``paths`` into
+    ``out_dir`` on a pool of ``workers`` processes (all cores by default),
+    yields the manifest entry of each job as it finishes.
+
+    Every entry is also appended to the JSON lines ``manifest`` (by default
+    manifest.jsonl in ``out_dir``). Songs the manifest lists as rendered,
+    whose output still exists, are skipped, so rerunning an interrupted
+    batch picks up where it stopped. Failed and timed out jobs are retried.
+    See render_job for ``loops`` and ``silence``.
+    """
+    manifest = manifest or os.path.join(out_dir, 'manifest.jsonl')
+    done = set()
+    for entry in read_manifest(manifest):
+        if entry.get('status') == 'ok' and os.path.exists(entry['output']):
+            done.add((entry['file'], entry['song']))
+    if not os.path.isdir(out_dir):
+        os.makedirs(out_dir, exist_ok=True)
+
+    with open(manifest, 'a') as log, ProcessPoolExecutor(workers) as pool:
+        def record(entry):
+            log.write(json.dumps(entry, sort_keys=True) + '\n')
+            log.flush()
+            return entry
+
+        futures = []
+        for nsf_path, root in find_nsf_files(paths):
+            nsf_path = os.path.abspath(nsf_path)
+            try:
+                total_songs = NSFFile(nsf_path).total_songs
+            except NSFFileError as e:
+                yield record({'file': nsf_path, 'song': None, 'status': 'error', 'error': str(e)})
+                continue
+            for song in range(1, total_songs + 1):
+                if (nsf_path, song) in done:
+                    continue
+                output = os.path.abspath(output_path(out_dir, nsf_path, os.path.abspath(root), song))
+                futures.append(pool.submit(render_job, nsf_path, song, output, seconds, sample_rate, timeout,
+                                           loops, silence))
+
+        for future in as_completed(futures):
+            yield record(future.result())
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='render every song of NSF files and directories of them')
+    parser.add_argument('out_dir')
+    parser.add_argument('paths', nargs='+')
+    parser.add_argument('-t', '--seconds', type=float, default=180.0)
+    parser.add_argument('-r', '--rate', type=int, default=44100)
+    parser.add_argument('-j', '--workers', type=int, default=None)
+    parser.add_argument('--timeout', type=float, default=600, help='seconds per song, 0 for none')
+    parser.add_argument('--manifest', default=None)
+    parser.add_argument('-l', '--loops', type=int, default=None,
+                        help='play songs that loop this many times through their loop instead of for seconds')
+    parser.add_argument('--silence', type=float, default=None,
+                        help='end songs once they have been silent for this many seconds')
+    args = parser.parse_args()
+    counts = {}
+    for entry in batch(args.paths, args.out_dir, args.seconds, args.rate, args.workers, args.timeout, args.manifest,
+                       args.loops, args.silence):
+        counts[entry['status']] = counts.get(entry['status'], 0) + 1
+        print('%-7s %s #%s%s' % (entry['status'], entry['file'], entry['song'],
+                                 ' (%s)' % entry['error'] if 'error' in entry else ''))
+    print(', '.join('%d %s' % (count, status) for status, count in sorted(counts.items())) or 'nothing to do')
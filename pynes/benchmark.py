@@ -0,0 +1,288 @@
+#!/usr/bin/env python
+import json
+import os
+import platform
+import struct
+import sys
+import tempfile
+import time
+
+from pynes.core6502 import Core6502
+from pynes.nsfinfo import NSFFile
+from pynes.profiler import Profiler
+
+GROUPS = ['cpu', 'synthesis', 'render']
+NTSC_CLOCK = 1789772.7272
+NTSC_FRAME_RATE = 1000000.0 / 16639
+
+# the CPU programs run from $8000 and loop forever
+PROGRAMS = {
+    # DEX; BNE back to DEX; DEY; JMP back to DEX
+    'tight_loop': [
+        0xA2, 0x00,                 # $8000 LDX #$00
+        0xA0, 0x00,                 # $8002 LDY #$00
+        0xCA,                       # $8004 DEX
+        0xD0, 0xFD,                 # $8005 BNE $8004
+        0x88,                       # $8007 DEY
+        0x4C, 0x04, 0x80,           # $8008 JMP $8004
+    ],
+    # copy a page, change the source and copy it again
+    'memcpy': [
+        0xA2, 0x00,                 # $8000 LDX #$00
+        0xBD, 0x00, 0x03,           # $8002 LDA $0300,X
+        0x9D, 0x00, 0x04,           # $8005 STA $0400,X
+        0xE8,                       # $8008 INX
+        0xD0, 0xF7,                 # $8009 BNE $8002
+        0xEE, 0x00, 0x03,           # $800B INC $0300
+        0x4C, 0x00, 0x80,           # $800E JMP $8000
+    ],
+    # ADC, SBC, shifts, EOR and CMP on zero page values
+    'arithmetic': [
+        0x18,                       # $8000 CLC
+        0xA5, 0x10,                 # $8001 LDA $10
+        0x65, 0x11,                 # $8003 ADC $11
+        0x85, 0x10,                 # $8005 STA $10
+        0xE9, 0x03,                 # $8007 SBC #$03
+        0x2A,                       # $8009 ROL A
+        0x45, 0x12,                 # $800A EOR $12
+        0x85, 0x12,                 # $800C STA $12
+        0x4A,                       # $800E LSR A
+        0x69, 0x07,                 # $800F ADC #$07
+        0x85, 0x11,                 # $8011 STA $11
+        0xC5, 0x10,                 # $8013 CMP $10
+        0xE6, 0x13,                 # $8015 INC $13
+        0x4C, 0x00, 0x80,           # $8017 JMP $8000
+    ],
+    # a counter deciding a different path through the branches every time
+    'branchy': [
+        0xE6, 0x10,                 # $8000 INC $10
+        0xA5, 0x10,                 # $8002 LDA $10
+        0x29, 0x01,                 # $8004 AND #$01
+        0xF0, 0x06,                 # $8006 BEQ $800E
+        0xA5, 0x10,                 # $8008 LDA $10
+        0x29, 0x02,                 # $800A AND #$02
+        0xD0, 0x04,                 # $800C BNE $8012
+        0xC9, 0x00,                 # $800E CMP #$00
+        0xB0, 0x02,                 # $8010 BCS $8014
+        0x30, 0x00,                 # $8012 BMI $8014
+        0xA5, 0x10,                 # $8014 LDA $10
+        0x10, 0x02,                 # $8016 BPL $801A
+        0xE6, 0x11,                 # $8018 INC $11
+        0x4C, 0x00, 0x80,           # $801A JMP $8000
+    ],
+    # JSR/RTS and pushes and pulls
+    'stack': [
+        0x20, 0x0C, 0x80,           # $8000 JSR $800C
+        0x48,                       # $8003 PHA
+        0x08,                       # $8004 PHP
+        0x28,                       # $8005 PLP
+        0x68,                       # $8006 PLA
+        0xE8,                       # $8007 INX
+        0x4C, 0x00, 0x80,           # $8008 JMP $8000
+        0xEA,                       # $800B NOP
+        0x48,                       # $800C PHA
+        0x8A,                       # $800D TXA
+        0x48,                       # $800E PHA
+        0x68,                       # $800F PLA
+        0xAA,                       # $8010 TAX
+        0x68,                       # $8011 PLA
+        0x60,                       # $8012 RTS
+    ],
+}
+
+CORE_MODES = {
+    'interpreter': {},
+    'decode_cache': {'decode_cache': True},
+    'translate': {'translate': True},
+}
+
+# the register writes INIT makes for each channel, and the register PLAY
+# writes a frame counter into (with a mask) so the sound keeps changing
+CHANNELS = {
+    'pulse1': ([(0x4000, 0xBF), (0x4001, 0x00), (0x4002, 0xFD), (0x4003, 0x00)], (0x4002, 0xFF)),
+    'pulse2': ([(0x4004, 0x7F), (0x4005, 0x00), (0x4006, 0x80), (0x4007, 0x01)], (0x4006, 0xFF)),
+    'triangle': ([(0x4008, 0xFF), (0x400A, 0x7F), (0x400B, 0x00)], (0x400A, 0xFF)),
+    'noise': ([(0x400C, 0x3F), (0x400E, 0x04), (0x400F, 0x08)], (0x400E, 0x0F)),
+    # a looping sample of 4081 bytes at $C000
+    'dmc': ([(0x4010, 0x4F), (0x4012, 0x00), (0x4013, 0xFF)], None),
+}
+DMC_SAMPLE = 0xC000
+
+
+def make_nsf(path, channels):
+    """write an NSF file playing ``channels`` (names from CHANNELS) to ``path``"""
+    init = []
+    play = [0xE6, 0x10]                                   # INC $10
+    for name in channels:
+        writes, modulated = CHANNELS[name]
+        for addr, value in writes:
+            init += [0xA9, value, 0x8D, addr & 0xFF, addr >> 8]
+        if modulated is not None:
+            addr, mask = modulated
+            play += [0xA5, 0x10, 0x29, mask, 0x8D, addr & 0xFF, addr >> 8]
+    init += [0xA9, 0x1F, 0x8D, 0x15, 0x40, 0x60]          # enable the channels, RTS
+    play += [0x60]
+
+    data = bytearray(DMC_SAMPLE - 0x8000 + 0x1000)
+    code = init + play
+    data[:len(code)] = bytes(code)
+    for i in range(0x1000):
+        data[DMC_SAMPLE - 0x8000 + i] = (i * 73 + 17) & 0xFF
+    header = struct.pack(NSFFile._struct_format, b'NESM\x1A', b'\x01', b'\x01', b'\x01',
+                         0x8000, 0x8000, 0x8000 + len(init), b'benchmark', b'pynes', b'',
+                         16639, bytes(8), 19997, b'\x00', b'\x00', bytes(4))
+    with open(path, 'wb') as f:
+        f.write(header + data)
+
+
+def best_time(func, repeat, setup=None):
+    """the shortest of ``repeat`` runs of func(), or of func(setup()) with
+    the setup left out of the time"""
+    best = None
+    for i in range(repeat):
+        args = (setup(),) if setup is not None else ()
+        start = time.perf_counter()
+        func(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def program_core(program, **kwargs):
+    core = Core6502(**kwargs)
+    core.memory.map_rom(0x8000, bytes(program))
+    core.pc = 0x8000
+    return core
+
+
+def bench_cpu(cycles, repeat):
+    """instructions per second of each program in each core mode"""
+    results = {}
+    for name, program in sorted(PROGRAMS.items()):
+        # the programs are deterministic, so count the instructions once
+        core = program_core(program)
+        core.profiler = Profiler()
+        core.run(cycles)
+        instructions = core.profiler.instructions()
+        for mode, kwargs in sorted(CORE_MODES.items()):
+            elapsed = best_time(lambda core: core.run(cycles), repeat,
+                                lambda: program_core(program, **kwargs))
+            results['cpu/%s/%s' % (name, mode)] = {
+                'per_second': instructions / elapsed,
+                'unit': 'instructions',
+                'realtime': cycles / elapsed / NTSC_CLOCK,
+            }
+    return results
+
+
+def bench_synthesis(directory, frames, repeat, sample_rate):
+    """emulated frames per second of an NSF file playing each channel"""
+    from pynes.nsfplayer import NSFPlayer
+    results = {}
+    for name in sorted(CHANNELS):
+        path = os.path.join(directory, '%s.nsf' % name)
+        make_nsf(path, [name])
+
+        def play():
+            player = NSFPlayer(path, sample_rate=sample_rate)
+            player.init()
+            for frame in range(frames):
+                player.play_frame()
+        elapsed = best_time(play, repeat)
+        results['synthesis/%s' % name] = {
+            'per_second': frames / elapsed,
+            'unit': 'frames',
+            'realtime': frames / elapsed / NTSC_FRAME_RATE,
+        }
+    return results
+
+
+def bench_render(directory, seconds, repeat, sample_rate):
+    """render of an NSF file playing every channel, start to PCM bytes"""
+    from pynes.render import render
+    path = os.path.join(directory, 'all.nsf')
+    make_nsf(path, sorted(CHANNELS))
+
+    def run():
+        for chunk in render(path, None, seconds, sample_rate):
+            pass
+    elapsed = best_time(run, repeat)
+    return {'render/all_channels': {
+        'per_second': seconds * NTSC_FRAME_RATE / elapsed,
+        'unit': 'frames',
+        'realtime': seconds / elapsed,
+    }}
+
+
+def run_benchmarks(groups=GROUPS, scale=1.0, repeat=3, sample_rate=44100):
+    """run the benchmark ``groups``, ``scale`` multiplies how much work each
+    one does. Returns the JSON-ready report."""
+    results = {}
+    if 'cpu' in groups:
+        results.update(bench_cpu(int(2000000 * scale), repeat))
+    with tempfile.TemporaryDirectory() as directory:
+        if 'synthesis' in groups:
+            results.update(bench_synthesis(directory, int(300 * scale), repeat, sample_rate))
+        if 'render' in groups:
+            results.update(bench_render(directory, 5.0 * scale, repeat, sample_rate))
+    return {
+        'python': '%s %s' % (platform.python_implementation(), platform.python_version()),
+        'machine': platform.machine(),
+        'scale': scale,
+        'results': results,
+    }
+
+
+def compare(report, baseline, threshold=0.1):
+    """the benchmarks in ``report`` more than ``threshold`` slower than in
+    ``baseline``, as (name, baseline per second, per second) tuples"""
+    regressions = []
+    for name, result in sorted(report['results'].items()):
+        base = baseline['results'].get(name)
+        if base is not None and result['per_second'] < base['per_second'] * (1 - threshold):
+            regressions.append((name, base['per_second'], result['per_second']))
+    return regressions
+
+
+def format_report(report, baseline=None):
+    lines = ['%s on %s' % (report['python'], report['machine'])]
+    for name, result in sorted(report['results'].items()):
+        line = '%-36s %12.0f %s/s %8.2fx realtime' % (name, result['per_second'], result['unit'],
+                                                       result['realtime'])
+        base = baseline['results'].get(name) if baseline else None
+        if base is not None:
+            line += '  %+6.1f%%' % (100.0 * (result['per_second'] / base['per_second'] - 1))
+        lines.append(line)
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='benchmark the CPU core, the APU and rendering')
+    parser.add_argument('groups', nargs='*', help='some of %s, all of them if none are given' % ', '.join(GROUPS))
+    parser.add_argument('-s', '--scale', type=float, default=1.0, help='how much work to do, 0.1 for a quick run')
+    parser.add_argument('-n', '--repeat', type=int, default=3, help='keep the best of this many runs')
+    parser.add_argument('-r', '--rate', type=int, default=44100)
+    parser.add_argument('--json', default=None, help='write the results to this file, e.g. to make a baseline')
+    parser.add_argument('--baseline', default=None, help='compare against the results in this file')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='how much slower than the baseline counts as a regression')
+    args = parser.parse_args()
+    for group in args.groups:
+        if group not in GROUPS:
+            parser.error('unknown benchmark group %s' % group)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    report = run_benchmarks(args.groups or GROUPS, args.scale, args.repeat, args.rate)
+    print(format_report(report, baseline))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=1, sort_keys=True)
+    if baseline is not None:
+        regressions = compare(report, baseline, args.threshold)
+        for name, base, current in regressions:
+            print('regression: %s %.0f/s, baseline %.0f/s' % (name, current, base))
+        sys.exit(1 if regressions else 0)
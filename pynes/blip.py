@@ -0,0 +1,120 @@
+from fractions import Fraction
+
+import numpy as np
+
+
+def step_kernel(width, phases, cutoff):
+    """the band-limited step as ``phases`` rows of ``width`` differences
+
+    Row p is a unit step happening p/phases of the way between two output
+    samples, differentiated so it can be summed into a buffer that is
+    integrated on the way out. ``cutoff`` is relative to the output rate.
+    """
+    x = (np.arange(width * phases) + 0.5) / phases - width / 2.0
+    impulse = np.sinc(2 * cutoff * x) * np.blackman(width * phases)
+    step = np.cumsum(impulse) / impulse.sum()
+    index = np.arange(width) * phases - np.arange(phases)[:, None]
+    values = np.where(index >= 0, step[np.maximum(index, 0)], 0.0)
+    kernel = np.diff(values, prepend=0.0)
+    # whatever is left of the step lands on the last tap so each row sums to 1
+    kernel[:, -1] += 1.0 - kernel.sum(axis=1)
+    return kernel
+
+
+class BlipBuffer():
+    """Band-limited synthesis of a stepped waveform at the output rate
+
+    Instead of rendering a waveform at the source clock and decimating it,
+    every change in level is added to the buffer as a band-limited step,
+    taken from a precomputed table by the fractional output sample the
+    change falls on. The buffer holds the differences, so reading it out is
+    a running sum, and the source clock to output rate ratio can be
+    anything. The output lags the input by WIDTH / 2 samples.
+    """
+    WIDTH = 16
+    PHASES = 64
+    CUTOFF = 0.45
+    KERNEL = step_kernel(WIDTH, PHASES, CUTOFF)
+
+    def __init__(self, clock, sample_rate):
+        self.clock = clock
+        self.sample_rate = sample_rate
+        self.factor = float(sample_rate) / clock
+        self.buffer = np.zeros(self.WIDTH)
+        # output position of the first clock of the current frame
+        self.offset = 0.0
+        self.level = 0.0
+
+    def add_steps(self, times, deltas):
+        """add the level changes ``deltas`` happening ``times`` clocks into
+        the current frame"""
+        if not len(times):
+            return
+        positions = self.offset + np.asarray(times) * self.factor
+        index = positions.astype(np.int64)
+        phase = ((positions - index) * self.PHASES).astype(np.int64)
+        weights = self.KERNEL[phase] * np.asarray(deltas, dtype=np.float64)[:, None]
+        taps = index[:, None] + np.arange(self.WIDTH)
+        size = int(taps[-1, -1]) + 1
+        if size > len(self.buffer):
+            self.buffer = np.concatenate((self.buffer, np.zeros(size - len(self.buffer))))
+        self.buffer += np.bincount(taps.ravel(), weights.ravel(), len(self.buffer))
+
+    def end_frame(self, clocks):
+        """end the current frame after ``clocks`` clocks, returns the samples
+        that no later step can change anymore"""
+        end = self.offset + clocks * self.factor
+        count = int(end)
+        if count > len(self.buffer):
+            self.buffer = np.concatenate((self.buffer, np.zeros(count - len(self.buffer))))
+        samples = self.level + np.cumsum(self.buffer[:count])
+        if count:
+            self.level = samples[-1]
+        rest = self.buffer[count:]
+        self.buffer = np.zeros(max(len(rest), self.WIDTH))
+        self.buffer[:len(rest)] = rest
+        self.offset = end - count
+        return samples
+
+
+class Resampler():
+    """Streaming polyphase resampler between two fixed rates
+
+    The ratio is approximated by a fraction up/down, and every output sample
+    is one dot product of ``taps`` input samples with the phase of a
+    windowed-sinc filter bank, all output samples of a chunk at once.
+    """
+
+    def __init__(self, in_rate, out_rate, taps=32, max_phases=1000):
+        ratio = Fraction(out_rate / float(in_rate)).limit_denominator(max_phases)
+        self.up = ratio.numerator
+        self.down = ratio.denominator
+        self.taps = taps
+        cutoff = 0.45 / max(self.up, self.down)
+        x = np.arange(taps * self.up) - (taps * self.up - 1) / 2.0
+        impulse = 2 * cutoff * self.up * np.sinc(2 * cutoff * x) * np.blackman(taps * self.up)
+        # bank[p, k] weighs input sample base - k for output phase p
+        self.bank = impulse.reshape(taps, self.up).T
+        self.history = np.zeros(taps)
+        # the output position, in units of 1/up input samples, relative to
+        # the first sample after the history
+        self.position = 0
+
+    def process(self, samples):
+        """resample the next chunk of ``samples``, returns the output samples
+        it completes"""
+        samples = np.concatenate((self.history, np.asarray(samples, dtype=np.float64)))
+        available = len(samples) - self.taps
+        count = max((available * self.up - self.position + self.down - 1) // self.down, 0)
+        positions = self.position + np.arange(count) * self.down
+        base = positions // self.up + self.taps
+        windows = samples[base[:, None] - np.arange(self.taps)]
+        out = (windows * self.bank[positions % self.up]).sum(axis=1)
+        self.position += count * self.down - available * self.up
+        self.history = samples[-self.taps:]
+        return out
+
+
+def resample(samples, in_rate, out_rate, taps=32):
+    """resample a whole signal from ``in_rate`` to ``out_rate``"""
+    return Resampler(in_rate, out_rate, taps).process(samples)
@@ -0,0 +1,83 @@
+import re
+import textwrap
+from pynes.instruction import READ, MODIFY
+from pynes.corestatus import ZN_TABLE
+from pynes.alu import ADC_TABLE
+
+# the locals instruction code works on and the core attributes behind them
+REGISTERS = [
+    ('a', '_acc'),
+    ('x', '_x'),
+    ('y', '_y'),
+    ('pc', 'pc'),
+    ('p', 'p'),
+    ('sp', 'sp'),
+    ('ram', 'ram'),
+    ('cycles', 'cycles'),
+    ('read', 'read'),
+    ('write', 'write'),
+]
+
+# globals visible to the generated functions
+NAMESPACE = {
+    'ZN': ZN_TABLE,
+    'ALU': ADC_TABLE,
+}
+
+
+def instruction_source(instruction, operand):
+    """returns the python source executing ``instruction``, where ``operand``
+    is an expression (or literal) for the bytes following the opcode"""
+    lines = []
+    if instruction.address is not None:
+        lines.append('addr = ' + instruction.address)
+    if instruction.access == READ and instruction.page_cross is not None:
+        lines.append('cycles += ' + instruction.page_cross)
+    if instruction.access in (READ, MODIFY):
+        lines.append('value = ' + instruction.value)
+    lines.extend(textwrap.dedent(instruction.code).strip().splitlines())
+    if instruction.access == MODIFY:
+        lines.append(instruction.store)
+    return '\n'.join(lines).format(op=operand)
+
+
+def is_assigned(name, source):
+    """returns True if ``source`` assigns the local ``name``"""
+    pattern = r'^\s*%s\s*(?:[-+*/%%&|^]|<<|>>)?=(?!=)' % name
+    return re.search(pattern, source, re.M) is not None
+
+
+def function_source(name, body, args='core, op'):
+    """wraps ``body`` in a function which loads the registers it uses from
+    the core into locals, and stores back the ones it changes, also before
+    every ``return`` line of the body"""
+    used = [(local, attr) for local, attr in REGISTERS if re.search(r'\b%s\b' % local, body)]
+    stores = ['core.%s = %s' % (attr, local) for local, attr in used if is_assigned(local, body)]
+    lines = ['def %s(%s):' % (name, args)]
+    lines.extend('    %s = core.%s' % register for register in used)
+    for line in body.splitlines():
+        if line.strip() == 'return':
+            indent = line[:len(line) - len(line.lstrip())]
+            lines.extend('    ' + indent + store for store in stores)
+        lines.append('    ' + line)
+    lines.extend('    ' + store for store in stores)
+    return '\n'.join(lines) + '\n'
+
+
+def compile_function(name, source, extra=None):
+    """compiles ``source`` and returns the function called ``name`` it defines,
+    ``extra`` can provide additional globals"""
+    namespace = dict(NAMESPACE)
+    if extra:
+        namespace.update(extra)
+    exec(compile(source, '<%s>' % name, 'exec'), namespace)
+    func = namespace[name]
+    func.source = source
+    return func
+
+
+def compile_handler(instruction):
+    """compiles the handler for an opcode, a function taking the core and the
+    operand of the instruction. The core has already moved pc past it."""
+    name = instruction.__name__
+    return compile_function(name, function_source(name, instruction_source(instruction, 'op')))
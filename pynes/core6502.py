@@ -1,38 +1,401 @@
 #!/usr/bin/env python
 
 import math
-from pynes.corestatus import CoreStatus
-from pynes.stack import Stack
-from pynes.instructions import instruction_map
+import struct
+import zlib
+from pynes.corestatus import ZN_TABLE
+from pynes.alu import ADC_TABLE
+from pynes.instructions import handler_table, size_table, cycle_table, instruction_map
+from pynes.decodecache import DecodeCache
+from pynes.translator import BlockTranslator
+from pynes.memory import Memory
+from pynes.bankswitch import BankSwitcher
+from pynes.nsfinfo import NSFFile
+
+
+class SnapshotError(Exception):
+    """raised when restoring a snapshot that doesn't fit the core"""
 
 
 class Core6502():
-    
-    def __init__(self):
+    # a cycle budget nothing runs out of
+    FOREVER = 1 << 62
+
+    # snapshots: a fixed header with the registers, then zlib compressed
+    # RAM, WRAM, the I/O registers and the APU state
+    SNAPSHOT_MAGIC = b'P65S'
+    SNAPSHOT_VERSION = 1
+    _snapshot_format = '<4sBHBBBBBQ?8sI'
+    _snapshot_len = struct.calcsize(_snapshot_format)
+    WRAM = (0x6000, 0x8000)
+
+    def __init__(self, decode_cache=False, translate=False):
+        self.decode_cache = DecodeCache() if decode_cache else None
+        self.translator = BlockTranslator() if translate else None
+        # an APU (or a RegisterLog) receives the register writes, see
+        # pynes.apu and pynes.apulog
+        self.apu = None
+        # a tracer from pynes.trace records every instruction while set,
+        # through an interpreter loop of its own
+        self.tracer = None
+        # likewise a pynes.profiler.Profiler counts instructions while set
+        self.profiler = None
+        self.create_memory()
+        self.reset()
+
+    def create_memory(self):
+        self.memory = Memory()
+        # the stack page is always RAM, so stack accesses skip read/write
+        self.ram = self.memory.data
+        self.bankswitcher = None
+        # $4000-$4017 are the APU registers
+        self.io_registers = bytearray(0x18)
+        self.memory.map_io(0x40, self.read_io, self.write_io)
+
+    def reset(self):
         self._acc = 0;
         self._x = 0;
         self._y = 0;
-        self.status = CoreStatus()
+        # the status register, packed as in pynes.corestatus
+        self.p = 0
         self.pc = 0
-        self.stack = Stack()
-        self.memory = []
+        # the stack is $0100-$01FF, sp points at the next free byte
+        self.sp = 0xFD
+        self.cycles = 0
+        # where idle loops skip to, only set while run_until runs
+        self.idle_until = 0
+        # whether the last run_until call ended in an idle loop
+        self.idled = False
+        self.bind_memory()
+
+    def bind_memory(self):
+        """point read/write, used by the instruction handlers, at the memory"""
+        self.read = self.memory.read
+        self.write = self.memory.write
+        for cache in self.code_caches():
+            cache.clear()
+            self.write = cache.guard(self.write)
+
+    def push(self, value):
+        """push a byte onto the stack"""
+        self.ram[0x100 | self.sp] = value
+        self.sp = (self.sp - 1) & 0xFF
+
+    def pop(self):
+        """pull a byte from the stack"""
+        self.sp = (self.sp + 1) & 0xFF
+        return self.ram[0x100 | self.sp]
+
+    def push_word(self, value):
+        """push a 16-bit value high byte first, as JSR pushes its return
+        address"""
+        self.push(value >> 8)
+        self.push(value & 0xFF)
 
-    def load(self, nes_file):
-        with open(nes_file, 'rb') as f:
-            data = f.read()
-        
+    def code_caches(self):
+        """returns the caches holding decoded or translated code"""
+        caches = []
+        if self.decode_cache is not None:
+            caches.append(self.decode_cache)
+        if self.translator is not None:
+            caches.append(self.translator.cache)
+        return caches
+
+    def invalidate_code(self, start, end):
+        """drop decoded or translated code in [start, end), for when the
+        memory changes behind the core's back"""
+        for cache in self.code_caches():
+            cache.invalidate_range(start, end)
+
+    def precompile(self, addresses):
+        """decode or translate the code starting at ``addresses`` ahead of
+        running it, for block starts found by pynes.disasm. The decode cache
+        gets every instruction up to the next branch. None of it counts as
+        cache misses."""
+        read = self.read
+        if self.translator is not None:
+            cache = self.translator.cache
+            misses = cache.misses
+            for addr in addresses:
+                if addr not in cache.entries:
+                    self.translator.translate(read, addr)
+            cache.misses = misses
+        elif self.decode_cache is not None:
+            cache = self.decode_cache
+            misses = cache.misses
+            for addr in addresses:
+                while addr not in cache.entries:
+                    instruction = instruction_map.get(read(addr))
+                    if instruction is None:
+                        break
+                    cache.decode(read, addr)
+                    if instruction.is_branch:
+                        break
+                    addr = (addr + instruction.num_bytes) & 0xFFFF
+            cache.misses = misses
+
+    def snapshot(self):
+        """the state of the machine as a small bytes blob: registers, cycle
+        count, RAM (stack included), WRAM, bank mapping and the APU state if
+        the APU can provide it"""
+        data = self.memory.data
+        switcher = self.bankswitcher
+        apu = getattr(self.apu, 'snapshot', None)
+        apu_state = apu() if apu is not None else b''
+        header = struct.pack(self._snapshot_format, self.SNAPSHOT_MAGIC, self.SNAPSHOT_VERSION,
+                             self.pc, self._acc, self._x, self._y, self.p, self.sp, self.cycles,
+                             switcher is not None, bytes(switcher.registers) if switcher else bytes(8),
+                             len(apu_state))
+        start, end = self.WRAM
+        payload = b''.join((data[:Memory.RAM_SIZE], data[start:end], self.io_registers, apu_state))
+        return header + zlib.compress(payload, 1)
+
+    def restore(self, snapshot):
+        """go back to the state saved by snapshot(), on a core that has the
+        same NSF file loaded"""
+        header = snapshot[:self._snapshot_len]
+        if len(header) != self._snapshot_len:
+            raise SnapshotError('snapshot is truncated')
+        (magic, version, pc, a, x, y, p, sp, cycles, bankswitched, banks,
+         apu_len) = struct.unpack(self._snapshot_format, header)
+        if magic != self.SNAPSHOT_MAGIC or version != self.SNAPSHOT_VERSION:
+            raise SnapshotError('not a version %d snapshot' % self.SNAPSHOT_VERSION)
+        if bankswitched != (self.bankswitcher is not None):
+            raise SnapshotError('snapshot was taken with a different NSF file')
+        try:
+            payload = zlib.decompress(snapshot[self._snapshot_len:])
+        except zlib.error as e:
+            raise SnapshotError('snapshot is corrupt (%s)' % e)
+
+        start, end = self.WRAM
+        ram_end = Memory.RAM_SIZE
+        wram_end = ram_end + end - start
+        io_end = wram_end + len(self.io_registers)
+        if len(payload) != io_end + apu_len:
+            raise SnapshotError('snapshot is corrupt')
+        data = self.memory.data
+        data[:ram_end] = payload[:ram_end]
+        data[start:end] = payload[ram_end:wram_end]
+        self.io_registers[:] = payload[wram_end:io_end]
+        if self.code_caches():
+            # code running from RAM is rare, but possible
+            self.invalidate_code(0, ram_end)
+            self.invalidate_code(start, end)
+        if self.bankswitcher is not None:
+            for frame, bank in enumerate(banks):
+                self.bankswitcher.switch(frame, bank)
+        if apu_len and getattr(self.apu, 'restore', None) is not None:
+            self.apu.restore(payload[io_end:])
+
+        self.pc = pc
+        self._acc = a
+        self._x = x
+        self._y = y
+        self.p = p
+        self.sp = sp
+        self.cycles = cycles
+
+    def read_io(self, addr):
+        if addr < 0x4018:
+            if addr == 0x4015 and self.apu is not None:
+                return self.apu.read_status(self.cycles)
+            # the other APU registers are write only
+            return 0
+        return self.memory.data[addr]
+
+    def write_io(self, addr, value):
+        if addr < 0x4018:
+            self.io_registers[addr - 0x4000] = value
+            if self.apu is not None:
+                self.apu.write(self.cycles, addr, value)
+        else:
+            self.memory.data[addr] = value
+
+    def load(self, nsf_file):
+        """map the program of an NSF file (an NSFFile or a path) at its load
+        address and point pc at its init routine"""
+        if not isinstance(nsf_file, NSFFile):
+            nsf_file = NSFFile(nsf_file)
+        self.create_memory()
+        if any(bytearray(nsf_file.bankswitch)):
+            self.bankswitcher = BankSwitcher(self.memory, nsf_file.data, nsf_file.load_address,
+                                             nsf_file.bankswitch, self.invalidate_code)
+        else:
+            self.memory.map_rom(nsf_file.load_address, nsf_file.data)
         # reset the core when loading
-        self.__init__()
-        # the first 16 bytes are the NES file header - ignore it for now
-        self.memory = data[16:]
-
-    def run(self):
-        while True:
-            inst = instruction_map[self.memory[self.pc]](self)
-            print(inst.description())
-            inst()
-            if not inst.is_branch:
-                self.pc += inst.num_bytes
+        self.reset()
+        self.pc = nsf_file.init_address
+
+    def step(self):
+        """execute a single instruction"""
+        pc = self.pc
+        if self.decode_cache is not None:
+            entry = self.decode_cache.entries.get(pc)
+            if entry is None:
+                entry = self.decode_cache.decode(self.read, pc)
+            else:
+                self.decode_cache.hits += 1
+            handler, operand, size, cycles = entry
+        else:
+            read = self.read
+            opcode = read(pc)
+            handler = handler_table[opcode]
+            size = size_table[opcode]
+            cycles = cycle_table[opcode]
+            if size == 2:
+                operand = read(pc + 1)
+            elif size == 3:
+                operand = read(pc + 1) | read(pc + 2) << 8
+            else:
+                operand = 0
+        self.pc = (pc + size) & 0xFFFF
+        self.cycles += cycles
+        handler(self, operand)
+
+    def run(self, max_cycles=None):
+        """run for ``max_cycles`` cycles, or forever if None. Returns the
+        number of cycles run, which can overshoot by the rest of the last
+        instruction (or translated block)."""
+        start = self.cycles
+        # no address is -1, and an int compares faster than None
+        self.run_until(-1, max_cycles)
+        return self.cycles - start
+
+    def run_until(self, pc, max_cycles=None):
+        """run until the program counter reaches ``pc`` or ``max_cycles``
+        have passed, returns True if pc was reached. Translated code is only
+        checked between blocks, which end at every jump, call and return. A
+        jump or branch to itself uses up the rest of ``max_cycles`` at once
+        instead of spinning through it, and sets ``idled``."""
+        # the cycle counter stays an int, the snapshots and logs pack it
+        end = self.FOREVER if max_cycles is None else self.cycles + int(max_cycles)
+        # a jump or branch to itself skips to the end of a limited run
+        self.idle_until = end if max_cycles is not None else 0
+        self.idled = False
+        try:
+            if self.tracer is not None:
+                self._run_traced(pc, end)
+            elif self.profiler is not None and self.profiler.sample():
+                self._run_profiled(pc, end)
+            elif self.translator is not None:
+                self._run_translated(pc, end)
+            elif self.decode_cache is not None:
+                self._run_cached(pc, end)
+            else:
+                self._run(pc, end)
+        finally:
+            self.idle_until = 0
+        return self.pc == pc
+
+    def _run(self, stop, end):
+        # step() inlined, this loop is where the core spends its time
+        read = self.read
+        handlers = handler_table
+        sizes = size_table
+        cycles = cycle_table
+        pc = self.pc
+        while pc != stop and self.cycles < end:
+            opcode = read(pc)
+            size = sizes[opcode]
+            if size == 2:
+                operand = read(pc + 1)
+            elif size == 3:
+                operand = read(pc + 1) | read(pc + 2) << 8
+            else:
+                operand = 0
+            self.pc = (pc + size) & 0xFFFF
+            self.cycles += cycles[opcode]
+            handlers[opcode](self, operand)
+            pc = self.pc
+
+    def _run_traced(self, stop, end):
+        # _run, recording the state before every instruction
+        read = self.read
+        record = self.tracer.record
+        handlers = handler_table
+        sizes = size_table
+        cycles = cycle_table
+        pc = self.pc
+        while pc != stop and self.cycles < end:
+            opcode = read(pc)
+            size = sizes[opcode]
+            if size == 2:
+                operand = read(pc + 1)
+            elif size == 3:
+                operand = read(pc + 1) | read(pc + 2) << 8
+            else:
+                operand = 0
+            record(self.cycles, pc, opcode, operand, self._acc, self._x, self._y, self.p, self.sp)
+            self.pc = (pc + size) & 0xFFFF
+            self.cycles += cycles[opcode]
+            handlers[opcode](self, operand)
+            pc = self.pc
+
+    def _run_profiled(self, stop, end):
+        # _run, counting every opcode and program counter
+        read = self.read
+        opcodes = self.profiler.opcodes
+        pcs = self.profiler.pcs
+        handlers = handler_table
+        sizes = size_table
+        cycles = cycle_table
+        pc = self.pc
+        while pc != stop and self.cycles < end:
+            opcode = read(pc)
+            opcodes[opcode] += 1
+            pcs[pc] += 1
+            size = sizes[opcode]
+            if size == 2:
+                operand = read(pc + 1)
+            elif size == 3:
+                operand = read(pc + 1) | read(pc + 2) << 8
+            else:
+                operand = 0
+            self.pc = (pc + size) & 0xFFFF
+            self.cycles += cycles[opcode]
+            handlers[opcode](self, operand)
+            pc = self.pc
+
+    def _run_cached(self, stop, end):
+        cache = self.decode_cache
+        entries = cache.entries
+        decode = cache.decode
+        read = self.read
+        hits = 0
+        pc = self.pc
+        try:
+            while pc != stop and self.cycles < end:
+                entry = entries.get(pc)
+                if entry is None:
+                    entry = decode(read, pc)
+                else:
+                    hits += 1
+                handler, operand, size, cycles = entry
+                self.pc = (pc + size) & 0xFFFF
+                self.cycles += cycles
+                handler(self, operand)
+                pc = self.pc
+        finally:
+            cache.hits += hits
+
+    def _run_translated(self, stop, end):
+        cache = self.translator.cache
+        blocks = cache.entries
+        translate = self.translator.translate
+        read = self.read
+        hits = 0
+        pc = self.pc
+        try:
+            while pc != stop and self.cycles < end:
+                block = blocks.get(pc)
+                if block is None:
+                    block = translate(read, pc)
+                else:
+                    hits += 1
+                block(self)
+                pc = self.pc
+        finally:
+            cache.hits += hits
 
     @property
     def acc(self):
@@ -62,56 +425,18 @@ class Core6502():
         self.update_zero_neg(value)
     
     def update_zero_neg(self, value):
-        self.status.z = not value
-        self.status.n = bool((value >> 6) & 0x01)
+        self.p = (self.p & 0x7D) | ZN_TABLE[value]
 
     def add(self, arg1, arg2, update_overflow=True):
-        val = arg1 + arg2 + int(self.status.c)
-        if update_overflow:
-            self.status.v = val > 127
-        if val > 255:
-            val -= 255
-            self.status.c = True
-        else:
-            self.status.c = False
-        return val
+        """returns arg1 + arg2 + C, setting C (and V) like ADC"""
+        entry = ADC_TABLE[(self.p & 0x01) << 16 | arg1 << 8 | arg2]
+        mask = 0x41 if update_overflow else 0x01
+        self.p = (self.p & ~mask) | (entry >> 8 & mask)
+        return entry & 0xFF
 
     def sub(self, arg1, arg2, update_overflow=True):
-        val = arg1 - arg2 - int(not self.status.c)
-        if update_overflow:
-            self.status.v = val < -128
-        if val < 0:
-            val += 255
-            self.status.c = False
-        else:
-            self.status.c = True
-        return val
-    
-    def set_status_from_value(self, valNew, valOrig, update_overflow=True):
-        max_num = 0xFF
-        self.status.s = False
-
-        # subtraction performed
-        if valNew < valOrig:
-            if valNew < 0: # borrow required
-                self.status.c = False
-                self.status.s = True
-                valNew += max_num
-            else:
-                self.status.c = True
-        else:
-            if valNew > max_num: # overflow occurred
-                valNew = valNew - max_num
-                self.status.c = True
-                if update_overflow:
-                    self.status.v = True
-            else:
-                self.status.c = False
-                if update_overflow:
-                    self.status.v = False
-
-        self.status.z = not value
-        return valNew
+        """returns arg1 - arg2 - (1 - C), setting C (and V) like SBC"""
+        return self.add(arg1, arg2 ^ 0xFF, update_overflow)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,117 @@
+from pynes.instructions import handler_table, size_table, cycle_table
+from pynes.memory import Memory
+
+# the 2KB of RAM is mirrored up to $1FFF, code bytes there are marked at
+# their address in the first copy
+RAM_MASK = Memory.RAM_SIZE - 1
+MIRRORS_END = 0x2000
+
+
+class DecodeCache():
+    """Decoded instructions keyed by program counter
+
+    Each entry holds the resolved handler, the operand, the size and the base
+    cycle count of the instruction, so the core can skip decoding for code it
+    has seen before. Stores to a byte belonging to a cached instruction evict
+    the entry, which keeps self-modifying drivers working. A store to one
+    RAM mirror evicts code cached at any of them.
+    """
+
+    def __init__(self):
+        self.entries = {}
+        self.sizes = {}
+        self.max_size = 1
+        # nonzero for every byte that might belong to a cached entry
+        self.code = bytearray(0x10000)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def add(self, pc, entry, size):
+        """cache ``entry`` for the ``size`` bytes of code starting at pc"""
+        self.entries[pc] = entry
+        self.sizes[pc] = size
+        self.max_size = max(self.max_size, size)
+        code = self.code
+        for addr in range(pc, pc + size):
+            addr &= 0xFFFF
+            code[addr & RAM_MASK if addr < MIRRORS_END else addr] = 1
+
+    def decode(self, read, pc):
+        """decode the instruction at pc and cache it, this is the miss path"""
+        self.misses += 1
+        opcode = read(pc)
+        size = size_table[opcode]
+        if size == 2:
+            operand = read((pc + 1) & 0xFFFF)
+        elif size == 3:
+            operand = read((pc + 1) & 0xFFFF) | read((pc + 2) & 0xFFFF) << 8
+        else:
+            operand = 0
+        entry = (handler_table[opcode], operand, size, cycle_table[opcode])
+        self.add(pc, entry, size)
+        return entry
+
+    def invalidate(self, addr):
+        """evict every entry covering the byte at addr, or at any mirror of
+        it in RAM"""
+        if addr < MIRRORS_END:
+            addr &= RAM_MASK
+            mirrors = range(addr, MIRRORS_END, Memory.RAM_SIZE)
+        else:
+            mirrors = (addr,)
+        entries = self.entries
+        sizes = self.sizes
+        for mirror in mirrors:
+            for start in range(mirror - self.max_size + 1, mirror + 1):
+                start &= 0xFFFF
+                size = sizes.get(start)
+                if size is not None and (mirror - start) & 0xFFFF < size:
+                    del entries[start]
+                    del sizes[start]
+                    self.evictions += 1
+        self.code[addr] = 0
+
+    def invalidate_range(self, start, end):
+        """evict every entry covering a byte in [start, end)"""
+        code = self.code
+        if start < MIRRORS_END:
+            for addr in range(start, min(end, MIRRORS_END)):
+                if code[addr & RAM_MASK]:
+                    self.invalidate(addr)
+            start = MIRRORS_END
+        # bank switches land here, find the marked bytes without a python
+        # loop over the whole range
+        addr = code.find(1, start, end)
+        while addr != -1:
+            self.invalidate(addr)
+            addr = code.find(1, addr + 1, end)
+
+    def guard(self, write):
+        """returns ``write`` wrapped so stores evict the entries they hit"""
+        code = self.code
+        invalidate = self.invalidate
+        mask = RAM_MASK
+        mirrors_end = MIRRORS_END
+
+        def guarded_write(addr, value):
+            if code[addr & mask if addr < mirrors_end else addr]:
+                invalidate(addr)
+            write(addr, value)
+        return guarded_write
+
+    def clear(self):
+        self.entries.clear()
+        self.sizes.clear()
+        self.code[:] = bytes(0x10000)
+
+    def stats(self):
+        """returns the hit/miss statistics"""
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self.entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': float(self.hits) / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+from pynes.addressmode import Absolute, Relative
+from pynes.core6502 import Core6502
+from pynes.instruction import JMP, JSR, RTI, RTS, BRK
+from pynes.instructions import instruction_map
+from pynes.nsfinfo import NSFFile
+
+# what the code map says about a byte
+DATA = 0
+OPCODE = 1
+OPERAND = 2
+
+
+class Disassembler():
+    """Recursive descent disassembler for the program of an NSF file
+
+    Starting from the INIT and PLAY addresses it follows every branch, JSR
+    and JMP that has a known target, so only bytes that can be executed are
+    taken for code. Indirect jumps (JMP ($xxxx)) and RTS tricks can't be
+    followed statically, and for bankswitched files only the banks mapped at
+    load time are seen. ``code_map`` holds DATA, OPCODE or OPERAND for each
+    address and ``labels`` names the jump targets.
+    """
+
+    def __init__(self, nsf_file):
+        if not isinstance(nsf_file, NSFFile):
+            nsf_file = NSFFile(nsf_file)
+        self.nsf = nsf_file
+        core = Core6502()
+        core.load(nsf_file)
+        self.read = core.read
+        if core.bankswitcher is not None:
+            self.start, self.end = 0x8000, 0x10000
+        else:
+            self.start = nsf_file.load_address
+            self.end = min(nsf_file.load_address + len(nsf_file.data), 0x10000)
+
+        self.code_map = bytearray(0x10000)
+        # address -> (instruction, operand, target)
+        self.instructions = {}
+        self.labels = {}
+        # where execution continues other than after the previous
+        # instruction, which is where the translator starts blocks
+        self.block_starts = set()
+        self._listing = None
+        self.trace()
+
+    def in_program(self, addr):
+        return self.start <= addr < self.end
+
+    def label(self, addr, name):
+        if addr not in self.labels or name in ('init', 'play'):
+            self.labels[addr] = name
+
+    def trace(self):
+        nsf = self.nsf
+        self.label(nsf.init_address, 'init')
+        self.label(nsf.play_address, 'play')
+        pending = [nsf.init_address, nsf.play_address]
+        while pending:
+            addr = pending.pop()
+            if not self.in_program(addr):
+                continue
+            self.block_starts.add(addr)
+            if self.code_map[addr] == OPCODE:
+                continue
+            # follow the straight-line code from addr
+            while self.in_program(addr) and self.code_map[addr] != OPCODE:
+                instruction = instruction_map.get(self.read(addr))
+                size = instruction.num_bytes if instruction is not None else 1
+                if instruction is None or not self.in_program(addr + size - 1):
+                    break
+                operand = 0
+                if size == 2:
+                    operand = self.read(addr + 1)
+                elif size == 3:
+                    operand = self.read(addr + 1) | self.read(addr + 2) << 8
+                following = (addr + size) & 0xFFFF
+
+                target = None
+                if issubclass(instruction, Relative):
+                    target = (following + (operand ^ 0x80) - 0x80) & 0xFFFF
+                elif issubclass(instruction, (JMP, JSR)) and issubclass(instruction, Absolute):
+                    target = operand
+                self.instructions[addr] = (instruction, operand, target)
+                self.code_map[addr] = OPCODE
+                self.code_map[addr + 1:addr + size] = bytes([OPERAND]) * (size - 1)
+
+                if target is not None:
+                    self.label(target, 'sub_%04X' % target if issubclass(instruction, JSR) else 'L%04X' % target)
+                    pending.append(target)
+                if issubclass(instruction, (RTS, RTI, BRK, JMP)):
+                    break
+                if instruction.is_branch:
+                    # the branch not taken, or the return from a JSR
+                    pending.append(following)
+                    break
+                addr = following
+
+    def format(self, addr):
+        """the assembly text of the instruction at ``addr``, with the
+        addressmode() format and jump targets replaced by their labels"""
+        instruction, operand, target = self.instructions[addr]
+        name = instruction.instruction_name
+        if target is not None and target in self.labels:
+            return '%s %s' % (name, self.labels[target])
+        return instruction.addressmode(None).format(inst=name, arg=operand if target is None else target)
+
+    def listing(self):
+        """the listing of the program as a list of lines, data as .db"""
+        if self._listing is not None:
+            return self._listing
+        lines = []
+        addr = self.start
+        data = []
+
+        def flush_data():
+            for i in range(0, len(data), 8):
+                row = data[i:i + 8]
+                lines.append('%04X  %-8s  .db %s' % (row[0][0], '', ', '.join('$%02X' % value for _, value in row)))
+            del data[:]
+
+        while addr < self.end:
+            kind = self.code_map[addr]
+            if kind == OPCODE:
+                flush_data()
+                if addr in self.labels:
+                    lines.append('%s:' % self.labels[addr])
+                size = self.instructions[addr][0].num_bytes
+                raw = ' '.join('%02X' % self.read(addr + i) for i in range(size))
+                lines.append('%04X  %-8s  %s' % (addr, raw, self.format(addr)))
+                addr += size
+            else:
+                data.append((addr, self.read(addr)))
+                addr += 1
+        flush_data()
+        self._listing = lines
+        return lines
+
+    def code_bytes(self):
+        """how many bytes of the program are code"""
+        return sum(1 for addr in range(self.start, self.end) if self.code_map[addr])
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='disassemble the code reachable from INIT and PLAY of an NSF file')
+    parser.add_argument('nsf_file')
+    parser.add_argument('-o', '--output', default=None, help='write the listing to a file')
+    args = parser.parse_args()
+    disassembler = Disassembler(args.nsf_file)
+    listing = '\n'.join(disassembler.listing()) + '\n'
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(listing)
+    else:
+        print(listing, end='')
+    print('; %d of %d bytes are code, %d instructions, %d labels' % (
+        disassembler.code_bytes(), disassembler.end - disassembler.start, len(disassembler.instructions),
+        len(disassembler.labels)))
@@ -1,493 +1,544 @@
-import struct
+# how an instruction uses the operand provided by its addressmode
+READ = 'read'      # reads a value (the operand itself for immediate mode)
+WRITE = 'write'    # stores to the effective address
+MODIFY = 'modify'  # reads a value, changes it and writes it back
+JUMP = 'jump'      # uses the effective address as the new program counter
+
+
+class IllegalOpcodeError(Exception):
+    """raised when the core executes an opcode outside the 6502 instruction set"""
+
 
 class Instruction():
-    """Base class for all 6502 instructions"""
-    def __init__(self, core):
-        if not hasattr(self, 'is_branch'):
-            self.is_branch = False
-        self.core = core
-        self.opcode = core.memory[core.pc]
-        try:
-            self.init_args()
-        except AttributeError:
-            pass
-
-    def get_arg(self):
-        """gets overwritten by an addressmode mixin
-        will return an argument as a function of the core
-        state and the addressmode of the operation"""
-
-    def set_arg(self, val):
-        """gets overwritten by an addressmode mixin
-        will set a value in memory as a function of the core state
-        and the addressmode of the operation"""
-
-    def __call__(self):
-        """implemented by derived classes"""
-
-    def description(self):
-        """return a debug string describing this instruction"""
-        return "no description"
+    """Base class for all 6502 instructions
+
+    Instructions aren't instantiated while the core runs. Instead ``code``
+    holds the semantics of the instruction as a snippet of python operating
+    on locals named after the registers (a, x, y, pc, p, sp), the cycle
+    counter and ``read``/``write`` for memory access. The stack lives at
+    $0100-$01FF, which is always RAM, so stack accesses index ``ram``
+    directly. The status register p is an int laid out as in
+    pynes.corestatus, ZN[value] gives the Z and N bits for a result and ALU
+    is the ADC table from pynes.alu. For READ and MODIFY instructions the
+    addressmode provides ``value``, and for the other kinds it provides the
+    effective address in ``addr``. pynes.codegen stitches the snippet together
+    with the addressmode to build one preresolved handler per opcode.
+    """
+    instruction_name = None
+    access = None
+    is_branch = False
+    code = 'pass'
 
 
 class Branch():
+    """Branches and jumps end translated blocks. One that goes to itself
+    spins until an interrupt, which never comes in an NSF player, so it is
+    skipped: the cycle counter jumps to ``core.idle_until``, the end of the
+    cycle budget the core is running with, and ``core.idled`` is set."""
     is_branch = True
-    
+    access = JUMP
+
+
+class ConditionalBranch(Branch):
+    """Relative branches, taken while the python expression ``condition``
+    holds. A taken branch costs a cycle more, two if the target is on
+    another page."""
+    condition = None
+    template = """
+        if %s:
+            cycles += 1 + ((pc ^ addr) > 0xFF)
+            if addr == pc - 2 and core.idle_until:
+                cycles = max(cycles, core.idle_until)
+                core.idled = True
+            pc = addr
+        """
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if 'condition' in cls.__dict__:
+            cls.code = cls.template % cls.condition
+
 
 class ADC(Instruction):
     """Add Memory to Accumulator with Carry"""
     instruction_name = "ADC"
-
-    def __call__(self):
-        core = self.core
-        arg = self.get_arg()
-        core.acc = core.add(arg)
-
-    def description(self):
-        return "add {0} ({1}) to accumulator {2}".format(self.get_arg(), self.addressmode_info(), self.core.acc)
+    access = READ
+    code = """
+        value = ALU[(p & 0x01) << 16 | a << 8 | value]
+        a = value & 0xFF
+        p = (p & 0x3C) | value >> 8
+        """
 
 
 class AND(Instruction):
     """AND Memory with Accumulator"""
     instruction_name = "AND"
-
-    def __call__(self):
-        core = self.core
-        arg = self.get_arg()
-        core.acc &= arg
-
-    def description(self):
-        return "AND {0} ({1}) with accumulator {2}".format(self.get_arg(), self.addressmode_info(), self.core.acc)
+    access = READ
+    code = """
+        a &= value
+        p = (p & 0x7D) | ZN[a]
+        """
 
 
 class ASL(Instruction):
     """Shift Left One Bit (Memory or Accumulator)"""
     instruction_name = "ASL"
-
-    def __call__(self):
-        core = self.core
-        val = self.get_arg()
-        core.status.c = bool(val >> 7 & 0x01)
-        self.set_arg(core, val << 1)
-
-    def description(self):
-        return "Shift left one bit {0} ({1})".format(self.get_arg(), self.addressmode_info(), self.core.acc)
+    access = MODIFY
+    code = """
+        p = (p & 0x7C) | value >> 7
+        value = (value << 1) & 0xFF
+        p |= ZN[value]
+        """
 
 
-class BCC(Instruction, Branch):
+class BCC(ConditionalBranch, Instruction):
     """Branch on Carry Clear"""
     instruction_name = "BCC"
-
-    def __call__(self):
-        core = self.core
-        if not core.status.c:
-            core.pc = self.get_arg()
-        else:
-            core.pc += self.num_bytes
-
-    def description(self):
-        return "Branch to {0} ({1}) on Carry Clear (carry = {2})".format(self.get_arg(), self.addressmode_info(), self.core.status.c)
+    condition = 'not p & 0x01'
 
 
-class BCS(Instruction, Branch):
+class BCS(ConditionalBranch, Instruction):
     """Branch on Carry Set"""
     instruction_name = "BCS"
+    condition = 'p & 0x01'
 
-    def __call__(self):
-        core = self.core
-        if core.status.c:
-            core.pc = self.get_arg()
-        else:
-            core.pc += self.num_bytes
 
-    def description(self):
-        return "Branch to {0} ({1}) on Carry Set (carry = {2})".format(self.get_arg(), self.addressmode_info(), self.core.status.c)
-
-
-class BEQ(Instruction, Branch):
+class BEQ(ConditionalBranch, Instruction):
     """Branch on Result Zero"""
     instruction_name = "BEQ"
-
-    def __call__(self):
-        core = self.core
-        if core.status.z:
-            core.pc = self.get_arg()
-        else:
-            core.pc += self.num_bytes
-
-    def description(self):
-        return "Branch to {0} ({1}) on Result Zero (resultzero = {2})".format(self.get_arg(), self.addressmode_info(), self.core.status.z)
+    condition = 'p & 0x02'
 
 
 class BIT(Instruction):
     """Test Bits in Memory with Accumulator"""
     instruction_name = "BIT"
+    access = READ
+    code = """
+        p = (p & 0x3D) | (value & 0xC0) | (ZN[a & value] & 0x02)
+        """
 
-    def __call__(self):
-        core = self.core
-        val = core.acc & self.get_arg()
-        core.status.z = not val
-        core.status.v = bool(val >> 6 & 0x01)
-        core.status.s = bool(val >> 7 & 0x01)
 
-    def description(self):
-        return "AND accumulator with {0} ({1}), set zerobit, overflow, sign".format(self.get_arg(), self.addressmode_info())
-
-
-class BMI(Instruction, Branch):
+class BMI(ConditionalBranch, Instruction):
     """Branch on Result Minus"""
     instruction_name = "BMI"
+    condition = 'p & 0x80'
 
-    def __call__(self):
-        if self.core.s:
-            self.core.pc = self.get_arg()
-        else:
-            self.core.pc += self.num_bytes
-
-    def description(self):
-        return "Branch to {0} ({1}) on Result Minux (resultminus = {2})".format(self.get_arg(), self.addressmode_info(), self.core.status.s)
 
-
-class BNE(Instruction, Branch):
+class BNE(ConditionalBranch, Instruction):
     """Branch on Result not Zero"""
     instruction_name = "BNE"
+    condition = 'not p & 0x02'
 
-    def __call__(self):
-        if not self.core.z:
-            self.core.pc = self.get_arg()
-        else:
-            self.core.pc += self.num_bytes
-
-    def description(self):
-        return "Branch to {0} ({1}) on Result Not Zero (resultzero = {2})".format(self.get_arg(), self.addressmode_info(), self.core.status.z)
 
-
-class BPL(Instruction, Branch):
+class BPL(ConditionalBranch, Instruction):
     """Branch on Result Plus"""
     instruction_name = "BPL"
+    condition = 'not p & 0x80'
 
-    def __call__(self):
-        if not self.core.s:
-            self.core.pc = self.get_arg()
-        else:
-            self.core.pc += self.num_bytes
-
-    def description(self):
-        return "Branch to {0} ({1}) on Result Positive (resultsign = {2})".format(self.get_arg(), self.addressmode_info(), self.core.status.s)
 
-
-class BRK(Instruction):
+class BRK(Branch, Instruction):
     """Force Break"""
     instruction_name = "BRK"
-
-    def __call__(self):
-        self.core.stack.push(core)
-        self.core.stack.push(core)
-        self.core.status.i = True
-
-    def description(self):
-        return "Force Break"
-    
-
-class BVC(Instruction, Branch):
+    access = None
+    code = """
+        value = (pc + 1) & 0xFFFF
+        ram[0x100 | sp] = value >> 8
+        ram[0x100 | (sp - 1) & 0xFF] = value & 0xFF
+        ram[0x100 | (sp - 2) & 0xFF] = p | 0x30
+        sp = (sp - 3) & 0xFF
+        p |= 0x04
+        pc = read(0xFFFE) | read(0xFFFF) << 8
+        """
+
+
+class BVC(ConditionalBranch, Instruction):
     """Branch on Overflow Clear"""
-    def __call__(self):
-        if not self.status.v:
-            self.core.pc = self.get_arg()
-        else:
-            self.core.pc += self.num_bytes
+    instruction_name = "BVC"
+    condition = 'not p & 0x40'
 
 
-class BVS(Instruction, Branch):
+class BVS(ConditionalBranch, Instruction):
     """Branch on Overflow Set"""
-    def __call__(self):
-        if self.status.v:
-            self.core.pc = self.get_arg()
-        else:
-            self.core.cp += self.num_bytes
+    instruction_name = "BVS"
+    condition = 'p & 0x40'
 
 
 class CLC(Instruction):
     """Clear Carry Flag"""
-    def __call__(self):
-        self.core.status.c = False
+    instruction_name = "CLC"
+    code = "p &= 0xFE"
 
 
 class CLD(Instruction):
     """Clear Decimal Mode"""
-    def __call__(self):
-        self.core.status.d = False
+    instruction_name = "CLD"
+    code = "p &= 0xF7"
 
 
 class CLI(Instruction):
     """Clear interrupt Disable Bit"""
-    def __call__(self):
-        self.core.status.i = False
+    instruction_name = "CLI"
+    code = "p &= 0xFB"
 
 
 class CLV(Instruction):
     """Clear Overflow Flag"""
-    def __call__(self):
-        self.core.status.v = False
+    instruction_name = "CLV"
+    code = "p &= 0xBF"
 
 
 class CMP(Instruction):
     """Compare Memory and Accumulator"""
-    def __call__(self):
-        val = self.core.sub(self.core.acc, self.get_arg(), False)
-        self.core.update_zero_neg(val)
+    instruction_name = "CMP"
+    access = READ
+    code = """
+        value = ALU[0x10000 | a << 8 | (value ^ 0xFF)]
+        p = (p & 0x7C) | (value >> 8 & 0x83)
+        """
 
 
 class CPX(Instruction):
     """Compare Memory and Index X"""
-    def __call__(self):
-        val = self.core.sub(self.core.x, self.get_arg(), False)
-        self.core.update_zero_neg(val)
+    instruction_name = "CPX"
+    access = READ
+    code = """
+        value = ALU[0x10000 | x << 8 | (value ^ 0xFF)]
+        p = (p & 0x7C) | (value >> 8 & 0x83)
+        """
 
 
 class CPY(Instruction):
     """Compare Memory and Index Y"""
-    def __call__(self):
-        val = self.core.sub(self.core.y, self.get_arg(), False)
-        self.core.update_zero_neg(val)
+    instruction_name = "CPY"
+    access = READ
+    code = """
+        value = ALU[0x10000 | y << 8 | (value ^ 0xFF)]
+        p = (p & 0x7C) | (value >> 8 & 0x83)
+        """
 
 
 class DEC(Instruction):
     """Decrement Memory by One"""
-    def __call__(self):
-        val = self.get_arg() - 1
-        self.core.set_zero_neg(val)
-        self.set_arg(core, val)
+    instruction_name = "DEC"
+    access = MODIFY
+    code = """
+        value = (value - 1) & 0xFF
+        p = (p & 0x7D) | ZN[value]
+        """
 
 
 class DEX(Instruction):
     """Decrement Index X by One"""
-    def __call__(self):
-        core.x -= 1
+    instruction_name = "DEX"
+    code = """
+        x = (x - 1) & 0xFF
+        p = (p & 0x7D) | ZN[x]
+        """
 
 
 class DEY(Instruction):
     """Decrement Index Y by One"""
-    def __call__(self):
-        core.y -= 1
+    instruction_name = "DEY"
+    code = """
+        y = (y - 1) & 0xFF
+        p = (p & 0x7D) | ZN[y]
+        """
 
 
 class EOR(Instruction):
     """Exclusive-Or Memory with Accumulator"""
-    def __call__(self):
-        core.acc = self.get_arg() ^ core.acc
-    
+    instruction_name = "EOR"
+    access = READ
+    code = """
+        a ^= value
+        p = (p & 0x7D) | ZN[a]
+        """
+
 
 class INC(Instruction):
     """Increment Memory by One"""
-    def __call__(self):
-        val = self.get_arg() + 1
-        self.core.set_zero_neg(val)
-        self.set_arg(self.core, val)
+    instruction_name = "INC"
+    access = MODIFY
+    code = """
+        value = (value + 1) & 0xFF
+        p = (p & 0x7D) | ZN[value]
+        """
 
 
 class INX(Instruction):
     """Increment Index X by One"""
-    def __call__(self):
-        self.core.x += 1
+    instruction_name = "INX"
+    code = """
+        x = (x + 1) & 0xFF
+        p = (p & 0x7D) | ZN[x]
+        """
 
 
 class INY(Instruction):
     """Increment Index Y by One"""
-    def __call__(self):
-        self.core.y += 1
+    instruction_name = "INY"
+    code = """
+        y = (y + 1) & 0xFF
+        p = (p & 0x7D) | ZN[y]
+        """
 
 
-# TODO: not sure on what this is supposed to do
-class JMP(Instruction, Branch):
+class JMP(Branch, Instruction):
     """Jump to New Location"""
-    def __call__(self):
-        self.core.pc = self.get_arg()
+    instruction_name = "JMP"
+    code = """
+        if addr == pc - 3 and core.idle_until:
+            cycles = max(cycles, core.idle_until)
+            core.idled = True
+        pc = addr
+        """
 
 
-class JSR(Instruction, Branch):          
+class JSR(Branch, Instruction):
     """JSR Jump to new location saving return address"""
-    def __call__(self):
-        sef.core.stack.push(self.core + 2)
-        self.core.pc = self.get_arg()
+    instruction_name = "JSR"
+    code = """
+        value = (pc - 1) & 0xFFFF
+        ram[0x100 | sp] = value >> 8
+        ram[0x100 | (sp - 1) & 0xFF] = value & 0xFF
+        sp = (sp - 2) & 0xFF
+        pc = addr
+        """
 
 
 class LDA(Instruction):
     """LDA Load accumulator with memory"""
-    def __call__(self):
-        self.core.acc = self.get_arg()
+    instruction_name = "LDA"
+    access = READ
+    code = """
+        a = value
+        p = (p & 0x7D) | ZN[a]
+        """
 
 
 class LDX(Instruction):
     """LDX Load index X with memory"""
-    def __call__(self):
-        self.core.x = self.get_arg()
+    instruction_name = "LDX"
+    access = READ
+    code = """
+        x = value
+        p = (p & 0x7D) | ZN[x]
+        """
+
 
-            
 class LDY(Instruction):
     """LDY Load index Y with memory"""
-    def __call__(self):
-        self.core.y = self.get_arg()
+    instruction_name = "LDY"
+    access = READ
+    code = """
+        y = value
+        p = (p & 0x7D) | ZN[y]
+        """
 
 
 class LSR(Instruction):
     """LSR Shift right one bit (memory or accumulator)"""
-    def __call__(self):
-        val = self.get_arg()
-        self.core.status.c = val & 0x01
-        val >>= 1
-        self.set_arg(val)
-        self.core.update_zero_neg(val)
+    instruction_name = "LSR"
+    access = MODIFY
+    code = """
+        p = (p & 0x7C) | (value & 0x01)
+        value >>= 1
+        p |= ZN[value]
+        """
 
 
 class NOP(Instruction):
     """NOP No operation"""
-    def __call__(self):
-        pass
+    instruction_name = "NOP"
 
 
 class ORA(Instruction):
     """ORA "OR" memory with accumulator"""
-    def __call__(self):
-        core.acc = core.acc | self.get_arg()
+    instruction_name = "ORA"
+    access = READ
+    code = """
+        a |= value
+        p = (p & 0x7D) | ZN[a]
+        """
 
 
 class PHA(Instruction):
     """PHA Push accumulator on stack"""
-    def __call__(self):
-        self.core.stack.push(self.core.acc)
+    instruction_name = "PHA"
+    code = """
+        ram[0x100 | sp] = a
+        sp = (sp - 1) & 0xFF
+        """
 
 
 class PHP(Instruction):
     """PHP Push processor status on stack"""
-    def __call__(self):
-        self.core.stack.push(self.core.status)
+    instruction_name = "PHP"
+    code = """
+        ram[0x100 | sp] = p | 0x30
+        sp = (sp - 1) & 0xFF
+        """
 
 
 class PLA(Instruction):
     """PLA Pull accumulator from stack"""
-    def __call__(self):
-        # we don't want to affect the status registers
-        self.core._acc = self.core.stack.pop()
+    instruction_name = "PLA"
+    code = """
+        sp = (sp + 1) & 0xFF
+        a = ram[0x100 | sp]
+        p = (p & 0x7D) | ZN[a]
+        """
+
 
-                        
 class PLP(Instruction):
     """PLP Pull processor status from stack"""
-    def __call__(self):
-        self.core.status = self.core.stack.pop()
+    instruction_name = "PLP"
+    code = """
+        sp = (sp + 1) & 0xFF
+        p = ram[0x100 | sp] & 0xCF
+        """
 
 
 class ROL(Instruction):
     """ROL Rotate one bit left (memory)"""
-    def __call__(self):
-        val = self.get_arg()
-        c = val >> 7 & 0x01
-        val <<= 1
-        val |= int(self.core.status.c)
-        self.set_arg(self.core, val)
-        self.core.status.c = bool(c)
-        self.core.set_zero_neg(val)
+    instruction_name = "ROL"
+    access = MODIFY
+    code = """
+        value = (value << 1) | (p & 0x01)
+        p = (p & 0x7C) | value >> 8
+        value &= 0xFF
+        p |= ZN[value]
+        """
 
 
 class ROR(Instruction):
     """ROR Rotate one bit right (memory)"""
-    def __call__(self):
-        val = self.get_arg()
-        c = val & 0x01
-        val >>= 1
-        val |= (int(self.core.status.c) << 7)
-        self.set_arg(self.core, val)
-        self.core.status.c = bool(c)
-        self.core.set_zero_neg(val)
+    instruction_name = "ROR"
+    access = MODIFY
+    code = """
+        carry = value & 0x01
+        value = (value >> 1) | (p & 0x01) << 7
+        p = (p & 0x7C) | carry | ZN[value]
+        """
 
 
-class RTI(Instruction, Branch):
+class RTI(Branch, Instruction):
     """RTI Return from interrupt"""
-    def __call__(self):
-        self.core.status = self.core.stack.pop()
-        self.core.pc = self.core.stack.pop()
+    instruction_name = "RTI"
+    access = None
+    code = """
+        p = ram[0x100 | (sp + 1) & 0xFF] & 0xCF
+        pc = ram[0x100 | (sp + 2) & 0xFF] | ram[0x100 | (sp + 3) & 0xFF] << 8
+        sp = (sp + 3) & 0xFF
+        """
 
 
-class RTS(Instruction, Branch):
+class RTS(Branch, Instruction):
     """RTS Return from subroutine"""
-    def __call__(self):
-        self.core.pc = self.core.stack.pop() + 1
+    instruction_name = "RTS"
+    access = None
+    code = """
+        pc = ((ram[0x100 | (sp + 1) & 0xFF] | ram[0x100 | (sp + 2) & 0xFF] << 8) + 1) & 0xFFFF
+        sp = (sp + 2) & 0xFF
+        """
 
 
 class SBC(Instruction):
     """SBC Subtract memory from accumulator with borrow"""
-    def __call__(self):
-        self.core.acc = self.core.sub(acc, self.get_arg())
+    instruction_name = "SBC"
+    access = READ
+    code = """
+        value = ALU[(p & 0x01) << 16 | a << 8 | (value ^ 0xFF)]
+        a = value & 0xFF
+        p = (p & 0x3C) | value >> 8
+        """
 
 
 class SEC(Instruction):
     """SEC Set carry flag"""
-    def __call__(self):
-        self.core.status.c = True
+    instruction_name = "SEC"
+    code = "p |= 0x01"
 
 
 class SED(Instruction):
     """SED Set decimal mode"""
-    def __call__(self):
-        self.core.status.d = True
+    instruction_name = "SED"
+    code = "p |= 0x08"
 
 
 class SEI(Instruction):
     """SEI Set interrupt disable status"""
-    def __call__(self):
-        self.core.status.i = True
+    instruction_name = "SEI"
+    code = "p |= 0x04"
 
 
 class STA(Instruction):
     """STA Store accumulator in memory"""
-    def __call__(self):
-        self.set_arg(self.core, self.core.acc)
-                                            
+    instruction_name = "STA"
+    access = WRITE
+    code = "write(addr, a)"
+
 
 class STX(Instruction):
     """STX Store index X in memory"""
-    def __call__(self):
-        self.set_arg(self.core, self.core.x)
+    instruction_name = "STX"
+    access = WRITE
+    code = "write(addr, x)"
 
 
 class STY(Instruction):
     """STY Store index Y in memory"""
-    def __call__(self):
-        self.set_arg(self.core, self.core.y)
-                                                    
-                                                    
+    instruction_name = "STY"
+    access = WRITE
+    code = "write(addr, y)"
+
+
 class TAX(Instruction):
     """TAX Transfer accumulator to index X"""
-    def __call__(self):
-        self.core.x = self.core.acc
+    instruction_name = "TAX"
+    code = """
+        x = a
+        p = (p & 0x7D) | ZN[x]
+        """
 
 
 class TAY(Instruction):
     """TAY Transfer accumulator to index Y"""
-    def __call__(self):
-        self.core.y = self.core.acc
+    instruction_name = "TAY"
+    code = """
+        y = a
+        p = (p & 0x7D) | ZN[y]
+        """
 
 
 class TSX(Instruction):
     """TSX Transfer stack pointer to index X"""
-    def __call__(self):
-        self.core.x = self.core.stack.sp
+    instruction_name = "TSX"
+    code = """
+        x = sp
+        p = (p & 0x7D) | ZN[x]
+        """
 
 
 class TXA(Instruction):
     """TXA Transfer index X to accumulator"""
-    def __call__(self):
-        self.core.acc = self.core.x
+    instruction_name = "TXA"
+    code = """
+        a = x
+        p = (p & 0x7D) | ZN[a]
+        """
 
 
 class TXS(Instruction):
     """TXS Transfer index X to stack pointer"""
-    def __call__(self):
-        self.core.stack.sp = self.core.x
+    instruction_name = "TXS"
+    code = "sp = x"
 
 
 class TYA(Instruction):
     """TYA Transfer index Y to accumulator"""
-    def __call__(self):
-        self.core.acc = self.core.y
-
+    instruction_name = "TYA"
+    code = """
+        a = y
+        p = (p & 0x7D) | ZN[a]
+        """
@@ -1,279 +1,300 @@
 #!/usr/bin/env python
 from pynes.instruction import *
 from pynes.addressmode import *
+from pynes.codegen import compile_handler
 
-def create_instruction(func, mode):
-    """creates a dynamic type using "func" and "mode" as base classes"""
-    return type(func.__name__ + mode.__name__, (func, mode), {})
+def create_instruction(func, mode, cycles):
+    """creates a dynamic type using "func" and "mode" as base classes,
+    ``cycles`` is the base number of cycles the instruction takes"""
+    return type(func.__name__ + mode.__name__, (func, mode), {'cycles': cycles})
 
 instruction_map = {
     # ADC instructions
-    0x69: create_instruction(ADC, Immediate),
-    0x65: create_instruction(ADC, ZeroPage),
-    0x75: create_instruction(ADC, ZeroPageX),
-    0x60: create_instruction(ADC, Absolute),
-    0x70: create_instruction(ADC, AbsoluteX),
-    0x79: create_instruction(ADC, AbsoluteY),
-    0x61: create_instruction(ADC, IndirectX),
-    0x71: create_instruction(ADC, IndirectY),
+    0x69: create_instruction(ADC, Immediate, 2),
+    0x65: create_instruction(ADC, ZeroPage, 3),
+    0x75: create_instruction(ADC, ZeroPageX, 4),
+    0x6D: create_instruction(ADC, Absolute, 4),
+    0x7D: create_instruction(ADC, AbsoluteX, 4),
+    0x79: create_instruction(ADC, AbsoluteY, 4),
+    0x61: create_instruction(ADC, IndirectX, 6),
+    0x71: create_instruction(ADC, IndirectY, 5),
 
     # AND instructions
-    0x29: create_instruction(AND, Immediate),
-    0x25: create_instruction(AND, ZeroPage),
-    0x35: create_instruction(AND, ZeroPageX),
-    0x2D: create_instruction(AND, Absolute),
-    0x3D: create_instruction(AND, AbsoluteX),
-    0x39: create_instruction(AND, AbsoluteY),
-    0x21: create_instruction(AND, IndirectX),
-    0x31: create_instruction(AND, IndirectY),
+    0x29: create_instruction(AND, Immediate, 2),
+    0x25: create_instruction(AND, ZeroPage, 3),
+    0x35: create_instruction(AND, ZeroPageX, 4),
+    0x2D: create_instruction(AND, Absolute, 4),
+    0x3D: create_instruction(AND, AbsoluteX, 4),
+    0x39: create_instruction(AND, AbsoluteY, 4),
+    0x21: create_instruction(AND, IndirectX, 6),
+    0x31: create_instruction(AND, IndirectY, 5),
 
     # ASL instructions
-    0x0A: create_instruction(ASL, Accumulator),
-    0x06: create_instruction(ASL, ZeroPage),
-    0x16: create_instruction(ASL, ZeroPageX),
-    0x0E: create_instruction(ASL, Absolute),
-    0x1E: create_instruction(ASL, AbsoluteX),
+    0x0A: create_instruction(ASL, Accumulator, 2),
+    0x06: create_instruction(ASL, ZeroPage, 5),
+    0x16: create_instruction(ASL, ZeroPageX, 6),
+    0x0E: create_instruction(ASL, Absolute, 6),
+    0x1E: create_instruction(ASL, AbsoluteX, 7),
     
     # BCC instructions
-    0x90: create_instruction(BCC, Relative),
+    0x90: create_instruction(BCC, Relative, 2),
 
     # BCS instructions
-    0xB0: create_instruction(BCS, Relative),
+    0xB0: create_instruction(BCS, Relative, 2),
 
     # BEQ instructions
-    0xF0: create_instruction(BEQ, Relative),
+    0xF0: create_instruction(BEQ, Relative, 2),
 
     # BIT instructions
-    0x24: create_instruction(BIT, ZeroPage),
-    0x2C: create_instruction(BIT, Absolute),
+    0x24: create_instruction(BIT, ZeroPage, 3),
+    0x2C: create_instruction(BIT, Absolute, 4),
 
     # BMI instructions
-    0x30: create_instruction(BMI, Relative),
+    0x30: create_instruction(BMI, Relative, 2),
 
     #BNE instructions
-    0xD0: create_instruction(BNE, Relative),
+    0xD0: create_instruction(BNE, Relative, 2),
 
     # BPL instructions
-    0x10: create_instruction(BPL, Relative),
+    0x10: create_instruction(BPL, Relative, 2),
 
     # BRK instructions
-    0x00: create_instruction(BRK, Implied),
+    0x00: create_instruction(BRK, Implied, 7),
 
     #BVC instructions
-    0x50: create_instruction(BVC, Relative),
+    0x50: create_instruction(BVC, Relative, 2),
 
     # BVS instructions
-    0x70: create_instruction(BVS, Relative),
+    0x70: create_instruction(BVS, Relative, 2),
 
     # CLC instructions
-    0x18: create_instruction(CLC, Implied),
+    0x18: create_instruction(CLC, Implied, 2),
 
     # CLD instructions
-    0xD8: create_instruction(CLD, Implied),
+    0xD8: create_instruction(CLD, Implied, 2),
 
     # CLI instructions
-    0x58: create_instruction(CLI, Implied),
+    0x58: create_instruction(CLI, Implied, 2),
 
     # CLV instructions
-    0xB8: create_instruction(CLV, Implied),
+    0xB8: create_instruction(CLV, Implied, 2),
 
     # CMP instructions
-    0xC9: create_instruction(CLV, Immediate),
-    0xC5: create_instruction(CLV, ZeroPage),
-    0xD5: create_instruction(CLV, ZeroPageX),
-    0xCD: create_instruction(CLV, Absolute),
-    0xDD: create_instruction(CLV, AbsoluteX),
-    0xD9: create_instruction(CLV, AbsoluteY),
-    0xC1: create_instruction(CLV, IndirectX),
-    0xD1: create_instruction(CLV, IndirectY),
+    0xC9: create_instruction(CMP, Immediate, 2),
+    0xC5: create_instruction(CMP, ZeroPage, 3),
+    0xD5: create_instruction(CMP, ZeroPageX, 4),
+    0xCD: create_instruction(CMP, Absolute, 4),
+    0xDD: create_instruction(CMP, AbsoluteX, 4),
+    0xD9: create_instruction(CMP, AbsoluteY, 4),
+    0xC1: create_instruction(CMP, IndirectX, 6),
+    0xD1: create_instruction(CMP, IndirectY, 5),
 
     # CPX instructions
-    0xE0: create_instruction(CPX, Immediate),
-    0xE4: create_instruction(CPX, ZeroPage),
-    0xEC: create_instruction(CPX, Absolute),
+    0xE0: create_instruction(CPX, Immediate, 2),
+    0xE4: create_instruction(CPX, ZeroPage, 3),
+    0xEC: create_instruction(CPX, Absolute, 4),
 
     # CPY instructions
-    0xC0: create_instruction(CPY, Immediate),
-    0xC4: create_instruction(CPY, ZeroPage),
-    0xCC: create_instruction(CPY, Absolute),
+    0xC0: create_instruction(CPY, Immediate, 2),
+    0xC4: create_instruction(CPY, ZeroPage, 3),
+    0xCC: create_instruction(CPY, Absolute, 4),
 
     # DEC instructions
-    0xC6: create_instruction(DEC, ZeroPage),
-    0xD6: create_instruction(DEC, ZeroPageX),
-    0xCE: create_instruction(DEC, Absolute),
-    0xDE: create_instruction(DEC, AbsoluteX),
+    0xC6: create_instruction(DEC, ZeroPage, 5),
+    0xD6: create_instruction(DEC, ZeroPageX, 6),
+    0xCE: create_instruction(DEC, Absolute, 6),
+    0xDE: create_instruction(DEC, AbsoluteX, 7),
 
     # DEX instructions
-    0xCA: create_instruction(DEX, Implied),
+    0xCA: create_instruction(DEX, Implied, 2),
 
     # DEY instructions
-    0x88: create_instruction(DEY, Implied),
+    0x88: create_instruction(DEY, Implied, 2),
 
     # EOR instructions
-    0x49: create_instruction(EOR, Immediate),
-    0x45: create_instruction(EOR, ZeroPage),
-    0x55: create_instruction(EOR, ZeroPageX),
-    0x40: create_instruction(EOR, Absolute),
-    0x50: create_instruction(EOR, AbsoluteX),
-    0x59: create_instruction(EOR, AbsoluteY),
-    0x41: create_instruction(EOR, IndirectX),
-    0x51: create_instruction(EOR, IndirectY),
+    0x49: create_instruction(EOR, Immediate, 2),
+    0x45: create_instruction(EOR, ZeroPage, 3),
+    0x55: create_instruction(EOR, ZeroPageX, 4),
+    0x4D: create_instruction(EOR, Absolute, 4),
+    0x5D: create_instruction(EOR, AbsoluteX, 4),
+    0x59: create_instruction(EOR, AbsoluteY, 4),
+    0x41: create_instruction(EOR, IndirectX, 6),
+    0x51: create_instruction(EOR, IndirectY, 5),
 
     # INC instructions
-    0xE6: create_instruction(INC, ZeroPage),
-    0xF6: create_instruction(INC, ZeroPageX),
-    0xEE: create_instruction(INC, Absolute),
-    0xFE: create_instruction(INC, AbsoluteX),
+    0xE6: create_instruction(INC, ZeroPage, 5),
+    0xF6: create_instruction(INC, ZeroPageX, 6),
+    0xEE: create_instruction(INC, Absolute, 6),
+    0xFE: create_instruction(INC, AbsoluteX, 7),
 
     # INX instructions
-    0xE8: create_instruction(INX, Implied),
+    0xE8: create_instruction(INX, Implied, 2),
 
     # INY instructions
-    0xC8: create_instruction(INY, Implied),
+    0xC8: create_instruction(INY, Implied, 2),
     
     # JMP instructions
-    0x4C: create_instruction(JMP, Absolute),
-    0x6C: create_instruction(JMP, Indirect),
+    0x4C: create_instruction(JMP, Absolute, 3),
+    0x6C: create_instruction(JMP, Indirect, 5),
 
     # JSR instructions
-    0x20: create_instruction(JSR, Absolute),
+    0x20: create_instruction(JSR, Absolute, 6),
 
     # LDA instructions
-    0xA9: create_instruction(LDA, Immediate),
-    0xA5: create_instruction(LDA, ZeroPage),
-    0xB5: create_instruction(LDA, ZeroPageX),
-    0xAD: create_instruction(LDA, Absolute),
-    0xBD: create_instruction(LDA, AbsoluteX),
-    0xB9: create_instruction(LDA, AbsoluteY),
-    0xA1: create_instruction(LDA, IndirectX),
-    0xB1: create_instruction(LDA, IndirectY),
+    0xA9: create_instruction(LDA, Immediate, 2),
+    0xA5: create_instruction(LDA, ZeroPage, 3),
+    0xB5: create_instruction(LDA, ZeroPageX, 4),
+    0xAD: create_instruction(LDA, Absolute, 4),
+    0xBD: create_instruction(LDA, AbsoluteX, 4),
+    0xB9: create_instruction(LDA, AbsoluteY, 4),
+    0xA1: create_instruction(LDA, IndirectX, 6),
+    0xB1: create_instruction(LDA, IndirectY, 5),
 
     # LDX instructions
-    0xA2: create_instruction(LDX, Immediate),
-    0xA6: create_instruction(LDX, ZeroPage),
-    0xB6: create_instruction(LDX, ZeroPageY),
-    0xAE: create_instruction(LDX, Absolute),
-    0xBE: create_instruction(LDX, AbsoluteY),
+    0xA2: create_instruction(LDX, Immediate, 2),
+    0xA6: create_instruction(LDX, ZeroPage, 3),
+    0xB6: create_instruction(LDX, ZeroPageY, 4),
+    0xAE: create_instruction(LDX, Absolute, 4),
+    0xBE: create_instruction(LDX, AbsoluteY, 4),
 
     # LDY instructions
-    0xA0: create_instruction(LDY, Immediate),
-    0xA4: create_instruction(LDY, ZeroPage),
-    0xB4: create_instruction(LDY, ZeroPageX),
-    0xAC: create_instruction(LDY, Absolute),
-    0xBC: create_instruction(LDY, AbsoluteX),
+    0xA0: create_instruction(LDY, Immediate, 2),
+    0xA4: create_instruction(LDY, ZeroPage, 3),
+    0xB4: create_instruction(LDY, ZeroPageX, 4),
+    0xAC: create_instruction(LDY, Absolute, 4),
+    0xBC: create_instruction(LDY, AbsoluteX, 4),
 
     # LSR instructions
-    0x4A: create_instruction(LSR, Accumulator),
-    0x46: create_instruction(LSR, ZeroPage),
-    0x56: create_instruction(LSR, ZeroPageX),
-    0x4E: create_instruction(LSR, Absolute),
-    0x5E: create_instruction(LSR, AbsoluteX),
+    0x4A: create_instruction(LSR, Accumulator, 2),
+    0x46: create_instruction(LSR, ZeroPage, 5),
+    0x56: create_instruction(LSR, ZeroPageX, 6),
+    0x4E: create_instruction(LSR, Absolute, 6),
+    0x5E: create_instruction(LSR, AbsoluteX, 7),
     
     
     # NOP instructions
-    0xEA: create_instruction(NOP, Implied),
+    0xEA: create_instruction(NOP, Implied, 2),
     
     # ORA instructions
-    0x09: create_instruction(ORA, Immediate),
-    0x05: create_instruction(ORA, ZeroPage),
-    0x15: create_instruction(ORA, ZeroPageX),
-    0x0D: create_instruction(ORA, Absolute),
-    0x1D: create_instruction(ORA, AbsoluteX),
-    0x19: create_instruction(ORA, AbsoluteY),
-    0x01: create_instruction(ORA, IndirectX),
-    0x11: create_instruction(ORA, IndirectY),
+    0x09: create_instruction(ORA, Immediate, 2),
+    0x05: create_instruction(ORA, ZeroPage, 3),
+    0x15: create_instruction(ORA, ZeroPageX, 4),
+    0x0D: create_instruction(ORA, Absolute, 4),
+    0x1D: create_instruction(ORA, AbsoluteX, 4),
+    0x19: create_instruction(ORA, AbsoluteY, 4),
+    0x01: create_instruction(ORA, IndirectX, 6),
+    0x11: create_instruction(ORA, IndirectY, 5),
     
     
     # PHA instructions
-    0x48: create_instruction(PHA, Implied),
+    0x48: create_instruction(PHA, Implied, 3),
     
     # PHP instructions
-    0x08: create_instruction(PHP, Implied),
+    0x08: create_instruction(PHP, Implied, 3),
     
     # PLA instructions
-    0x68: create_instruction(PLA, Implied),
+    0x68: create_instruction(PLA, Implied, 4),
     
     # PLP instructions
-    0x28: create_instruction(PLP, Implied),
+    0x28: create_instruction(PLP, Implied, 4),
     
     # ROL instructions
-    0x2A: create_instruction(ROL, Accumulator),
-    0x26: create_instruction(ROL, ZeroPage),
-    0x36: create_instruction(ROL, ZeroPageX),
-    0x2E: create_instruction(ROL, Absolute),
-    0x3E: create_instruction(ROL, AbsoluteX),
+    0x2A: create_instruction(ROL, Accumulator, 2),
+    0x26: create_instruction(ROL, ZeroPage, 5),
+    0x36: create_instruction(ROL, ZeroPageX, 6),
+    0x2E: create_instruction(ROL, Absolute, 6),
+    0x3E: create_instruction(ROL, AbsoluteX, 7),
     
     
     # ROR instructions
-    0x6A: create_instruction(ROR, Accumulator),
-    0x66: create_instruction(ROR, ZeroPage),
-    0x76: create_instruction(ROR, ZeroPageX),
-    0x6E: create_instruction(ROR, Absolute),
-    0x7E: create_instruction(ROR, AbsoluteX),
+    0x6A: create_instruction(ROR, Accumulator, 2),
+    0x66: create_instruction(ROR, ZeroPage, 5),
+    0x76: create_instruction(ROR, ZeroPageX, 6),
+    0x6E: create_instruction(ROR, Absolute, 6),
+    0x7E: create_instruction(ROR, AbsoluteX, 7),
     
     # RTI instructions
-    0x4D: create_instruction(RTI, Implied),
+    0x40: create_instruction(RTI, Implied, 6),
     
     # RTS instructions
-    0x60: create_instruction(RTS, Implied),
+    0x60: create_instruction(RTS, Implied, 6),
     
     # SBC instructions
-    0xE9: create_instruction(SBC, Immediate),
-    0xE5: create_instruction(SBC, ZeroPage),
-    0xF5: create_instruction(SBC, ZeroPageX),
-    0xED: create_instruction(SBC, Absolute),
-    0xFD: create_instruction(SBC, AbsoluteX),
-    0xF9: create_instruction(SBC, AbsoluteY),
-    0xE1: create_instruction(SBC, IndirectX),
-    0xF1: create_instruction(SBC, IndirectY),
+    0xE9: create_instruction(SBC, Immediate, 2),
+    0xE5: create_instruction(SBC, ZeroPage, 3),
+    0xF5: create_instruction(SBC, ZeroPageX, 4),
+    0xED: create_instruction(SBC, Absolute, 4),
+    0xFD: create_instruction(SBC, AbsoluteX, 4),
+    0xF9: create_instruction(SBC, AbsoluteY, 4),
+    0xE1: create_instruction(SBC, IndirectX, 6),
+    0xF1: create_instruction(SBC, IndirectY, 5),
     
     
     # SEC instructions
-    0x38: create_instruction(SEC, Implied),
+    0x38: create_instruction(SEC, Implied, 2),
     
     # SED instructions
-    0xF8: create_instruction(SED, Implied),
+    0xF8: create_instruction(SED, Implied, 2),
     
     # SEI instructions
-    0x78: create_instruction(SEI, Implied),
+    0x78: create_instruction(SEI, Implied, 2),
     
     # STA instructions
-    0x85: create_instruction(STA, ZeroPage),
-    0x95: create_instruction(STA, ZeroPageX),
-    0x80: create_instruction(STA, Absolute),
-    0x90: create_instruction(STA, AbsoluteX),
-    0x99: create_instruction(STA, AbsoluteY),
-    0x81: create_instruction(STA, IndirectX),
-    0x91: create_instruction(STA, IndirectY),
+    0x85: create_instruction(STA, ZeroPage, 3),
+    0x95: create_instruction(STA, ZeroPageX, 4),
+    0x8D: create_instruction(STA, Absolute, 4),
+    0x9D: create_instruction(STA, AbsoluteX, 5),
+    0x99: create_instruction(STA, AbsoluteY, 5),
+    0x81: create_instruction(STA, IndirectX, 6),
+    0x91: create_instruction(STA, IndirectY, 6),
     
     
     # STX instructions
-    0x86: create_instruction(STX, ZeroPage),
-    0x96: create_instruction(STX, ZeroPageY),
-    0x8E: create_instruction(STX, Absolute),
+    0x86: create_instruction(STX, ZeroPage, 3),
+    0x96: create_instruction(STX, ZeroPageY, 4),
+    0x8E: create_instruction(STX, Absolute, 4),
     
     
     # STY instructions
-    0x84: create_instruction(STY, ZeroPage),
-    0x94: create_instruction(STY, ZeroPageX),
-    0x8C: create_instruction(STY, Absolute),
+    0x84: create_instruction(STY, ZeroPage, 3),
+    0x94: create_instruction(STY, ZeroPageX, 4),
+    0x8C: create_instruction(STY, Absolute, 4),
     
     
     # TAX instructions
-    0xAA: create_instruction(TAX, Implied),
+    0xAA: create_instruction(TAX, Implied, 2),
     
     # TAY instructions
-    0xA8: create_instruction(TAY, Implied),
+    0xA8: create_instruction(TAY, Implied, 2),
     
     # TSX instructions
-    0xBA: create_instruction(TSX, Implied),
+    0xBA: create_instruction(TSX, Implied, 2),
     
     # TXA instructions
-    0x8A: create_instruction(TXA, Implied),
+    0x8A: create_instruction(TXA, Implied, 2),
     
     # TXS instructions
-    0x9A: create_instruction(TXS, Implied),
+    0x9A: create_instruction(TXS, Implied, 2),
     
     # TYA instructions
-    0x98: create_instruction(TYA, Implied),
+    0x98: create_instruction(TYA, Implied, 2),
 }
+
+
+def illegal_opcode(core, op):
+    pc = (core.pc - 1) & 0xFFFF
+    raise IllegalOpcodeError('illegal opcode $%02X at $%04X' % (core.read(pc), pc))
+
+
+# the dispatch tables used by the core, indexed by opcode. cycle_table has
+# the base cycle counts, the handlers add the penalties: one cycle for a
+# read whose indexed address crosses a page, and for branches one when taken
+# plus one more if the target is on another page.
+handler_table = [illegal_opcode] * 256
+size_table = [1] * 256
+cycle_table = [2] * 256
+
+for opcode, instruction in instruction_map.items():
+    handler_table[opcode] = compile_handler(instruction)
+    size_table[opcode] = instruction.num_bytes
+    cycle_table[opcode] = instruction.cycles
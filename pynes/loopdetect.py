@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+import hashlib
+import struct
+import time
+
+from pynes.memory import Memory
+from pynes.nsfplayer import NSFPlayer
+
+
+def state_digest(player):
+    """a digest of everything that decides what the next frames of
+    ``player`` sound like: the registers, RAM, WRAM, the bank mapping and
+    the APU registers. The cycle count and the APU internals are left out,
+    they never repeat."""
+    core = player.core
+    data = core.memory.data
+    start, end = core.WRAM
+    state = hashlib.blake2b(digest_size=16)
+    state.update(struct.pack('<HBBBBB?', core.pc, core._acc, core._x, core._y, core.p, core.sp,
+                             player.playing))
+    state.update(data[:Memory.RAM_SIZE])
+    state.update(data[start:end])
+    state.update(core.io_registers)
+    if core.bankswitcher is not None:
+        state.update(core.bankswitcher.registers)
+    return state.digest()
+
+
+class LoopDetector():
+    """Finds where a song starts repeating itself
+
+    The state of the machine is hashed after INIT and after every frame, and
+    the first time a digest comes up again the song has looped: everything
+    after the frame it was first seen at repeats forever. ``loop_start`` is
+    the number of frames before the loop and ``loop_length`` the number of
+    frames in it, both None until a loop is found.
+    """
+
+    def __init__(self):
+        self.seen = {}
+        self.loop_start = None
+        self.loop_length = None
+
+    def update(self, player):
+        """record the state of ``player`` after its last frame, returns True
+        once a loop has been found"""
+        if self.loop_length is not None:
+            return True
+        digest = state_digest(player)
+        first = self.seen.setdefault(digest, player.frame)
+        if first != player.frame:
+            self.loop_start = first
+            self.loop_length = player.frame - first
+            return True
+        return False
+
+
+def find_loop(nsf_file, song=None, max_seconds=600.0, region=None, deadline=None):
+    """play ``song`` on the CPU alone for up to ``max_seconds`` looking for a
+    loop, returns (loop_start, loop_length, frame_rate) with the first two
+    in frames, or None if the song didn't loop in time. The search also
+    gives up once time.time() passes ``deadline``. Without an APU reads of
+    $4015 return 0, which only songs that poll it notice."""
+    player = NSFPlayer(nsf_file, region)
+    player.init(song)
+    detector = LoopDetector()
+    detector.update(player)
+    for frame in player.frames(int(max_seconds * player.frame_rate)):
+        if detector.update(player):
+            return detector.loop_start, detector.loop_length, player.frame_rate
+        if deadline is not None and time.time() > deadline:
+            break
+    return None
+
+
+def loop_seconds(nsf_file, song=None, loops=2, max_seconds=600.0, region=None, deadline=None):
+    """how long ``song`` plays until its loop has played ``loops`` times,
+    None if it didn't loop within ``max_seconds`` or before ``deadline``"""
+    loop = find_loop(nsf_file, song, max_seconds, region, deadline)
+    if loop is None:
+        return None
+    loop_start, loop_length, frame_rate = loop
+    return (loop_start + loops * loop_length) / frame_rate
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='find where the songs of an NSF file loop')
+    parser.add_argument('nsf_file')
+    parser.add_argument('songs', nargs='*', type=int, help='all songs if none are given')
+    parser.add_argument('-t', '--max-seconds', type=float, default=600.0)
+    parser.add_argument('--region', choices=['ntsc', 'pal'], default=None)
+    args = parser.parse_args()
+    for song in args.songs or range(1, NSFPlayer(args.nsf_file).nsf.total_songs + 1):
+        loop = find_loop(args.nsf_file, song, args.max_seconds, args.region)
+        if loop is None:
+            print('song %d: no loop within %gs' % (song, args.max_seconds))
+        else:
+            loop_start, loop_length, frame_rate = loop
+            print('song %d: loops from frame %d (%.2fs) every %d frames (%.2fs)'
+                  % (song, loop_start, loop_start / frame_rate, loop_length, loop_length / frame_rate))
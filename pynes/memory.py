@@ -0,0 +1,74 @@
+class Memory():
+    """The 64KB address space of the core
+
+    The whole space is backed by one preallocated bytearray and every access
+    goes through a table of the 256 pages. Each page maps to a 256 byte
+    memoryview for reads and one for writes, so the RAM mirrors are the same
+    view repeated and ROM is a view into the program data whose writes go to
+    a scratch page. Only pages with I/O registers have a handler, and they are
+    the only ones where an access costs more than an index.
+    """
+    RAM_SIZE = 0x800
+    PAGE_SIZE = 0x100
+
+    def __init__(self):
+        self.data = bytearray(0x10000)
+        view = memoryview(self.data)
+        self.pages = [view[page << 8:(page + 1) << 8] for page in range(256)]
+        # 2KB of RAM, mirrored up to $1FFF
+        for page in range(self.RAM_SIZE >> 8, 0x20):
+            self.pages[page] = self.pages[page % (self.RAM_SIZE >> 8)]
+        self.read_pages = list(self.pages)
+        self.write_pages = list(self.pages)
+        self.read_handlers = [None] * 256
+        self.write_handlers = [None] * 256
+        self.sink = memoryview(bytearray(self.PAGE_SIZE))
+
+        # read/write are closures rather than methods, they run for nearly
+        # every instruction and this saves the attribute lookups on self
+        read_pages = self.read_pages
+        write_pages = self.write_pages
+        read_handlers = self.read_handlers
+        write_handlers = self.write_handlers
+
+        def read(addr):
+            handler = read_handlers[addr >> 8]
+            if handler is None:
+                return read_pages[addr >> 8][addr & 0xFF]
+            return handler(addr)
+
+        def write(addr, value):
+            handler = write_handlers[addr >> 8]
+            if handler is None:
+                write_pages[addr >> 8][addr & 0xFF] = value
+            else:
+                handler(addr, value)
+
+        self.read = read
+        self.write = write
+
+    def map_rom(self, address, data):
+        """map ``data`` read-only at ``address``
+
+        Whole pages map straight onto ``data`` without copying, partial pages
+        at either end are copied into the backing memory.
+        """
+        data = memoryview(data)
+        end = min(address + len(data), 0x10000)
+        for page in range(address >> 8, (end + 0xFF) >> 8):
+            start = page << 8
+            offset = start - address
+            if offset >= 0 and offset + self.PAGE_SIZE <= len(data):
+                self.read_pages[page] = data[offset:offset + self.PAGE_SIZE]
+            else:
+                first = max(start, address)
+                last = min(start + self.PAGE_SIZE, end)
+                self.data[first:last] = data[first - address:last - address]
+                self.read_pages[page] = self.pages[page]
+            self.write_pages[page] = self.sink
+
+    def map_io(self, page, reader=None, writer=None):
+        """handle reads and/or writes to ``page`` with reader(addr) and
+        writer(addr, value)"""
+        self.read_handlers[page] = reader
+        self.write_handlers[page] = writer
@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+import hashlib
+import os
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+
+from pynes.nsfinfo import NSFFile, NSFFileError
+
+COLUMNS = ['path', 'mtime', 'size', 'sha1', 'title', 'artist', 'copyright',
+           'songs', 'starting_song', 'region', 'chips', 'error']
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS nsf (
+    path TEXT PRIMARY KEY,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL,
+    sha1 TEXT,
+    title TEXT,
+    artist TEXT,
+    copyright TEXT,
+    songs INTEGER,
+    starting_song INTEGER,
+    region TEXT,
+    chips TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS nsf_title ON nsf (title);
+CREATE INDEX IF NOT EXISTS nsf_artist ON nsf (artist);
+CREATE INDEX IF NOT EXISTS nsf_sha1 ON nsf (sha1);
+'''
+
+
+def file_hash(path, block_size=1 << 16):
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            sha1.update(block)
+    return sha1.hexdigest()
+
+
+def scan_file(path):
+    """the index row of the NSF file at ``path``, only its header is parsed.
+    Files that are not NSF files get a row with the error."""
+    stat = os.stat(path)
+    row = dict.fromkeys(COLUMNS)
+    row.update(path=path, mtime=stat.st_mtime, size=stat.st_size)
+    try:
+        nsf = NSFFile(path)
+        row.update(sha1=file_hash(path), title=nsf.song_name, artist=nsf.artist_name,
+                   copyright=nsf.copyright, songs=nsf.total_songs, starting_song=nsf.starting_song,
+                   region=nsf.tune_type, chips=','.join(nsf.extra_sound_chips))
+    except (NSFFileError, OSError) as e:
+        row['error'] = str(e)
+    return row
+
+
+class NSFIndex():
+    """A SQLite catalogue of the NSF headers in a set of directory trees
+
+    Updating walks the trees and only rescans files whose mtime or size
+    changed since they were indexed, spreading them over a process pool,
+    and drops files that are gone. Queries never touch the files.
+    """
+
+    def __init__(self, db_path):
+        self.db = sqlite3.connect(db_path)
+        self.db.row_factory = sqlite3.Row
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def update(self, roots, workers=None, chunksize=64):
+        """bring the index up to date with the .nsf files under ``roots``,
+        returns how many files were added, updated, removed and unchanged"""
+        known = {}
+        for row in self.db.execute('SELECT path, mtime, size FROM nsf'):
+            known[row['path']] = (row['mtime'], row['size'])
+
+        counts = {'added': 0, 'updated': 0, 'removed': 0, 'unchanged': 0}
+        seen = set()
+        changed = []
+        for root in roots:
+            root = os.path.abspath(root)
+            for directory, dirs, files in os.walk(root):
+                for name in files:
+                    if not name.lower().endswith('.nsf'):
+                        continue
+                    path = os.path.join(directory, name)
+                    seen.add(path)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    if known.get(path) == (stat.st_mtime, stat.st_size):
+                        counts['unchanged'] += 1
+                    else:
+                        changed.append(path)
+
+        if changed:
+            insert = 'INSERT OR REPLACE INTO nsf (%s) VALUES (%s)' % (
+                ', '.join(COLUMNS), ', '.join('?' * len(COLUMNS)))
+            with ProcessPoolExecutor(workers) as pool, self.db:
+                for row in pool.map(scan_file, changed, chunksize=chunksize):
+                    counts['updated' if row['path'] in known else 'added'] += 1
+                    self.db.execute(insert, [row[column] for column in COLUMNS])
+
+        prefixes = tuple(os.path.join(os.path.abspath(root), '') for root in roots)
+        gone = [(path,) for path in known if path.startswith(prefixes) and path not in seen]
+        with self.db:
+            self.db.executemany('DELETE FROM nsf WHERE path = ?', gone)
+        counts['removed'] = len(gone)
+        return counts
+
+    def search(self, title=None, artist=None, chip=None, region=None, sha1=None, limit=None):
+        """the rows matching every given filter, title and artist match
+        substrings ignoring case"""
+        where = ['error IS NULL']
+        args = []
+        for column, value in (('title', title), ('artist', artist)):
+            if value is not None:
+                where.append('%s LIKE ?' % column)
+                args.append('%%%s%%' % value)
+        if chip is not None:
+            where.append("(',' || chips || ',') LIKE ?")
+            args.append('%%,%s,%%' % chip)
+        for column, value in (('region', region), ('sha1', sha1)):
+            if value is not None:
+                where.append('%s = ?' % column)
+                args.append(value)
+        query = 'SELECT * FROM nsf WHERE %s ORDER BY artist, title, path' % ' AND '.join(where)
+        if limit is not None:
+            query += ' LIMIT %d' % limit
+        return [dict(row) for row in self.db.execute(query, args)]
+
+    def get(self, path):
+        row = self.db.execute('SELECT * FROM nsf WHERE path = ?', (os.path.abspath(path),)).fetchone()
+        return dict(row) if row is not None else None
+
+    def __len__(self):
+        return self.db.execute('SELECT COUNT(*) FROM nsf').fetchone()[0]
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='index NSF headers into SQLite and query them')
+    parser.add_argument('db')
+    commands = parser.add_subparsers(dest='command', required=True)
+    update = commands.add_parser('update', help='index the .nsf files under some directories')
+    update.add_argument('roots', nargs='+')
+    update.add_argument('-j', '--workers', type=int, default=None)
+    search = commands.add_parser('search', help='list indexed files')
+    search.add_argument('--title')
+    search.add_argument('--artist')
+    search.add_argument('--chip', choices=NSFFile.SOUND_CHIPS)
+    search.add_argument('--region', choices=NSFFile.TYPES)
+    search.add_argument('--sha1')
+    search.add_argument('--limit', type=int)
+    args = parser.parse_args()
+
+    index = NSFIndex(args.db)
+    if args.command == 'update':
+        counts = index.update(args.roots, args.workers)
+        print(', '.join('%d %s' % (counts[key], key) for key in ('added', 'updated', 'removed', 'unchanged')))
+    else:
+        for row in index.search(args.title, args.artist, args.chip, args.region, args.sha1, args.limit):
+            print('%s | %s | %d songs | %s%s' % (row['artist'], row['title'], row['songs'], row['region'],
+                                                 ' | ' + row['chips'] if row['chips'] else ''))
+            print('    %s' % row['path'])
+    index.close()
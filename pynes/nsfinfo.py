@@ -1,4 +1,5 @@
 #!/usr/bin/env python
+import mmap
 import struct
 
 
@@ -24,19 +25,42 @@ class NSFFile():
 
     _struct_format = '<5scccHHH32s32s32sH8sHcc4s'
     _struct_len = struct.calcsize(_struct_format)
-    _nsf_magic = 'NESM\x1A'
+    _nsf_magic = b'NESM\x1A'
 
     def __init__(self, nsf_file):
+        """parse the header of ``nsf_file``, only its first 128 bytes are
+        read until the program data is needed"""
         self.file_name = nsf_file
+        self._mmap = None
+        self._data = None
         try:
-            with open(nsf_file) as f:
-                data = f.read()
+            with open(nsf_file, 'rb') as f:
+                header = f.read(self._struct_len)
         except IOError as e:
             raise NSFFileError('failed to read %s (%s)' % (nsf_file, str(e)))
-        
-        info = struct.unpack(self._struct_format, data[:self._struct_len])
+
+        self.parse_header(header)
+
+    @property
+    def data(self):
+        """the program data, a read-only memoryview over the memory mapped
+        file. Mapping it shares the page cache between every process playing
+        the file, and slicing it never copies."""
+        if self._data is None:
+            try:
+                with open(self.file_name, 'rb') as f:
+                    self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except (IOError, ValueError) as e:
+                raise NSFFileError('failed to map %s (%s)' % (self.file_name, str(e)))
+            self._data = memoryview(self._mmap)[self._struct_len:]
+        return self._data
+
+    def parse_header(self, header):
+        if len(header) < self._struct_len:
+            raise NSFFileError('%s is not a valid NSF file' % self.file_name)
+        info = struct.unpack(self._struct_format, header[:self._struct_len])
         if info[0] != self._nsf_magic:
-            raise NSFFileError('%s is not a valid NSF file' % nsf_file)
+            raise NSFFileError('%s is not a valid NSF file' % self.file_name)
 
         self.nsf_version = ord(info[1])
         self.total_songs = ord(info[2])
@@ -46,10 +70,10 @@ class NSFFile():
         self.play_address = info[6]
 
         def from_c_str(in_str):
-            loc = in_str.find('\x00')
-            if loc == -1:
-                return in_str
-            return in_str[:loc]
+            loc = in_str.find(b'\x00')
+            if loc != -1:
+                in_str = in_str[:loc]
+            return in_str.decode('latin-1')
 
         self.song_name = from_c_str(info[7])
         self.artist_name = from_c_str(info[8])
@@ -60,21 +84,17 @@ class NSFFile():
         self.ntsc_pal_bits = info[13]
         self.sound_chip_bits = info[14]
 
-        ntsc_pal = bin(ord(self.ntsc_pal_bits))[2:].ljust(8, '0')
-        if ntsc_pal[-2] == '1':
+        ntsc_pal = ord(self.ntsc_pal_bits)
+        if ntsc_pal & 0x02:
             self.tune_type = self.TYPE_BOTH
-        elif ntsc_pal[-1] == '0':
-            self.tune_type = self.TYPE_NTSC
-        else:
+        elif ntsc_pal & 0x01:
             self.tune_type = self.TYPE_PAL
+        else:
+            self.tune_type = self.TYPE_NTSC
 
-        self.extra_sound_chips = []
-
-        for index, bit in enumerate(bin(ord(self.sound_chip_bits))[2:].ljust(8, '0')[-1:-6:-1]):
-            if bit == '1':
-                self.extra_sound_chips.append(self.SOUND_CHIPS[index])
-
-        self.data = data[self._struct_len:]
+        # bit n of the chip byte stands for SOUND_CHIPS[n]
+        chips = ord(self.sound_chip_bits)
+        self.extra_sound_chips = [chip for index, chip in enumerate(self.SOUND_CHIPS) if chips & (1 << index)]
 
 
     def print_info(self):
@@ -88,7 +108,7 @@ class NSFFile():
         print('play address:  %d' % self.play_address)
         print('ntsc speed:    %d' % self.ntsc_speed)
         print('pal speed:     %d' % self.pal_speed)
-        print('bankswitch:    0x%s' % self.bankswitch.encode('hex'))
+        print('bankswitch:    0x%s' % self.bankswitch.hex())
         print('ntsc/pal bits: %s' % bin(ord(self.ntsc_pal_bits)).ljust(8, '0'))
         print('snd chip bits: %s' % bin(ord(self.sound_chip_bits)).ljust(8, '0'))
         print('tune type:     %s' % self.tune_type)
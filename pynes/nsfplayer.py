@@ -0,0 +1,227 @@
+#!/usr/bin/env python
+import struct
+
+from pynes.core6502 import Core6502
+from pynes.nsfinfo import NSFFile
+from pynes.apulog import RegisterLog
+
+
+class NSFPlayerError(Exception):
+    """generic NSFPlayer exception"""
+
+
+class NSFPlayer():
+    """Runs the INIT and PLAY routines of an NSF file on a Core6502
+
+    A routine is called by pushing a fake return address and pointing pc at
+    it, and it has returned once pc reaches RETURN_ADDRESS. A routine that
+    parks in a jump or branch to itself (JMP *) waits for an interrupt that
+    never comes, so it counts as returned too and the stack is put back the
+    way it was before the call. PLAY is called once per frame at the rate
+    given in the header, with the frame's length in CPU cycles as its budget.
+    Whatever is left of a frame after PLAY returns is idle time, which is
+    skipped instead of emulated.
+
+    With a ``sample_rate`` an APU is attached to the core and each frame
+    returns its audio, without one the player runs the CPU only. With
+    ``register_log`` the sound register writes are recorded into a
+    RegisterLog (``player.core.apu``) instead, see pynes.apulog. With
+    ``precompile`` a core with a decode cache or translator gets the code
+    reachable from INIT and PLAY, as found by pynes.disasm, compiled before
+    INIT runs.
+    """
+    # nothing is mapped at $3FF8 in an NSF player, so no code can live there
+    RETURN_ADDRESS = 0x3FF8
+
+    CPU_CLOCK = {
+        NSFFile.TYPE_NTSC: 1789772.7272,
+        NSFFile.TYPE_PAL: 1662607.0312,
+    }
+    DEFAULT_SPEED = {
+        NSFFile.TYPE_NTSC: 16639,
+        NSFFile.TYPE_PAL: 19997,
+    }
+
+    # how many frames INIT may take before we give up on it
+    INIT_FRAMES = 300
+
+    _snapshot_format = '<HQQ?B'
+    _snapshot_len = struct.calcsize(_snapshot_format)
+
+    def __init__(self, nsf_file, region=None, core=None, sample_rate=None, register_log=False, precompile=False):
+        if not isinstance(nsf_file, NSFFile):
+            nsf_file = NSFFile(nsf_file)
+        self.nsf = nsf_file
+
+        if region is None:
+            region = NSFFile.TYPE_PAL if nsf_file.tune_type == NSFFile.TYPE_PAL else NSFFile.TYPE_NTSC
+        if region not in self.CPU_CLOCK:
+            raise NSFPlayerError('unknown region %s' % region)
+        self.region = region
+
+        speed = nsf_file.pal_speed if region == NSFFile.TYPE_PAL else nsf_file.ntsc_speed
+        speed = speed or self.DEFAULT_SPEED[region]
+        self.cpu_clock = self.CPU_CLOCK[region]
+        self.frame_rate = 1000000.0 / speed
+        self.cycles_per_frame = self.cpu_clock / self.frame_rate
+        self.sample_rate = sample_rate
+        self.register_log = register_log
+        self.precompile = precompile
+        self.block_starts = None
+
+        self.core = core or Core6502()
+        self.core.load(nsf_file)
+        self.song = None
+        self.frame = 0
+        self.start_cycle = 0
+        self.playing = False
+        # the stack pointer before the routine running was called
+        self.call_sp = self.core.sp
+
+    def reset(self):
+        """put the machine in the state INIT is called in: a fresh memory
+        map with the header banks, cleared RAM and sound registers and a new
+        APU or register log"""
+        nsf = self.nsf
+        core = self.core
+        # reloading gives a fresh memory map, banks and all
+        core.load(nsf)
+        core.apu = None
+        if self.register_log:
+            RegisterLog(self.cpu_clock).attach(core, nsf)
+        elif self.sample_rate:
+            # numpy is only needed when rendering audio
+            from pynes.apu import APU
+            core.apu = APU(self.cpu_clock, self.sample_rate, core.read)
+        data = core.memory.data
+        data[0x0000:0x0800] = bytes(0x800)
+        data[0x6000:0x8000] = bytes(0x2000)
+        for addr in range(0x4000, 0x4014):
+            core.write(addr, 0)
+        core.write(0x4015, 0x00)
+        core.write(0x4015, 0x0F)
+        core.write(0x4017, 0x40)
+        if core.bankswitcher is not None:
+            core.bankswitcher.reset()
+        if self.precompile and core.code_caches():
+            if self.block_starts is None:
+                from pynes.disasm import Disassembler
+                self.block_starts = sorted(Disassembler(nsf).block_starts)
+            core.precompile(self.block_starts)
+
+    def init(self, song=None):
+        """reset the machine and run INIT for ``song``, counting from 1 and
+        defaulting to the starting song of the file"""
+        nsf = self.nsf
+        song = song or nsf.starting_song
+        if not 1 <= song <= nsf.total_songs:
+            raise NSFPlayerError('%s has no song %d' % (nsf.file_name, song))
+
+        self.reset()
+        core = self.core
+        core._acc = song - 1
+        core._x = 1 if self.region == NSFFile.TYPE_PAL else 0
+        # INIT runs a frame at a time, so one that parks in an idle loop is
+        # done at the end of the frame it parked in
+        start = core.cycles
+        returned = self.call(nsf.init_address, int(self.cycles_per_frame))
+        frame = 1
+        while not returned and frame < self.INIT_FRAMES:
+            frame += 1
+            returned = self.resume(start + int(frame * self.cycles_per_frame))
+        if not returned:
+            raise NSFPlayerError('INIT routine at $%04X did not return' % nsf.init_address)
+
+        if core.apu is not None:
+            # drop the audio produced while INIT ran, a log marks where it ends
+            core.apu.end_frame(core.cycles)
+        self.song = song
+        self.frame = 0
+        self.start_cycle = core.cycles
+        self.playing = False
+
+    def snapshot(self):
+        """the state of the player and its core as bytes, restoring it is
+        much cheaper than running INIT and playing up to the same frame"""
+        core = self.core.snapshot()
+        return struct.pack(self._snapshot_format, self.song or 0, self.frame, self.start_cycle,
+                           self.playing, self.call_sp) + core
+
+    def restore(self, snapshot):
+        """go back to the state saved by snapshot()"""
+        if self.song is None:
+            # the snapshot overwrites the state INIT leaves, only the APU and
+            # the memory map have to be set up
+            self.reset()
+        song, frame, start_cycle, playing, call_sp = struct.unpack(self._snapshot_format,
+                                                                   snapshot[:self._snapshot_len])
+        self.core.restore(snapshot[self._snapshot_len:])
+        self.song = song or None
+        self.frame = frame
+        self.start_cycle = start_cycle
+        self.playing = playing
+        self.call_sp = call_sp
+
+    def call(self, address, budget):
+        """call the routine at ``address``, returns True if it returned
+        within ``budget`` cycles"""
+        core = self.core
+        self.call_sp = core.sp
+        core.push_word((self.RETURN_ADDRESS - 1) & 0xFFFF)
+        core.pc = address
+        return self.resume(core.cycles + budget)
+
+    def resume(self, end):
+        """keep running the current routine until it returns or the cycle
+        counter reaches ``end``"""
+        core = self.core
+        if core.run_until(self.RETURN_ADDRESS, end - core.cycles):
+            return True
+        if core.idled:
+            # parked in an idle loop, which is as far as it goes
+            core.sp = self.call_sp
+            return True
+        return False
+
+    def play_frame(self):
+        """emulate one frame. PLAY is called unless the previous call is still
+        running, in which case that one carries on. Returns the audio of the
+        frame if there is an APU, None otherwise."""
+        if self.song is None:
+            self.init()
+        core = self.core
+        # frames are timed from the start to keep rounding from drifting
+        end = self.start_cycle + int((self.frame + 1) * self.cycles_per_frame)
+        start = core.cycles
+        if self.playing:
+            returned = self.resume(end)
+        else:
+            returned = self.call(self.nsf.play_address, end - core.cycles)
+        self.playing = not returned
+        if core.profiler is not None:
+            core.profiler.add_frame(core.cycles - start, returned)
+        if core.cycles < end:
+            core.cycles = end
+        self.frame += 1
+        if core.apu is not None:
+            return core.apu.end_frame(core.cycles)
+
+    def frames(self, count=None):
+        """generator playing ``count`` frames (forever if None), yields the
+        number of each frame once it has been emulated"""
+        while count is None or self.frame < count:
+            self.play_frame()
+            yield self.frame
+
+
+if __name__ == '__main__':
+    import sys
+    import time
+    player = NSFPlayer(sys.argv[1])
+    player.init(int(sys.argv[2]) if len(sys.argv) > 2 else None)
+    seconds = float(sys.argv[3]) if len(sys.argv) > 3 else 60.0
+    start = time.time()
+    for frame in player.frames(int(seconds * player.frame_rate)):
+        pass
+    elapsed = time.time() - start
+    print('%d frames in %.2fs, %.1fx realtime' % (player.frame, elapsed, seconds / elapsed))
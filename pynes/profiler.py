@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+import json
+from array import array
+
+from pynes.instructions import instruction_map, size_table
+from pynes.trace import disassemble
+
+
+class Profiler():
+    """Counts what the core executes and how long every PLAY call takes
+
+    Set it as ``core.profiler``: while it is set, run_until counts every
+    opcode and program counter in an interpreter loop of its own, and
+    NSFPlayer reports the cycles PLAY used in each frame. With ``every``
+    only one run_until call in that many is counted, the others run at full
+    speed in whatever loop the core normally uses, which keeps the cost low
+    enough to leave on. Frame timings are always complete.
+    """
+
+    def __init__(self, every=1):
+        self.every = every
+        self.calls = 0
+        self.sampled = 0
+        self.opcodes = [0] * 256
+        self.pcs = [0] * 0x10000
+        # the cycles PLAY ran in each frame
+        self.frame_cycles = array('L')
+        # frames PLAY didn't return in, it carried on in the next one
+        self.overruns = 0
+
+    def sample(self):
+        """True if this run_until call should be counted"""
+        self.calls += 1
+        if self.calls % self.every:
+            return False
+        self.sampled += 1
+        return True
+
+    def add_frame(self, cycles, returned):
+        self.frame_cycles.append(int(cycles))
+        if not returned:
+            self.overruns += 1
+
+    def instructions(self):
+        return sum(self.opcodes)
+
+    def top_opcodes(self, count=10):
+        """the ``count`` most executed opcodes as (opcode, executions)"""
+        ranked = sorted(((n, opcode) for opcode, n in enumerate(self.opcodes) if n), reverse=True)
+        return [(opcode, n) for n, opcode in ranked[:count]]
+
+    def top_pcs(self, count=10):
+        """the ``count`` most executed addresses as (pc, executions)"""
+        ranked = sorted(((n, pc) for pc, n in enumerate(self.pcs) if n), reverse=True)
+        return [(pc, n) for n, pc in ranked[:count]]
+
+    def worst_frame(self):
+        """(frame, cycles) of the frame PLAY took longest in, None before
+        the first frame"""
+        if not self.frame_cycles:
+            return None
+        cycles = max(self.frame_cycles)
+        return self.frame_cycles.index(cycles), cycles
+
+    def stats(self, budget=None):
+        """everything collected as a dict ready for JSON, opcodes and
+        addresses as hex strings. ``budget`` is the cycles in a frame."""
+        frames = len(self.frame_cycles)
+        worst = self.worst_frame()
+        stats = {
+            'instructions': self.instructions(),
+            'calls': self.calls,
+            'sampled_calls': self.sampled,
+            'opcodes': dict(('%02X' % opcode, n) for opcode, n in enumerate(self.opcodes) if n),
+            'pcs': dict(('%04X' % pc, n) for pc, n in enumerate(self.pcs) if n),
+            'frames': frames,
+            'frame_cycles': list(self.frame_cycles),
+            'mean_frame_cycles': sum(self.frame_cycles) / float(frames) if frames else 0.0,
+            'worst_frame': worst[0] if worst else None,
+            'worst_frame_cycles': worst[1] if worst else None,
+            'overruns': self.overruns,
+        }
+        if budget is not None:
+            stats['frame_budget'] = budget
+            stats['worst_frame_load'] = worst[1] / float(budget) if worst else None
+        return stats
+
+    def save(self, path, budget=None):
+        with open(path, 'w') as f:
+            json.dump(self.stats(budget), f, indent=1, sort_keys=True)
+
+    def report(self, top=10, budget=None, read=None):
+        """a human readable summary with the ``top`` opcodes and addresses,
+        disassembled from memory with a ``read`` function"""
+        total = self.instructions() or 1
+        lines = ['%d instructions in %d of %d run calls' % (self.instructions(), self.sampled, self.calls)]
+        if self.frame_cycles:
+            frame, cycles = self.worst_frame()
+            lines.append('%d frames, PLAY ran %.0f cycles on average, at most %d in frame %d%s'
+                         % (len(self.frame_cycles), sum(self.frame_cycles) / float(len(self.frame_cycles)),
+                            cycles, frame, ' (%.0f%% of the frame)' % (100.0 * cycles / budget) if budget else ''))
+            if self.overruns:
+                lines.append('PLAY overran its frame %d times' % self.overruns)
+        lines.append('')
+        lines.append('opcode  instruction        count      share')
+        for opcode, n in self.top_opcodes(top):
+            instruction = instruction_map.get(opcode)
+            name = instruction.__name__ if instruction is not None else 'illegal'
+            lines.append('  $%02X   %-14s %10d %9.2f%%' % (opcode, name, n, 100.0 * n / total))
+        lines.append('')
+        lines.append('address  code                count      share')
+        for pc, n in self.top_pcs(top):
+            code = ''
+            if read is not None:
+                opcode = read(pc)
+                operand = 0
+                for i in range(1, size_table[opcode]):
+                    operand |= read((pc + i) & 0xFFFF) << 8 * (i - 1)
+                code = disassemble(opcode, operand)
+            lines.append('  $%04X  %-14s %10d %9.2f%%' % (pc, code, n, 100.0 * n / total))
+        return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    import argparse
+    from pynes.core6502 import Core6502
+    from pynes.nsfplayer import NSFPlayer
+    parser = argparse.ArgumentParser(description='profile the 6502 code of an NSF song')
+    parser.add_argument('nsf_file')
+    parser.add_argument('song', nargs='?', type=int, default=None)
+    parser.add_argument('-t', '--seconds', type=float, default=60.0)
+    parser.add_argument('-n', '--top', type=int, default=10)
+    parser.add_argument('-e', '--every', type=int, default=1, help='count one run call in this many')
+    parser.add_argument('--translate', action='store_true', help='run the calls not counted translated')
+    parser.add_argument('--json', default=None, help='also write the statistics to this file')
+    args = parser.parse_args()
+
+    player = NSFPlayer(args.nsf_file, core=Core6502(translate=args.translate))
+    profiler = player.core.profiler = Profiler(args.every)
+    player.init(args.song)
+    for frame in player.frames(int(args.seconds * player.frame_rate)):
+        pass
+    budget = int(player.cycles_per_frame)
+    print(profiler.report(args.top, budget, player.core.read))
+    if args.json:
+        profiler.save(args.json, budget)
@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+import sys
+import wave
+
+import numpy as np
+
+from pynes.nsfplayer import NSFPlayer
+
+SAMPLE_WIDTH = 2
+FORMATS = ['wav', 'raw']
+# seconds a looped render fades out over after its last loop
+LOOP_FADE = 8.0
+
+
+def render(nsf_file, song=None, seconds=180.0, sample_rate=44100, region=None, chunk_frames=60, volume=1.0,
+           start=0.0, seek_index=None, fade=0.0, silence=None):
+    """generator rendering ``seconds`` of ``song`` from ``start`` seconds in,
+    yields chunks of mono 16-bit little-endian PCM of ``chunk_frames`` frames
+    each.
+
+    Exactly int(seconds * sample_rate) samples come out in total, unless
+    ``silence`` is given: then the render ends early once the output has
+    stayed the same for that many seconds. Nothing is kept between chunks,
+    so memory stays the same however long the render.
+    With a SeekIndex (see pynes.seekindex) playing starts from its last
+    checkpoint before ``start``, and checkpoints are added on the way. The
+    last ``fade`` seconds fade out linearly.
+    """
+    player = NSFPlayer(nsf_file, region, sample_rate=sample_rate)
+    skip = int(start * sample_rate)
+    if seek_index is not None:
+        position = seek_index.seek(player, song, skip)
+    else:
+        player.init(song)
+        position = 0
+
+    def play_frame():
+        nonlocal position
+        if seek_index is not None:
+            seek_index.add(player, position)
+        samples = player.play_frame()
+        position += len(samples)
+        return samples
+
+    chunk = []
+    while position <= skip:
+        samples = play_frame()
+        if position > skip:
+            chunk.append(samples[len(samples) - (position - skip):])
+
+    remaining = int(seconds * sample_rate)
+    fade_samples = min(int(fade * sample_rate), remaining)
+    silence_samples = int(silence * sample_rate) if silence else None
+    silent = 0
+    last = None
+    scale = 32767 * volume
+    while remaining:
+        chunk.extend(play_frame() for frame in range(chunk_frames - len(chunk)))
+        samples = np.concatenate(chunk)[:remaining]
+        chunk = []
+        if remaining - len(samples) < fade_samples:
+            # the gain goes from 1 at the start of the fade to 0 at the end
+            gain = (remaining - np.arange(len(samples))) / fade_samples
+            samples = samples * np.minimum(gain, 1.0)
+        remaining -= len(samples)
+        pcm = np.clip(samples * scale, -32768, 32767).astype('<i2')
+        yield pcm.tobytes()
+
+        if silence_samples is not None and len(pcm):
+            if (pcm == pcm[0]).all():
+                silent = silent + len(pcm) if pcm[0] == last else len(pcm)
+            else:
+                silent = 0
+            last = pcm[-1]
+            if silent >= silence_samples:
+                return
+
+
+def write_wav(out, chunks, sample_rate, samples):
+    """write ``chunks`` to ``out`` as a WAV of ``samples`` mono samples, the
+    header is written up front so ``out`` does not need to be seekable
+    unless fewer samples come. Returns the number of samples written."""
+    w = wave.open(out, 'wb')
+    w.setnchannels(1)
+    w.setsampwidth(SAMPLE_WIDTH)
+    w.setframerate(sample_rate)
+    w.setnframes(samples)
+    written = 0
+    try:
+        for chunk in chunks:
+            w.writeframesraw(chunk)
+            written += len(chunk) // SAMPLE_WIDTH
+    finally:
+        w.close()
+    return written
+
+
+def write_raw(out, chunks):
+    for chunk in chunks:
+        out.write(chunk)
+
+
+def render_file(nsf_file, output, song=None, seconds=180.0, sample_rate=44100, format='wav', region=None,
+                start=0.0, seek_index=None, fade=0.0, silence=None):
+    """render to the file ``output`` (stdout if '-') as WAV or raw PCM"""
+    if format not in FORMATS:
+        raise ValueError('unknown format %s' % format)
+    if silence and format == 'wav' and output == '-':
+        # the header has to be fixed up when the render ends early
+        raise ValueError('ending on silence needs a WAV file, not stdout')
+    chunks = render(nsf_file, song, seconds, sample_rate, region, start=start, seek_index=seek_index, fade=fade,
+                    silence=silence)
+    out = sys.stdout.buffer if output == '-' else open(output, 'wb')
+    try:
+        if format == 'wav':
+            write_wav(out, chunks, sample_rate, int(seconds * sample_rate))
+        else:
+            write_raw(out, chunks)
+    finally:
+        if out is not sys.stdout.buffer:
+            out.close()
+        else:
+            out.flush()
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='render an NSF song to 16-bit mono PCM')
+    parser.add_argument('nsf_file')
+    parser.add_argument('song', nargs='?', type=int, default=None)
+    parser.add_argument('seconds', nargs='?', type=float, default=180.0)
+    parser.add_argument('-o', '--output', default='-', help="output file, '-' for stdout")
+    parser.add_argument('-f', '--format', choices=FORMATS, default=None,
+                        help='defaults to wav for .wav files and raw otherwise')
+    parser.add_argument('-r', '--rate', type=int, default=44100)
+    parser.add_argument('--region', choices=['ntsc', 'pal'], default=None)
+    parser.add_argument('-s', '--start', type=float, default=0.0, help='seconds into the song to start at')
+    parser.add_argument('--seek-index', action='store_true',
+                        help='seek with, and add to, the seek index next to the NSF file')
+    parser.add_argument('-l', '--loops', type=int, default=None,
+                        help='play songs that loop this many times through their loop instead of for seconds')
+    parser.add_argument('--fade', type=float, default=None,
+                        help='seconds to fade out over at the end, %g with --loops, 0 without' % LOOP_FADE)
+    parser.add_argument('--silence', type=float, default=None,
+                        help='stop once the output has been silent for this many seconds')
+    args = parser.parse_args()
+    seconds = args.seconds
+    fade = args.fade or 0.0
+    if args.loops is not None:
+        from pynes.loopdetect import loop_seconds
+        looped = loop_seconds(args.nsf_file, args.song, args.loops, region=args.region)
+        if looped is not None:
+            fade = LOOP_FADE if args.fade is None else args.fade
+            seconds = looped + fade
+    format = args.format or ('wav' if args.output.lower().endswith('.wav') else 'raw')
+    if args.silence and format == 'wav' and args.output == '-':
+        parser.error('--silence needs a WAV file or raw output')
+    seek_index = None
+    if args.seek_index:
+        from pynes.seekindex import SeekIndex
+        seek_index = SeekIndex(args.nsf_file, args.rate, args.region)
+    try:
+        render_file(args.nsf_file, args.output, args.song, seconds, args.rate, format, args.region,
+                    args.start, seek_index, fade, args.silence)
+    finally:
+        if seek_index is not None:
+            seek_index.save()
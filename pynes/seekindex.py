@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+import bisect
+import hashlib
+import os
+import struct
+
+from pynes.nsfplayer import NSFPlayer
+
+
+class SeekIndexError(Exception):
+    """generic SeekIndex exception"""
+
+
+class SeekIndex():
+    """Player snapshots every ``interval`` frames of the songs of an NSF file
+
+    Checkpoints are taken while rendering, and seeking to a sample restores
+    the last checkpoint before it and only emulates the gap, so random access
+    costs at most ``interval`` frames however long the song. The index is
+    kept in ``path`` (the NSF path plus .seek by default) and only holds for
+    the file, sample rate, region and interval it was built with. An index
+    built with anything else is stale and starts over.
+
+    The file is a header followed by (song, frame, sample, size) entries,
+    each one followed by its NSFPlayer snapshot.
+    """
+    MAGIC = b'PSEK'
+    VERSION = 2
+    EXTENSION = '.seek'
+    _header_format = '<4sBII4s20sI'
+    _header_len = struct.calcsize(_header_format)
+    _entry_format = '<HIQI'
+    _entry_len = struct.calcsize(_entry_format)
+
+    def __init__(self, nsf_path, sample_rate=44100, region=None, interval=300, path=None):
+        self.nsf_path = nsf_path
+        self.path = path or nsf_path + self.EXTENSION
+        self.sample_rate = sample_rate
+        self.region = region
+        self.interval = interval
+        with open(nsf_path, 'rb') as f:
+            self.digest = hashlib.sha1(f.read()).digest()
+        # song -> sorted list of (sample, frame, snapshot)
+        self.checkpoints = {}
+        self.modified = False
+        if os.path.exists(self.path):
+            self.load()
+
+    def __len__(self):
+        return sum(len(checkpoints) for checkpoints in self.checkpoints.values())
+
+    def load(self):
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        if len(data) < self._header_len:
+            raise SeekIndexError('%s is truncated' % self.path)
+        magic, version, sample_rate, interval, region, digest, count = struct.unpack(
+            self._header_format, data[:self._header_len])
+        if magic != self.MAGIC:
+            raise SeekIndexError('%s is not a seek index' % self.path)
+        region = region.rstrip(b'\0').decode('ascii') or None
+        if (version, sample_rate, interval, region, digest) != (
+                self.VERSION, self.sample_rate, self.interval, self.region, self.digest):
+            return
+
+        offset = self._header_len
+        checkpoints = {}
+        for i in range(count):
+            entry = data[offset:offset + self._entry_len]
+            if len(entry) != self._entry_len:
+                raise SeekIndexError('%s is truncated' % self.path)
+            song, frame, sample, size = struct.unpack(self._entry_format, entry)
+            offset += self._entry_len
+            snapshot = data[offset:offset + size]
+            if len(snapshot) != size:
+                raise SeekIndexError('%s is truncated' % self.path)
+            offset += size
+            checkpoints.setdefault(song, []).append((sample, frame, snapshot))
+        for song in checkpoints:
+            checkpoints[song].sort()
+        self.checkpoints = checkpoints
+
+    def save(self):
+        """write the index to its file if it changed, through a temporary
+        file so a reader never sees half of it"""
+        if not self.modified:
+            return
+        region = (self.region or '').encode('ascii')
+        parts = [struct.pack(self._header_format, self.MAGIC, self.VERSION, self.sample_rate,
+                             self.interval, region, self.digest, len(self))]
+        for song in sorted(self.checkpoints):
+            for sample, frame, snapshot in self.checkpoints[song]:
+                parts.append(struct.pack(self._entry_format, song, frame, sample, len(snapshot)))
+                parts.append(snapshot)
+        temp = self.path + '.part'
+        with open(temp, 'wb') as f:
+            f.write(b''.join(parts))
+        os.replace(temp, self.path)
+        self.modified = False
+
+    def add(self, player, sample):
+        """take a checkpoint of ``player``, which is about to play the frame
+        starting at ``sample``, if the frame is on the interval and has none"""
+        if player.frame % self.interval:
+            return
+        checkpoints = self.checkpoints.setdefault(player.song, [])
+        i = bisect.bisect_left(checkpoints, (sample,))
+        if i < len(checkpoints) and checkpoints[i][0] == sample:
+            return
+        checkpoints.insert(i, (sample, player.frame, player.snapshot()))
+        self.modified = True
+
+    def nearest(self, song, sample):
+        """the last checkpoint of ``song`` at or before ``sample`` as
+        (sample, frame, snapshot), None if there is none"""
+        checkpoints = self.checkpoints.get(song, [])
+        i = bisect.bisect_right(checkpoints, (sample, float('inf')))
+        return checkpoints[i - 1] if i else None
+
+    def seek(self, player, song, sample):
+        """get ``player`` to the last checkpoint of ``song`` before ``sample``,
+        INIT if there is none. Returns the sample the player is at."""
+        if player.sample_rate != self.sample_rate or self.region not in (None, player.region):
+            raise SeekIndexError('the index was built for another sample rate or region')
+        song = song or player.nsf.starting_song
+        checkpoint = self.nearest(song, sample)
+        if checkpoint is None:
+            player.init(song)
+            return 0
+        position, frame, snapshot = checkpoint
+        player.restore(snapshot)
+        return position
+
+    def build(self, song=None, seconds=180.0):
+        """play the first ``seconds`` of ``song`` taking checkpoints, returns
+        how many there are for it"""
+        player = NSFPlayer(self.nsf_path, self.region, sample_rate=self.sample_rate)
+        song = song or player.nsf.starting_song
+        end = int(seconds * self.sample_rate)
+        position = self.seek(player, song, end)
+        while position < end:
+            self.add(player, position)
+            position += len(player.play_frame())
+        return len(self.checkpoints.get(song, []))
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='build the seek index of the songs of an NSF file')
+    parser.add_argument('nsf_file')
+    parser.add_argument('songs', nargs='*', type=int, help='all songs if none are given')
+    parser.add_argument('-t', '--seconds', type=float, default=180.0)
+    parser.add_argument('-r', '--rate', type=int, default=44100)
+    parser.add_argument('-i', '--interval', type=int, default=300, help='frames between checkpoints')
+    parser.add_argument('--region', choices=['ntsc', 'pal'], default=None)
+    args = parser.parse_args()
+    index = SeekIndex(args.nsf_file, args.rate, args.region, args.interval)
+    for song in args.songs or range(1, NSFPlayer(args.nsf_file).nsf.total_songs + 1):
+        print('song %d: %d checkpoints' % (song, index.build(song, args.seconds)))
+    index.save()
+    if os.path.exists(index.path):
+        print('%s: %d checkpoints, %d bytes' % (index.path, len(index), os.path.getsize(index.path)))
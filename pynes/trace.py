@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+import struct
+
+from pynes.corestatus import format_status
+from pynes.instructions import instruction_map
+
+# one executed instruction, with the registers as they were before it ran:
+# cycles, pc, opcode, operand, a, x, y, p, sp
+RECORD = struct.Struct('<QHBHBBBBB')
+MAGIC = b'P65T'
+VERSION = 1
+HEADER = struct.Struct('<4sBB')
+
+
+class TraceError(Exception):
+    """generic trace exception"""
+
+
+class RingTrace():
+    """Keeps the last ``capacity`` instructions the core ran
+
+    Records are packed into a buffer allocated up front, so tracing for
+    hours takes no more memory than tracing for a frame. Set it as
+    ``core.tracer`` to start recording and back to None to stop.
+    """
+
+    def __init__(self, capacity=1 << 16):
+        self.capacity = capacity
+        self.buffer = bytearray(RECORD.size * capacity)
+        # how many instructions were recorded in total
+        self.count = 0
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def record(self, cycles, pc, opcode, operand, a, x, y, p, sp):
+        RECORD.pack_into(self.buffer, (self.count % self.capacity) * RECORD.size,
+                         cycles, pc, opcode, operand, a, x, y, p, sp)
+        self.count += 1
+
+    def records(self):
+        """the records in the buffer as tuples, oldest first"""
+        start = self.count % self.capacity if self.count > self.capacity else 0
+        for i in range(len(self)):
+            yield RECORD.unpack_from(self.buffer, ((start + i) % self.capacity) * RECORD.size)
+
+    def save(self, path):
+        """write the records in the buffer to a trace file"""
+        with open(path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, VERSION, RECORD.size))
+            start = (self.count % self.capacity) * RECORD.size if self.count > self.capacity else 0
+            f.write(self.buffer[start:len(self) * RECORD.size])
+            f.write(self.buffer[:start])
+
+
+class FileTrace():
+    """Streams every instruction the core runs to a trace file
+
+    Records are collected in a buffer of ``buffer_size`` bytes and written
+    out whenever it fills up, close() writes the rest.
+    """
+
+    def __init__(self, path, buffer_size=1 << 20):
+        self.file = open(path, 'wb')
+        self.file.write(HEADER.pack(MAGIC, VERSION, RECORD.size))
+        self.records_per_buffer = max(buffer_size // RECORD.size, 1)
+        self.buffer = bytearray(RECORD.size * self.records_per_buffer)
+        self.used = 0
+        self.count = 0
+
+    def record(self, cycles, pc, opcode, operand, a, x, y, p, sp):
+        RECORD.pack_into(self.buffer, self.used * RECORD.size, cycles, pc, opcode, operand, a, x, y, p, sp)
+        self.used += 1
+        self.count += 1
+        if self.used == self.records_per_buffer:
+            self.flush()
+
+    def flush(self):
+        self.file.write(self.buffer[:self.used * RECORD.size])
+        self.used = 0
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+
+def read_trace(path):
+    """generator yielding the records of a trace file as tuples"""
+    with open(path, 'rb') as f:
+        header = f.read(HEADER.size)
+        if len(header) != HEADER.size:
+            raise TraceError('%s is not a trace file' % path)
+        magic, version, size = HEADER.unpack(header)
+        if magic != MAGIC or version != VERSION or size != RECORD.size:
+            raise TraceError('%s is not a version %d trace file' % (path, VERSION))
+        while True:
+            block = f.read(RECORD.size * 4096)
+            for offset in range(0, len(block) - RECORD.size + 1, RECORD.size):
+                yield RECORD.unpack_from(block, offset)
+            if len(block) < RECORD.size * 4096:
+                break
+
+
+def disassemble(opcode, operand):
+    """the assembly text of an instruction, from its addressmode() format"""
+    instruction = instruction_map.get(opcode)
+    if instruction is None:
+        return '.db $%02X' % opcode
+    return instruction.addressmode(None).format(inst=instruction.instruction_name, arg=operand)
+
+
+def format_record(record):
+    cycles, pc, opcode, operand, a, x, y, p, sp = record
+    instruction = instruction_map.get(opcode)
+    size = instruction.num_bytes if instruction is not None else 1
+    raw = ' '.join('%02X' % byte for byte in ([opcode, operand & 0xFF, operand >> 8][:size]))
+    return '%04X  %-8s  %-14s A:%02X X:%02X Y:%02X P:%s SP:%02X CYC:%d' % (
+        pc, raw, disassemble(opcode, operand), a, x, y, format_status(p), sp, cycles)
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='record and print instruction traces of NSF songs')
+    commands = parser.add_subparsers(dest='command', required=True)
+    record = commands.add_parser('record', help='trace the INIT and PLAY calls of a song')
+    record.add_argument('nsf_file')
+    record.add_argument('output')
+    record.add_argument('song', nargs='?', type=int, default=None)
+    record.add_argument('-f', '--frames', type=int, default=60)
+    record.add_argument('--ring', type=int, default=None, metavar='N',
+                        help='only keep the last N instructions')
+    show = commands.add_parser('show', help='print a trace file as text')
+    show.add_argument('trace')
+    show.add_argument('-n', '--limit', type=int, default=None)
+    args = parser.parse_args()
+
+    if args.command == 'record':
+        from pynes.nsfplayer import NSFPlayer
+        player = NSFPlayer(args.nsf_file)
+        tracer = RingTrace(args.ring) if args.ring else FileTrace(args.output)
+        player.core.tracer = tracer
+        try:
+            player.init(args.song)
+            for frame in player.frames(args.frames):
+                pass
+        finally:
+            player.core.tracer = None
+            if args.ring:
+                tracer.save(args.output)
+            else:
+                tracer.close()
+        print('%d instructions traced' % tracer.count)
+    else:
+        for i, record in enumerate(read_trace(args.trace)):
+            if args.limit is not None and i >= args.limit:
+                break
+            print(format_record(record))
@@ -0,0 +1,93 @@
+from pynes.codegen import instruction_source, function_source, compile_function
+from pynes.instruction import READ, WRITE, MODIFY
+from pynes.decodecache import DecodeCache
+from pynes.instructions import instruction_map, illegal_opcode
+
+
+class BlockTranslator():
+    """Translates straight-line 6502 code into python functions
+
+    A block starts at the address the core jumps to and runs up to the first
+    branch, JMP, JSR, RTS, RTI or BRK. Its instructions are generated from the
+    same instruction code and addressmode expressions as the opcode handlers,
+    but with the operands and program counters as literals and the registers
+    held in locals for the whole block. The cycle counter is only brought up
+    to date before accesses that might hit I/O, so the APU still sees every
+    register write on the right cycle. Compiled blocks are kept in a
+    DecodeCache keyed by their start address, so stores into a block evict it,
+    and a block that evicted itself stops after the store, leaving the rest
+    of its code to be translated again from memory.
+    """
+    max_instructions = 64
+
+    def __init__(self):
+        self.cache = DecodeCache()
+
+    def decode(self, read, pc):
+        """returns a list of (address, instruction, operand) for the block at pc"""
+        block = []
+        addr = pc
+        while len(block) < self.max_instructions:
+            instruction = instruction_map.get(read(addr))
+            if instruction is None:
+                break
+            size = instruction.num_bytes
+            if size == 2:
+                operand = read((addr + 1) & 0xFFFF)
+            elif size == 3:
+                operand = read((addr + 1) & 0xFFFF) | read((addr + 2) & 0xFFFF) << 8
+            else:
+                operand = 0
+            block.append((addr, instruction, operand))
+            addr = (addr + size) & 0xFFFF
+            if instruction.is_branch:
+                break
+        return block
+
+    def block_source(self, name, block):
+        """returns the source of a function executing ``block``"""
+        lines = []
+        pending = 0
+        start = block[0][0]
+        for addr, instruction, operand in block:
+            lines.append('# $%04X %s' % (addr, instruction.__name__))
+            pending += instruction.cycles
+            if instruction.access in (READ, WRITE, MODIFY) and not instruction.zero_page:
+                # like the handlers, count the instruction before it runs
+                lines.append('cycles += %d' % pending)
+                lines.append('core.cycles = cycles')
+                pending = 0
+            if addr == block[-1][0]:
+                # the last instruction sees pc pointing past it and the cycles
+                # of the block counted, like a handler, which matters to
+                # branches skipping an idle loop
+                lines.append('pc = 0x%04X' % ((addr + instruction.num_bytes) & 0xFFFF))
+                if pending:
+                    lines.append('cycles += %d' % pending)
+                    pending = 0
+            lines.append(instruction_source(instruction, '0x%X' % operand))
+            if instruction.access in (WRITE, MODIFY) and not instruction.zero_page and addr != block[-1][0]:
+                # the store may have changed the code of this very block
+                lines.append('if 0x%04X not in blocks:' % start)
+                lines.append('    pc = 0x%04X' % ((addr + instruction.num_bytes) & 0xFFFF))
+                lines.append('    return')
+        if pending:
+            lines.append('cycles += %d' % pending)
+        return function_source(name, '\n'.join(lines), 'core')
+
+    def translate(self, read, pc):
+        """compile the block starting at pc and cache it, this is the miss path"""
+        self.cache.misses += 1
+        block = self.decode(read, pc)
+        name = 'block_%04X' % pc
+        if block:
+            last, instruction, _ = block[-1]
+            end = last + instruction.num_bytes
+            source = self.block_source(name, block)
+        else:
+            # the block starts with an illegal opcode, let its handler complain
+            end = pc + 1
+            source = 'def %s(core):\n    core.pc = 0x%04X\n    illegal_opcode(core, 0)\n' % (name, end & 0xFFFF)
+        func = compile_function(name, source, {'illegal_opcode': illegal_opcode, 'blocks': self.cache.entries})
+        self.cache.add(pc, func, end - pc)
+        return func
@@ -0,0 +1,49 @@
+import pytest
+
+from pynes import alu
+from pynes.core6502 import Core6502
+from pynes.corestatus import C, V
+
+
+def test_table_is_exhaustively_correct():
+    # ADC and SBC with both carries, and CMP
+    assert alu.verify() == 5 * 256 * 256
+
+
+@pytest.mark.parametrize('carry, a, b, result, flags', [
+    (0, 0x01, 0x01, 0x02, 0),
+    (1, 0x01, 0x01, 0x03, 0),
+    (0, 0xFF, 0x01, 0x00, C),
+    (1, 0xFF, 0x00, 0x00, C),
+    (0, 0x7F, 0x01, 0x80, V),
+    (0, 0x80, 0x80, 0x00, C | V),
+])
+def test_add(carry, a, b, result, flags):
+    core = Core6502()
+    core.p = carry
+    assert core.add(a, b) == result
+    assert core.p & (C | V) == flags
+
+
+@pytest.mark.parametrize('carry, a, b, result, flags', [
+    (1, 0x05, 0x03, 0x02, C),
+    (0, 0x05, 0x03, 0x01, C),
+    (1, 0x03, 0x05, 0xFE, 0),
+    (0, 0x00, 0x00, 0xFF, 0),
+    (1, 0x80, 0x01, 0x7F, C | V),
+])
+def test_sub(carry, a, b, result, flags):
+    core = Core6502()
+    core.p = carry
+    assert core.sub(a, b) == result
+    assert core.p & (C | V) == flags
+
+
+def test_without_overflow_v_is_left_alone():
+    core = Core6502()
+    core.p = V
+    assert core.add(0x01, 0x01, update_overflow=False) == 0x02
+    assert core.p == V
+    core.p = 0
+    core.add(0x7F, 0x01, update_overflow=False)
+    assert core.p == 0
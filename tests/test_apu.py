@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+
+from pynes.apu import APU, APUError
+from pynes.nsfplayer import NSFPlayer
+from tests.util import make_tone_nsf
+
+
+@pytest.mark.parametrize('dmc', [False, True])
+def test_snapshot_restores_the_same_audio(tmp_path, dmc):
+    path = make_tone_nsf(tmp_path / 'tone.nsf', dmc)
+    player = NSFPlayer(path, sample_rate=44100)
+    player.init()
+    for frame in player.frames(30):
+        pass
+    snapshot = player.snapshot()
+    first = np.concatenate([player.play_frame() for i in range(60)])
+
+    other = NSFPlayer(path, sample_rate=44100)
+    other.restore(snapshot)
+    second = np.concatenate([other.play_frame() for i in range(60)])
+    assert np.array_equal(first, second)
+    assert other.snapshot() == player.snapshot()
+    if dmc:
+        assert other.core.apu.dmc.bits == player.core.apu.dmc.bits
+        assert other.core.apu.dmc.remaining
+
+
+def test_restore_rejects_other_data():
+    apu = APU(1789772.7272)
+    with pytest.raises(APUError):
+        apu.restore(b'\x80\x05junk')
+    with pytest.raises(APUError):
+        apu.restore(apu.snapshot()[:-1])
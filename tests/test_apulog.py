@@ -0,0 +1,38 @@
+from pynes.apulog import RegisterLog
+from pynes.nsfplayer import NSFPlayer
+from tests.util import make_nsf
+
+# INIT: LDA #$3F; STA $9000; LDA #$01; STA $4000; RTS
+WRITES = [0xA9, 0x3F, 0x8D, 0x00, 0x90, 0xA9, 0x01, 0x8D, 0x00, 0x40, 0x60]
+
+
+def logged(player):
+    log = player.core.apu
+    return [(register, value) for register, value in zip(log.registers, log.values) if register >= 0x4018]
+
+
+def test_vrc6_writes_are_logged(tmp_path):
+    player = NSFPlayer(make_nsf(tmp_path / 'vrc6.nsf', WRITES, chips=0x01), register_log=True)
+    player.init()
+    assert logged(player) == [(0x9000, 0x3F)]
+    log = player.core.apu
+    assert (0x4000, 0x01) in zip(log.registers, log.values)
+
+
+def test_expansion_writes_need_the_chip(tmp_path):
+    player = NSFPlayer(make_nsf(tmp_path / 'plain.nsf', WRITES), register_log=True)
+    player.init()
+    assert logged(player) == []
+
+
+def test_save_and_load(tmp_path):
+    player = NSFPlayer(make_nsf(tmp_path / 'vrc6.nsf', WRITES, chips=0x01), register_log=True)
+    player.init()
+    for frame in player.frames(3):
+        pass
+    log = player.core.apu
+    log.save(str(tmp_path / 'song.log'))
+    loaded = RegisterLog.load(str(tmp_path / 'song.log'))
+    assert loaded.clock == log.clock
+    for name in ('cycles', 'registers', 'values', 'frames'):
+        assert getattr(loaded, name) == getattr(log, name)
@@ -0,0 +1,60 @@
+import pytest
+
+from pynes.core6502 import Core6502
+from pynes.nsfplayer import NSFPlayer
+from tests.util import make_nsf
+
+CORE_MODES = [{}, {'decode_cache': True}, {'translate': True}]
+
+
+def banked_nsf(path):
+    """three 4KB banks: bank 0 and 1 hold a routine at $8000 storing to $00
+    and $01, bank 2 is mapped at $9000 and calls it in both banks"""
+    data = bytearray(0x3000)
+    data[0x0000:0x0005] = bytes([0xA9, 0x11, 0x85, 0x00, 0x60])      # LDA #$11; STA $00; RTS
+    data[0x1000:0x1005] = bytes([0xA9, 0x22, 0x85, 0x01, 0x60])      # LDA #$22; STA $01; RTS
+    data[0x2000:0x200C] = bytes([0x20, 0x00, 0x80,                   # JSR $8000
+                                 0xA9, 0x01, 0x8D, 0xF8, 0x5F,       # LDA #$01; STA $5FF8
+                                 0x20, 0x00, 0x80,                   # JSR $8000
+                                 0x60])                              # RTS
+    return make_nsf(path, data, init=0x9000, play=0x9000 + 0x0B, bankswitch=[0, 2, 0, 0, 0, 0, 0, 0])
+
+
+@pytest.mark.parametrize('kwargs', CORE_MODES)
+def test_switch_runs_the_new_bank(tmp_path, kwargs):
+    player = NSFPlayer(banked_nsf(tmp_path / 'banked.nsf'), core=Core6502(**kwargs))
+    player.init()
+    core = player.core
+    assert core.memory.data[0:2] == bytes([0x11, 0x22])
+    assert core.bankswitcher.registers[:2] == bytes([1, 2])
+    assert core.read(0x8001) == 0x22
+
+    # INIT again maps the header banks back
+    core.memory.data[0:2] = bytes(2)
+    player.init()
+    assert core.memory.data[0:2] == bytes([0x11, 0x22])
+
+
+def test_banks_are_views_of_the_file(tmp_path):
+    core = Core6502()
+    core.load(banked_nsf(tmp_path / 'banked.nsf'))
+    switcher = core.bankswitcher
+    assert len(switcher.banks) == 3
+    switcher.switch(0, 2)
+    assert core.read(0x8000) == 0x20
+    switcher.switch(3, 1)
+    assert core.read(0xB001) == 0x22
+    # the ROM can't be written
+    core.write(0xB001, 0x00)
+    assert core.read(0xB001) == 0x22
+
+
+def test_switch_into_a_frame_without_cached_code_evicts_nothing(tmp_path):
+    player = NSFPlayer(banked_nsf(tmp_path / 'banked.nsf'), core=Core6502(decode_cache=True))
+    player.init()
+    cache = player.core.decode_cache
+    entries = dict(cache.entries)
+    player.core.bankswitcher.switch(5, 1)
+    assert cache.entries == entries
+    player.core.bankswitcher.switch(0, 2)
+    assert not any(0x8000 <= pc < 0x9000 for pc in cache.entries)
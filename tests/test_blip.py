@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from pynes.blip import BlipBuffer, Resampler, resample, step_kernel
+
+
+def crossing(samples, level=0.5):
+    """the fractional position where ``samples`` first rise past ``level``"""
+    i = int(np.argmax(samples > level))
+    return i - 1 + (level - samples[i - 1]) / (samples[i] - samples[i - 1])
+
+
+def test_kernel_rows_are_whole_steps():
+    kernel = step_kernel(BlipBuffer.WIDTH, BlipBuffer.PHASES, BlipBuffer.CUTOFF)
+    assert kernel.shape == (BlipBuffer.PHASES, BlipBuffer.WIDTH)
+    assert np.allclose(kernel.sum(axis=1), 1.0)
+
+
+@pytest.mark.parametrize('time', [10.0, 10.25, 10.5, 10.75, 11.0])
+def test_step_lands_on_its_fractional_position(time):
+    # one clock per output sample, so times are output positions
+    blip = BlipBuffer(1000, 1000)
+    blip.add_steps([time], [1.0])
+    samples = blip.end_frame(64)
+    assert samples[-1] == pytest.approx(1.0)
+    # the output lags by WIDTH / 2, the rest is the error of reading the
+    # crossing off a straight line between two samples
+    assert crossing(samples) == pytest.approx(time + BlipBuffer.WIDTH / 2, abs=0.1)
+
+
+def test_steps_carry_over_frames():
+    blip = BlipBuffer(1789772.7272, 44100)
+    whole = BlipBuffer(1789772.7272, 44100)
+    times = np.arange(0, 60000, 997)
+    deltas = np.where(np.arange(len(times)) % 2, -0.5, 0.5)
+    whole.add_steps(times, deltas)
+    expected = whole.end_frame(60000)
+    first = times < 30000
+    blip.add_steps(times[first], deltas[first])
+    out = [blip.end_frame(30000)]
+    blip.add_steps(times[~first] - 30000, deltas[~first])
+    out.append(blip.end_frame(30000))
+    assert np.allclose(np.concatenate(out), expected)
+
+
+@pytest.mark.parametrize('in_rate, out_rate', [(48000, 44100), (44100, 48000), (96000, 48000)])
+def test_streaming_matches_one_shot(in_rate, out_rate):
+    signal = np.random.RandomState(1).uniform(-1, 1, 20000)
+    expected = resample(signal, in_rate, out_rate)
+    resampler = Resampler(in_rate, out_rate)
+    chunks = []
+    position = 0
+    for size in [1, 7, 500, 1234, 3, 8000] * 3:
+        chunks.append(resampler.process(signal[position:position + size]))
+        position += size
+    chunks.append(resampler.process(signal[position:]))
+    assert np.allclose(np.concatenate(chunks), expected)
+
+
+def test_resampled_tone_keeps_its_frequency():
+    in_rate, out_rate = 48000, 44100
+    tone = np.sin(2 * np.pi * 1000 * np.arange(48000) / in_rate)
+    out = resample(tone, in_rate, out_rate)
+    assert abs(len(out) - out_rate) <= 32
+    spectrum = np.abs(np.fft.rfft(out[1000:1000 + out_rate // 2]))
+    assert np.argmax(spectrum) * out_rate / (out_rate // 2) == pytest.approx(1000, abs=4)
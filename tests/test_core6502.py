@@ -0,0 +1,66 @@
+import pytest
+
+from pynes.core6502 import Core6502
+from pynes.corestatus import B, C, U
+
+CORE_MODES = [{}, {'decode_cache': True}, {'translate': True}]
+
+
+def cycles_of(program, kwargs, x=0):
+    """the cycles ``program`` at $8000 takes. It is followed by a JMP out,
+    translated code only stops at the end of a block."""
+    core = Core6502(**kwargs)
+    core.memory.map_rom(0x8000, bytes(program) + bytes([0x4C, 0x00, 0x90]))
+    core.pc = 0x8000
+    core._x = x
+    assert core.run_until(0x9000, 100)
+    return core.cycles - 3
+
+
+@pytest.mark.parametrize('kwargs', CORE_MODES)
+def test_indexed_read_crossing_a_page(kwargs):
+    # LDA $02F0,X
+    assert cycles_of([0xBD, 0xF0, 0x02], kwargs, x=0x0F) == 4
+    assert cycles_of([0xBD, 0xF0, 0x02], kwargs, x=0x10) == 5
+
+
+@pytest.mark.parametrize('kwargs', CORE_MODES)
+def test_indexed_write_always_takes_the_penalty(kwargs):
+    # STA $02F0,X
+    assert cycles_of([0x9D, 0xF0, 0x02], kwargs, x=0x0F) == 5
+    assert cycles_of([0x9D, 0xF0, 0x02], kwargs, x=0x10) == 5
+
+
+@pytest.mark.parametrize('kwargs', CORE_MODES)
+def test_branch_penalties(kwargs):
+    # LDA #$01; BNE +0, taken
+    assert cycles_of([0xA9, 0x01, 0xD0, 0x00], kwargs) == 5
+    # LDA #$00; BNE +0, not taken
+    assert cycles_of([0xA9, 0x00, 0xD0, 0x00], kwargs) == 4
+
+
+@pytest.mark.parametrize('kwargs', CORE_MODES)
+def test_php_sets_b_and_plp_clears_it(kwargs):
+    # SEC; PHP; LDA #$FF; PHA; PLP
+    core = Core6502(**kwargs)
+    core.memory.map_rom(0x8000, bytes([0x38, 0x08, 0xA9, 0xFF, 0x48, 0x28, 0x4C, 0x00, 0x90]))
+    core.pc = 0x8000
+    assert core.run_until(0x9000, 100)
+    assert core.ram[0x1FD] == B | U | C
+    assert core.p == 0xFF & ~(B | U)
+
+
+@pytest.mark.parametrize('kwargs', CORE_MODES)
+@pytest.mark.parametrize('program', [
+    [0xA9, 0x01, 0x85, 0x00, 0x4C, 0x04, 0x80],    # LDA #$01; STA $00; JMP *
+    [0xA9, 0x01, 0x85, 0x00, 0xD0, 0xFE],          # LDA #$01; STA $00; BNE *
+])
+def test_idle_loop_skips_to_the_end_of_the_budget(kwargs, program):
+    core = Core6502(**kwargs)
+    core.memory.map_rom(0x8000, bytes(program))
+    core.pc = 0x8000
+    assert not core.run_until(0x9000, 1000)
+    assert core.cycles == 1000
+    assert core.idled
+    assert core.ram[0] == 1
+
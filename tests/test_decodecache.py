@@ -0,0 +1,35 @@
+import pytest
+
+from pynes.core6502 import Core6502
+
+CACHE_MODES = [{'decode_cache': True}, {'translate': True}]
+
+# LDA #$01; STA $00; JMP $9000
+PROGRAM = [0xA9, 0x01, 0x85, 0x00, 0x4C, 0x00, 0x90]
+
+
+@pytest.mark.parametrize('kwargs', CACHE_MODES)
+@pytest.mark.parametrize('run_at, patch_at', [(0x0200, 0x0A01), (0x0A00, 0x0201), (0x1200, 0x1A01)])
+def test_store_to_a_ram_mirror_evicts_the_code(kwargs, run_at, patch_at):
+    core = Core6502(**kwargs)
+    core.memory.data[0x0200:0x0200 + len(PROGRAM)] = bytes(PROGRAM)
+    core.pc = run_at
+    assert core.run_until(0x9000, 100)
+    assert core.ram[0] == 1
+
+    core.write(patch_at, 0x02)
+    core.pc = run_at
+    assert core.run_until(0x9000, 100)
+    assert core.ram[0] == 2
+
+
+@pytest.mark.parametrize('kwargs', CACHE_MODES)
+def test_code_patching_itself_through_a_mirror(kwargs):
+    # LDA #$01; STA $00; INC $0A01; JMP $9000
+    code = [0xA9, 0x01, 0x85, 0x00, 0xEE, 0x01, 0x0A, 0x4C, 0x00, 0x90]
+    core = Core6502(**kwargs)
+    core.memory.data[0x0200:0x0200 + len(code)] = bytes(code)
+    for value in (1, 2, 3):
+        core.pc = 0x0200
+        assert core.run_until(0x9000, 100)
+        assert core.ram[0] == value
@@ -0,0 +1,57 @@
+import pytest
+
+from pynes.core6502 import Core6502
+from pynes.disasm import DATA, OPCODE, OPERAND, Disassembler
+from pynes.nsfplayer import NSFPlayer
+from tests.util import make_nsf
+
+CODE = [
+    0xA2, 0x03,             # $8000 init: LDX #$03
+    0xCA,                   # $8002 DEX
+    0xD0, 0xFD,             # $8003 BNE $8002
+    0x20, 0x0A, 0x80,       # $8005 JSR $800A
+    0x60,                   # $8008 RTS
+    0xFF,                   # $8009 data
+    0xA9, 0x01,             # $800A LDA #$01
+    0x85, 0x00,             # $800C STA $00
+    0x60,                   # $800E RTS
+    0x20, 0x0A, 0x80,       # $800F play: JSR $800A
+    0x60,                   # $8012 RTS
+]
+
+
+@pytest.fixture
+def nsf_path(tmp_path):
+    return make_nsf(tmp_path / 'code.nsf', CODE, init=0x8000, play=0x800F)
+
+
+def test_follows_branches_and_calls(nsf_path):
+    disassembler = Disassembler(nsf_path)
+    assert disassembler.block_starts == {0x8000, 0x8002, 0x8005, 0x8008, 0x800A, 0x800F, 0x8012}
+    assert disassembler.labels == {0x8000: 'init', 0x800F: 'play', 0x8002: 'L8002', 0x800A: 'sub_800A'}
+    code_map = disassembler.code_map
+    assert code_map[0x8009] == DATA
+    assert (code_map[0x8005], code_map[0x8006], code_map[0x8007]) == (OPCODE, OPERAND, OPERAND)
+    assert disassembler.code_bytes() == len(CODE) - 1
+
+
+def test_listing(nsf_path):
+    listing = Disassembler(nsf_path).listing()
+    assert 'sub_800A:' in listing
+    assert '8005  20 0A 80  JSR sub_800A' in listing
+    assert '8009            .db $FF' in listing
+
+
+@pytest.mark.parametrize('kwargs', [{'decode_cache': True}, {'translate': True}])
+def test_block_starts_feed_precompile(nsf_path, kwargs):
+    player = NSFPlayer(nsf_path, core=Core6502(**kwargs), precompile=True)
+    player.init()
+    for frame in player.frames(3):
+        pass
+    assert player.block_starts == sorted(Disassembler(nsf_path).block_starts)
+    cache = player.core.code_caches()[0]
+    # everything INIT and PLAY ran was compiled before INIT
+    assert cache.misses == 0
+    assert cache.hits
+    if player.core.translator is not None:
+        assert set(player.block_starts) <= set(cache.entries)
@@ -0,0 +1,31 @@
+import time
+
+from pynes.batch import render_job
+from pynes.loopdetect import find_loop
+from tests.util import make_nsf
+
+# INIT: RTS, PLAY: INC $00; RTS
+LOOPING = [0x60, 0xE6, 0x00, 0x60]
+# INIT: RTS, PLAY: a 24-bit counter at $00-$02
+COUNTING = [0x60, 0xE6, 0x00, 0xD0, 0x06, 0xE6, 0x01, 0xD0, 0x02, 0xE6, 0x02, 0x60]
+
+
+def test_find_loop(tmp_path):
+    path = make_nsf(tmp_path / 'loop.nsf', LOOPING, init=0x8000, play=0x8001)
+    loop_start, loop_length, frame_rate = find_loop(path)
+    assert loop_length == 256
+
+
+def test_find_loop_gives_up_at_the_deadline(tmp_path):
+    path = make_nsf(tmp_path / 'count.nsf', COUNTING, init=0x8000, play=0x8001)
+    start = time.time()
+    assert find_loop(path, deadline=start + 0.2) is None
+    assert time.time() - start < 5
+
+
+def test_batch_timeout_covers_loop_detection(tmp_path):
+    path = make_nsf(tmp_path / 'count.nsf', COUNTING, init=0x8000, play=0x8001)
+    output = str(tmp_path / 'out' / 'count-01.wav')
+    entry = render_job(path, 1, output, 10.0, 8000, 0.5, loops=2)
+    assert entry['status'] == 'timeout'
+    assert entry['elapsed'] < 5
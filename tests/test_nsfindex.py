@@ -0,0 +1,15 @@
+from pynes.nsfindex import NSFIndex
+from tests.util import make_nsf
+
+
+def test_region_and_chips_are_indexed(tmp_path):
+    make_nsf(tmp_path / 'pal.nsf', region=1, chips=0x01)
+    make_nsf(tmp_path / 'ntsc.nsf')
+    index = NSFIndex(str(tmp_path / 'index.db'))
+    assert index.update([str(tmp_path)], workers=1)['added'] == 2
+
+    row = index.get(str(tmp_path / 'pal.nsf'))
+    assert (row['region'], row['chips']) == ('pal', 'vrcvi')
+    assert [row['path'] for row in index.search(region='pal')] == [str(tmp_path / 'pal.nsf')]
+    assert [row['path'] for row in index.search(chip='vrcvi')] == [str(tmp_path / 'pal.nsf')]
+    index.close()
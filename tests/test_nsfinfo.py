@@ -0,0 +1,31 @@
+import pytest
+
+from pynes.nsfinfo import NSFFile, NSFFileError
+from tests.util import make_nsf
+
+
+@pytest.mark.parametrize('bits, tune_type', [(0, 'ntsc'), (1, 'pal'), (2, 'both'), (3, 'both')])
+def test_region(tmp_path, bits, tune_type):
+    nsf = NSFFile(make_nsf(tmp_path / 'a.nsf', region=bits))
+    assert nsf.tune_type == tune_type
+
+
+@pytest.mark.parametrize('index', range(6))
+def test_each_sound_chip(tmp_path, index):
+    nsf = NSFFile(make_nsf(tmp_path / 'a.nsf', chips=1 << index))
+    assert nsf.extra_sound_chips == [NSFFile.SOUND_CHIPS[index]]
+
+
+def test_header_fields(tmp_path):
+    nsf = NSFFile(make_nsf(tmp_path / 'a.nsf', load=0x8010, init=0x8020, play=0x8030, songs=5, chips=0x21))
+    assert (nsf.load_address, nsf.init_address, nsf.play_address) == (0x8010, 0x8020, 0x8030)
+    assert nsf.total_songs == 5
+    assert nsf.song_name == 'test'
+    assert nsf.extra_sound_chips == [NSFFile.SC_VRCVI, NSFFile.SC_SUNSOFT_FME_07]
+
+
+def test_short_header(tmp_path):
+    path = tmp_path / 'short.nsf'
+    path.write_bytes(b'NESM\x1A')
+    with pytest.raises(NSFFileError):
+        NSFFile(str(path))
@@ -0,0 +1,87 @@
+import pytest
+
+from pynes.core6502 import Core6502
+from pynes.nsfinfo import NSFFile
+from pynes.nsfplayer import NSFPlayer
+from tests.util import make_nsf
+
+# INIT: STA $00; STX $01; RTS
+STORE_AX = [0x85, 0x00, 0x86, 0x01, 0x60]
+
+CORE_MODES = [{}, {'decode_cache': True}, {'translate': True}]
+
+
+def test_pal_header(tmp_path):
+    player = NSFPlayer(make_nsf(tmp_path / 'pal.nsf', STORE_AX, songs=3, region=1))
+    assert player.region == NSFFile.TYPE_PAL
+    assert player.frame_rate == 1000000.0 / 19997
+    player.init(2)
+    assert player.core.memory.data[0:2] == bytes([1, 1])
+
+
+def test_ntsc_header(tmp_path):
+    player = NSFPlayer(make_nsf(tmp_path / 'ntsc.nsf', STORE_AX))
+    assert player.region == NSFFile.TYPE_NTSC
+    player.init()
+    assert player.core.memory.data[0:2] == bytes([0, 0])
+
+
+def test_dual_header_plays_ntsc_unless_asked(tmp_path):
+    path = make_nsf(tmp_path / 'both.nsf', STORE_AX, region=2)
+    assert NSFPlayer(path).region == NSFFile.TYPE_NTSC
+    player = NSFPlayer(path, NSFFile.TYPE_PAL)
+    player.init()
+    assert player.core.memory.data[1] == 1
+
+
+@pytest.mark.parametrize('sample_rate', [None, 44100])
+@pytest.mark.parametrize('kwargs', CORE_MODES)
+def test_init_parked_in_jmp_counts_as_returned(tmp_path, kwargs, sample_rate):
+    # INIT: STA $00; JMP *, PLAY: RTS
+    code = [0x85, 0x00, 0x4C, 0x02, 0x80, 0x60]
+    player = NSFPlayer(make_nsf(tmp_path / 'a.nsf', code, play=0x8005, songs=2), core=Core6502(**kwargs),
+                       sample_rate=sample_rate)
+    player.init(2)
+    core = player.core
+    assert core.memory.data[0] == 1
+    assert core.sp == 0xFD
+    # INIT is over at the end of the frame it parked in
+    assert isinstance(core.cycles, int)
+    assert core.cycles == int(player.cycles_per_frame)
+
+    snapshot = player.snapshot()
+    audio = player.play_frame()
+    if sample_rate:
+        assert len(audio) > 700
+    player.restore(snapshot)
+    assert player.frame == 0 and core.cycles == int(player.cycles_per_frame)
+
+
+@pytest.mark.parametrize('kwargs', CORE_MODES)
+def test_play_parked_in_jmp_is_called_every_frame(tmp_path, kwargs):
+    # INIT: RTS, PLAY: INC $01; JMP *
+    code = [0x60, 0xE6, 0x01, 0x4C, 0x03, 0x80]
+    player = NSFPlayer(make_nsf(tmp_path / 'a.nsf', code, init=0x8000, play=0x8001), core=Core6502(**kwargs))
+    player.init()
+    for frame in player.frames(5):
+        assert not player.playing
+        assert player.core.sp == 0xFD
+    assert player.core.memory.data[1] == 5
+
+
+def test_restore_does_not_run_init(tmp_path):
+    # INIT: BEQ to an illegal opcode for song 1, STA $00; RTS otherwise. PLAY: INC $01; RTS
+    code = [0xC9, 0x00, 0xF0, 0x03, 0x85, 0x00, 0x60, 0x02, 0xE6, 0x01, 0x60]
+    path = make_nsf(tmp_path / 'a.nsf', code, play=0x8008, songs=2)
+    player = NSFPlayer(path, sample_rate=44100)
+    player.init(2)
+    for frame in player.frames(10):
+        pass
+    snapshot = player.snapshot()
+    audio = player.play_frame()
+
+    other = NSFPlayer(path, sample_rate=44100)
+    other.restore(snapshot)
+    assert (other.song, other.frame) == (2, 10)
+    assert other.core.memory.data[0:2] == bytes([1, 10])
+    assert (other.play_frame() == audio).all()
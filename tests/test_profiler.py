@@ -0,0 +1,73 @@
+import json
+
+import pytest
+
+from pynes.core6502 import Core6502
+from pynes.nsfplayer import NSFPlayer
+from pynes.profiler import Profiler
+from tests.util import make_nsf
+
+# INIT: RTS, PLAY: LDX #$03; DEX; BNE -3; RTS
+CODE = [0x60, 0xA2, 0x03, 0xCA, 0xD0, 0xFD, 0x60]
+
+
+def profiled_player(path, every=1, **kwargs):
+    player = NSFPlayer(make_nsf(path, CODE, init=0x8000, play=0x8001), core=Core6502(**kwargs))
+    profiler = player.core.profiler = Profiler(every)
+    player.init()
+    for frame in player.frames(4):
+        pass
+    return player, profiler
+
+
+@pytest.mark.parametrize('kwargs', [{}, {'translate': True}])
+def test_counts_opcodes_and_addresses(tmp_path, kwargs):
+    player, profiler = profiled_player(tmp_path / 'a.nsf', **kwargs)
+    # INIT runs one RTS, each PLAY call LDX, 3 DEX, 3 BNE and RTS
+    assert profiler.instructions() == 1 + 4 * 8
+    assert profiler.opcodes[0xCA] == profiler.opcodes[0xD0] == 12
+    assert profiler.top_opcodes(2) == [(0xD0, 12), (0xCA, 12)]
+    assert profiler.pcs[0x8003] == 12
+    assert profiler.top_pcs(1) == [(0x8004, 12)]
+
+
+def test_frame_cycles(tmp_path):
+    player, profiler = profiled_player(tmp_path / 'a.nsf')
+    # LDX 2, DEX 2 * 3, BNE 3 + 3 + 2, RTS 6
+    assert list(profiler.frame_cycles) == [22] * 4
+    assert profiler.worst_frame() == (0, 22)
+    assert profiler.overruns == 0
+
+
+def test_sampling(tmp_path):
+    player, profiler = profiled_player(tmp_path / 'a.nsf', every=2)
+    # one INIT call and four PLAY calls, every other one counted
+    assert (profiler.calls, profiler.sampled) == (5, 2)
+    assert profiler.instructions() == 2 * 8
+    assert len(profiler.frame_cycles) == 4
+
+
+def test_json(tmp_path):
+    player, profiler = profiled_player(tmp_path / 'a.nsf')
+    profiler.save(str(tmp_path / 'profile.json'), budget=29780)
+    with open(str(tmp_path / 'profile.json')) as f:
+        stats = json.load(f)
+    assert stats['instructions'] == 33
+    assert (stats['calls'], stats['sampled_calls']) == (5, 5)
+    assert stats['opcodes']['CA'] == 12
+    assert stats['pcs']['8003'] == 12
+    assert stats['frames'] == 4
+    assert stats['frame_cycles'] == [22] * 4
+    assert stats['mean_frame_cycles'] == 22.0
+    assert (stats['worst_frame'], stats['worst_frame_cycles']) == (0, 22)
+    assert stats['overruns'] == 0
+    assert stats['frame_budget'] == 29780
+    assert stats['worst_frame_load'] == pytest.approx(22 / 29780.0)
+
+
+def test_report(tmp_path):
+    player, profiler = profiled_player(tmp_path / 'a.nsf')
+    report = profiler.report(top=3, budget=29780, read=player.core.read)
+    assert report.splitlines()[0] == '33 instructions in 5 of 5 run calls'
+    assert '$CA   DEXImplied' in report
+    assert '$8003  DEX' in report
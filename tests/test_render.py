@@ -0,0 +1,78 @@
+import io
+import os
+import wave
+
+import numpy as np
+import pytest
+
+from pynes.render import render, render_file, write_wav
+from tests.util import make_nsf, make_tone_nsf
+
+RATE = 8000
+
+
+def pcm(chunks):
+    return np.frombuffer(b''.join(chunks), dtype='<i2')
+
+
+def test_exact_length_in_chunks(tmp_path):
+    path = make_tone_nsf(tmp_path / 'tone.nsf')
+    chunks = list(render(path, seconds=1.3, sample_rate=RATE, chunk_frames=10))
+    assert len(pcm(chunks)) == int(1.3 * RATE)
+    # ten frames of about 133 samples, the last chunk is cut short
+    assert all(1320 <= len(chunk) // 2 <= 1340 for chunk in chunks[:-1])
+    assert pcm(chunks).std() > 0
+
+
+def test_start_skips_into_the_song(tmp_path):
+    path = make_tone_nsf(tmp_path / 'tone.nsf')
+    whole = pcm(render(path, seconds=2.0, sample_rate=RATE))
+    later = pcm(render(path, seconds=1.0, sample_rate=RATE, start=0.75))
+    assert np.array_equal(later, whole[6000:14000])
+
+
+def test_wav_to_a_pipe(tmp_path):
+    path = make_tone_nsf(tmp_path / 'tone.nsf')
+    read_fd, write_fd = os.pipe()
+    # half a second at 8kHz fits in the pipe buffer, no reader thread needed
+    with os.fdopen(write_fd, 'wb') as out:
+        assert not out.seekable()
+        written = write_wav(out, render(path, seconds=0.5, sample_rate=RATE), RATE, int(0.5 * RATE))
+    with os.fdopen(read_fd, 'rb') as f:
+        data = f.read()
+    assert written == 4000
+    w = wave.open(io.BytesIO(data))
+    assert (w.getnchannels(), w.getsampwidth(), w.getframerate(), w.getnframes()) == (1, 2, RATE, 4000)
+    assert np.array_equal(np.frombuffer(w.readframes(4000), dtype='<i2'),
+                          pcm(render(path, seconds=0.5, sample_rate=RATE)))
+
+
+def test_raw_and_wav_files_hold_the_same_samples(tmp_path):
+    path = make_tone_nsf(tmp_path / 'tone.nsf')
+    render_file(path, str(tmp_path / 'out.wav'), seconds=0.5, sample_rate=RATE)
+    render_file(path, str(tmp_path / 'out.raw'), seconds=0.5, sample_rate=RATE, format='raw')
+    with wave.open(str(tmp_path / 'out.wav')) as w:
+        frames = w.readframes(w.getnframes())
+    assert frames == (tmp_path / 'out.raw').read_bytes()
+
+
+def test_fade_ends_silent(tmp_path):
+    path = make_tone_nsf(tmp_path / 'tone.nsf')
+    samples = pcm(render(path, seconds=1.0, sample_rate=RATE, fade=0.5))
+    # the gain falls to 0 over the last 4000 samples
+    left = np.arange(4000, 0, -1)
+    assert (np.abs(samples[-4000:].astype(int)) <= 32767 * left / 4000 + 1).all()
+    assert np.abs(samples[:4000]).max() > 1000
+
+
+def test_silence_ends_the_render(tmp_path):
+    # INIT and PLAY do nothing, so the output never changes
+    path = make_nsf(tmp_path / 'quiet.nsf', [0x60])
+    samples = pcm(render(path, seconds=60.0, sample_rate=RATE, silence=1.0))
+    assert RATE <= len(samples) < 3 * RATE
+
+
+def test_silence_needs_a_file_for_wav(tmp_path):
+    path = make_tone_nsf(tmp_path / 'tone.nsf')
+    with pytest.raises(ValueError):
+        render_file(path, '-', seconds=1.0, silence=1.0)
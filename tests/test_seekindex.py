@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+from pynes.nsfplayer import NSFPlayer
+from pynes.render import render
+from pynes.seekindex import SeekIndex, SeekIndexError
+from tests.util import make_tone_nsf
+
+RATE = 8000
+
+
+def pcm(chunks):
+    return np.frombuffer(b''.join(chunks), dtype='<i2')
+
+
+@pytest.mark.parametrize('dmc', [False, True])
+def test_seeked_render_matches_the_full_render(tmp_path, dmc):
+    path = make_tone_nsf(tmp_path / 'tone.nsf', dmc)
+    whole = pcm(render(path, seconds=4.0, sample_rate=RATE))
+
+    index = SeekIndex(path, RATE, interval=60)
+    # frames 0, 60, ... 240, four seconds is a little over 240 frames
+    assert index.build(seconds=4.0) == 5
+    index.save()
+    index = SeekIndex(path, RATE, interval=60)
+    assert len(index) == 5
+
+    for start in (0.0, 1.0, 2.01, 2.5):
+        skip = int(start * RATE)
+        seeked = pcm(render(path, seconds=1.5, sample_rate=RATE, start=start, seek_index=index))
+        assert np.array_equal(seeked, whole[skip:skip + len(seeked)])
+        assert len(seeked) == int(1.5 * RATE)
+
+
+def test_seek_restores_the_nearest_checkpoint(tmp_path):
+    path = make_tone_nsf(tmp_path / 'tone.nsf')
+    index = SeekIndex(path, RATE, interval=60)
+    index.build(seconds=3.0)
+    player = NSFPlayer(path, sample_rate=RATE)
+    sample, frame, snapshot = index.nearest(1, 2 * RATE + 10)
+    assert frame == 120
+    assert index.seek(player, 1, 2 * RATE + 10) == sample
+    assert player.frame == 120
+
+
+def test_index_for_other_settings_is_stale(tmp_path):
+    path = make_tone_nsf(tmp_path / 'tone.nsf')
+    index = SeekIndex(path, RATE, interval=60)
+    index.build(seconds=2.0)
+    index.save()
+    assert len(SeekIndex(path, 44100, interval=60)) == 0
+    assert len(SeekIndex(path, RATE, interval=30)) == 0
+    with pytest.raises(SeekIndexError):
+        index.seek(NSFPlayer(path, sample_rate=44100), 1, 0)
+
+
+def test_truncated_index(tmp_path):
+    path = make_tone_nsf(tmp_path / 'tone.nsf')
+    index = SeekIndex(path, RATE, interval=60)
+    index.build(seconds=2.0)
+    index.save()
+    with open(index.path, 'r+b') as f:
+        f.truncate(100)
+    with pytest.raises(SeekIndexError):
+        SeekIndex(path, RATE, interval=60)
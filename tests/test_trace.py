@@ -0,0 +1,58 @@
+import pytest
+
+from pynes.core6502 import Core6502
+from pynes.nsfplayer import NSFPlayer
+from pynes.trace import RECORD, FileTrace, RingTrace, TraceError, format_record, read_trace
+from tests.util import make_nsf
+
+# INIT: LDX #$03; DEX; BNE -3; RTS
+LOOP = [0xA2, 0x03, 0xCA, 0xD0, 0xFD, 0x60]
+
+
+def record(i):
+    return (i * 7, 0x8000 + i, i & 0xFF, i * 3 & 0xFFFF, 1, 2, 3, 0x24, 0xFD)
+
+
+def test_ring_keeps_the_last_records():
+    ring = RingTrace(4)
+    for i in range(10):
+        ring.record(*record(i))
+    assert (ring.count, len(ring)) == (10, 4)
+    assert list(ring.records()) == [record(i) for i in range(6, 10)]
+
+
+@pytest.mark.parametrize('count', [0, 3, 4, 9])
+def test_ring_save_unwraps(tmp_path, count):
+    ring = RingTrace(4)
+    for i in range(count):
+        ring.record(*record(i))
+    ring.save(str(tmp_path / 'ring.trace'))
+    assert list(read_trace(str(tmp_path / 'ring.trace'))) == [record(i) for i in range(max(count - 4, 0), count)]
+
+
+def test_file_trace_flushes_in_buffers(tmp_path):
+    trace = FileTrace(str(tmp_path / 'file.trace'), buffer_size=RECORD.size * 3)
+    for i in range(10):
+        trace.record(*record(i))
+    trace.close()
+    assert list(read_trace(str(tmp_path / 'file.trace'))) == [record(i) for i in range(10)]
+
+
+def test_not_a_trace(tmp_path):
+    (tmp_path / 'bad.trace').write_bytes(b'NESM\x1a\x01')
+    with pytest.raises(TraceError):
+        list(read_trace(str(tmp_path / 'bad.trace')))
+
+
+@pytest.mark.parametrize('kwargs', [{}, {'translate': True}])
+def test_core_records_every_instruction(tmp_path, kwargs):
+    player = NSFPlayer(make_nsf(tmp_path / 'loop.nsf', LOOP), core=Core6502(**kwargs))
+    ring = player.core.tracer = RingTrace(64)
+    player.init()
+    player.core.tracer = None
+    records = list(ring.records())
+    assert [pc for cycles, pc, opcode, operand, a, x, y, p, sp in records] == [
+        0x8000, 0x8002, 0x8003, 0x8002, 0x8003, 0x8002, 0x8003, 0x8005]
+    # registers as they were before each instruction ran
+    assert [x for cycles, pc, opcode, operand, a, x, y, p, sp in records[:3]] == [0, 3, 2]
+    assert format_record(records[0]).startswith('8000  A2 03     LDX #$03')
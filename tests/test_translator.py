@@ -0,0 +1,77 @@
+import pytest
+
+from pynes.benchmark import PROGRAMS
+from pynes.core6502 import Core6502
+
+CORE_MODES = [{}, {'decode_cache': True}, {'translate': True}]
+
+
+def run_from_ram(code, kwargs):
+    core = Core6502(**kwargs)
+    core.memory.data[0x0200:0x0200 + len(code)] = bytes(code)
+    core.pc = 0x0200
+    assert core.run_until(0x9000, 1000)
+    return core
+
+
+@pytest.mark.parametrize('kwargs', CORE_MODES)
+def test_store_into_the_running_block(kwargs):
+    # LDA #$05; STA $0206 (the operand of the next LDA); LDA #$00; STA $10; JMP $9000
+    code = [0xA9, 0x05, 0x8D, 0x06, 0x02, 0xA9, 0x00, 0x85, 0x10, 0x4C, 0x00, 0x90]
+    core = run_from_ram(code, kwargs)
+    assert core.ram[0x10] == 5
+    assert core.cycles == 14
+
+
+@pytest.mark.parametrize('kwargs', CORE_MODES)
+def test_store_elsewhere_keeps_the_block(kwargs):
+    # LDA #$05; STA $0300; LDA #$00; STA $10; JMP $9000
+    code = [0xA9, 0x05, 0x8D, 0x00, 0x03, 0xA9, 0x00, 0x85, 0x10, 0x4C, 0x00, 0x90]
+    core = run_from_ram(code, kwargs)
+    assert (core.ram[0x10], core.ram[0x300]) == (0, 5)
+    if core.translator is not None:
+        assert 0x0200 in core.translator.cache.entries
+
+
+def test_translated_block_matches_the_interpreter():
+    # a loop adding up a table and storing into its own ADC operand
+    code = [0xA2, 0x08,                 # $0200 LDX #$08
+            0x18,                       # $0202 CLC
+            0x69, 0x01,                 # $0203 ADC #$01
+            0x8D, 0x04, 0x02,           # $0205 STA $0204
+            0xCA,                       # $0208 DEX
+            0xD0, 0xF7,                 # $0209 BNE $0202
+            0x85, 0x10,                 # $020B STA $10
+            0x4C, 0x00, 0x90]           # $020D JMP $9000
+    results = [(core.ram[0x10], core.cycles) for core in (run_from_ram(code, kwargs) for kwargs in CORE_MODES)]
+    assert results[0] == results[1] == results[2]
+
+
+def machine_state(core):
+    return (core.pc, core._acc, core._x, core._y, core.p, core.sp, bytes(core.ram))
+
+
+@pytest.mark.parametrize('name', sorted(PROGRAMS))
+def test_every_mode_runs_the_same(name):
+    # translated code only stops between blocks, so each run starts and
+    # ends at the top of the program's loop
+    loop = 0x8004 if name == 'tight_loop' else 0x8000
+    states = []
+    for kwargs in CORE_MODES:
+        core = Core6502(**kwargs)
+        core.memory.map_rom(0x8000, bytes(PROGRAMS[name]))
+        core.pc = loop
+        for i in range(300):
+            core.run(1)
+            assert core.run_until(loop, 10000)
+        states.append((machine_state(core), core.cycles))
+    assert states[0] == states[1] == states[2]
+
+
+def test_block_ends_at_the_first_branch():
+    core = Core6502(translate=True)
+    # LDA #$01; CLC; ADC #$02; BNE +0; INX
+    core.memory.map_rom(0x8000, bytes([0xA9, 0x01, 0x18, 0x69, 0x02, 0xD0, 0x00, 0xE8]))
+    block = core.translator.decode(core.read, 0x8000)
+    assert [addr for addr, instruction, operand in block] == [0x8000, 0x8002, 0x8003, 0x8005]
+    assert block[-1][1].is_branch
@@ -0,0 +1,55 @@
+import struct
+
+from pynes.nsfinfo import NSFFile
+
+
+def make_nsf(path, code=(0x60,), load=0x8000, init=0x8000, play=0x8000, songs=1, region=0, chips=0,
+             bankswitch=bytes(8), title=b'test'):
+    """write an NSF file with ``code`` at ``load`` to ``path``"""
+    header = struct.pack(NSFFile._struct_format, b'NESM\x1A', b'\x01', bytes([songs]), b'\x01',
+                         load, init, play, title, b'artist', b'(c)', 16639, bytes(bankswitch), 19997,
+                         bytes([region]), bytes([chips]), bytes(4))
+    with open(str(path), 'wb') as f:
+        f.write(header + bytes(code))
+    return str(path)
+
+
+# INIT starts pulse 1, the triangle and noise, PLAY sweeps the pulse period
+TONE_INIT = [
+    0xA9, 0xBF, 0x8D, 0x00, 0x40,       # LDA #$BF; STA $4000
+    0xA9, 0xFD, 0x8D, 0x02, 0x40,       # LDA #$FD; STA $4002
+    0xA9, 0x00, 0x8D, 0x03, 0x40,       # LDA #$00; STA $4003
+    0xA9, 0xFF, 0x8D, 0x08, 0x40,       # LDA #$FF; STA $4008
+    0xA9, 0x7F, 0x8D, 0x0A, 0x40,       # LDA #$7F; STA $400A
+    0xA9, 0x00, 0x8D, 0x0B, 0x40,       # LDA #$00; STA $400B
+    0xA9, 0x3A, 0x8D, 0x0C, 0x40,       # LDA #$3A; STA $400C
+    0xA9, 0x04, 0x8D, 0x0E, 0x40,       # LDA #$04; STA $400E
+    0xA9, 0x08, 0x8D, 0x0F, 0x40,       # LDA #$08; STA $400F
+    0xA9, 0x0F, 0x8D, 0x15, 0x40,       # LDA #$0F; STA $4015
+    0x60,                               # RTS
+]
+TONE_PLAY = [
+    0xE6, 0x10,                         # INC $10
+    0xA5, 0x10,                         # LDA $10
+    0x8D, 0x02, 0x40,                   # STA $4002
+    0x60,                               # RTS
+]
+
+
+# a looping DMC sample of 1009 bytes at $C000
+DMC_INIT = [
+    0xA9, 0x4F, 0x8D, 0x10, 0x40,       # LDA #$4F; STA $4010
+    0xA9, 0x00, 0x8D, 0x12, 0x40,       # LDA #$00; STA $4012
+    0xA9, 0x3F, 0x8D, 0x13, 0x40,       # LDA #$3F; STA $4013
+    0xA9, 0x1F, 0x8D, 0x15, 0x40,       # LDA #$1F; STA $4015
+]
+
+
+def make_tone_nsf(path, dmc=False, **kwargs):
+    """write an NSF file that plays a changing tone on three channels, and
+    a sample on the DMC with ``dmc``"""
+    init = TONE_INIT[:-1] + (DMC_INIT if dmc else []) + TONE_INIT[-1:]
+    code = init + TONE_PLAY
+    if dmc:
+        code += [0] * (0x4000 - len(code)) + [(i * 73 + 17) & 0xFF for i in range(0x400)]
+    return make_nsf(path, code, init=0x8000, play=0x8000 + len(init), **kwargs)